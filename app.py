@@ -3,7 +3,7 @@ from huggingface_hub import login
 
 import os
 #from languages import get_language_names
-from goai_helpers import goai_traduction, goai_stt, goai_stt2, goai_tts,  goai_tts2, goai_ttt_tts_pipeline, goai_stt_ttt_pipeline
+from goai_helpers import goai_traduction, micro_batcher, goai_stt, goai_stt2, goai_tts,  goai_tts2, goai_ttt_tts_pipeline, goai_stt_ttt_pipeline, goai_stt_streaming
 
 auth_token = os.getenv('HF_SPACE_TOKEN')
 login(token=auth_token)
@@ -12,7 +12,7 @@ login(token=auth_token)
 # list all files in the ./audios directory for the dropdown
 AUDIO_FILES = [f for f in os.listdir('./exples_voix') if os.path.isfile(os.path.join('./exples_voix', f))]
 MODELES_TTS = ["ArissBandoss/coqui-tts-moore-V1", "ArissBandoss/mms-tts-mos-V2"]
-MODELES_ASR = ["ArissBandoss/whisper-small-mos", "ArissBandoss/whisper-large-v3-turbo-mos"]
+MODELES_ASR = ["ArissBandoss/whisper-small-mos", "ArissBandoss/whisper-large-v3-turbo-mos", goai_stt2.MODELE_ASSISTE]
 LANGUAGES   = ["Automatic Detection"]
 
 DESCRIPTION_TTT = """<div style="display: flex; justify-content: space-between; align-items: center; flex-wrap: wrap;">
@@ -58,11 +58,12 @@ DESCRIPTION_STT = """<div style="display: flex; justify-content: space-between;
 demo = gr.Blocks(theme=gr.themes.Soft())
 
 goai_traduction_if = gr.Interface(
-    fn=goai_traduction.goai_traduction,
+    fn=micro_batcher.goai_traduction_interface,
     inputs=[
         gr.Textbox(label="Texte à traduire", placeholder="La, pagã sɩd talla raadã n tɩ lebs kãangã pʋgẽ, n na n paam a menga. Rẽ wã yĩnga, sẽn kisa, sɩd kisame. Sẽn ka maande, sɩd ka maand ye."),
         gr.Dropdown(label="Langue source", choices=["fra_Latn", "mos_Latn"], value='fra_Latn'),
-        gr.Dropdown(label="Langue cible", choices=["fra_Latn", "mos_Latn"], value='mos_Latn')
+        gr.Dropdown(label="Langue cible", choices=["fra_Latn", "mos_Latn"], value='mos_Latn'),
+        gr.Checkbox(label="Afficher la traduction mot à mot (décodage glouton)", value=False),
     ],
     outputs=gr.Text(label="Texte traduit"),
     examples=[["Yʋʋm a wãn la b kẽesd biig lekolle?", "mos_Latn", "fra_Latn"],
@@ -71,6 +72,7 @@ goai_traduction_if = gr.Interface(
               ["Comme lors du match face à la Côte d’Ivoire, c’est sur un coup de pied arrêté que les Etalons encaissent leur but.", "fra_Latn", "mos_Latn"],
     ],
     cache_examples=False,
+    concurrency_limit=16,  # les requêtes simultanées sont regroupées par le micro-batcher
     title="Traduction Mooré-Francais, Francais-Mooré",
     description=DESCRIPTION_TTT
 )
@@ -101,7 +103,7 @@ goai_ttt_tts_pipeline_if = gr.Interface(
     ],
     outputs=[
         gr.Text(label="Texte traduit (en Mooré)"),
-        gr.Audio(label="Audio généré", format="wav"),
+        gr.Audio(label="Audio généré", format="wav", streaming=True, autoplay=True),
     ],
     examples=[["Ils vont bien, merci. Mon père travaille dur dans les champs et ma mère est toujours occupée à la maison.", "exple_voix_masculine.wav", "ArissBandoss/coqui-tts-moore-V1"], 
               ["La finale s’est jouée en présence du Président du Faso, Ibrahim Traoré.", "exple_voix_feminine.wav", "ArissBandoss/coqui-tts-moore-V1"],
@@ -136,6 +138,7 @@ goai_stt_ttt_pipeline_if = gr.Interface(
         gr.Slider(label="Batch Size", minimum=1, maximum=32, value=8, step=1),
         gr.Slider(label="Chunk Length (s)", minimum=1, maximum=60, value=17.5, step=0.1),
         gr.Slider(label="Stride Length (s)", minimum=1, maximum=30, value=1, step=0.1),
+        gr.Checkbox(label="Ne transcrire que la parole détectée (VAD, remplace Chunk Length et Stride Length)", value=False),
     ],
     outputs=[
         gr.Textbox(label="Texte transcrit (en Mooré)"), 
@@ -152,11 +155,42 @@ goai_stt_ttt_pipeline_if = gr.Interface(
     flagging_mode="auto",
 )
 
+goai_stt_flux_if = gr.Interface(
+    fn=goai_stt_streaming.goai_stt_flux,
+    inputs=[
+        gr.Audio(
+            sources=["microphone"], 
+            type="numpy",
+            streaming=True,
+            label="Audio Mooré (en direct)",
+        ),
+        gr.Dropdown(
+            label="Modèles d'ASR", 
+            choices=MODELES_ASR[:2], 
+            value="ArissBandoss/whisper-small-mos",
+        ),
+        gr.Dropdown(
+            choices=LANGUAGES, 
+            value="Automatic Detection",
+            label="Langue (Mooré)", 
+        ), 
+        "state",
+    ],
+    outputs=[
+        gr.Textbox(label="Texte transcrit (en Mooré)"), 
+        gr.Textbox(label="Texte traduit (Francais)"), 
+        "state",
+    ],
+    live=True,
+    title="Mooré ASR en direct & Traduction",
+    description=DESCRIPTION_STT,
+)
+
 
 with demo:
     gr.TabbedInterface(
-        interface_list=[goai_traduction_if, goai_ttt_tts_pipeline_if, goai_stt_ttt_pipeline_if],
-        tab_names=["Traduction Mooré-Francais", "Mooré TTS & Traduction", "Mooré ASR & Traduction"]
+        interface_list=[goai_traduction_if, goai_ttt_tts_pipeline_if, goai_stt_ttt_pipeline_if, goai_stt_flux_if],
+        tab_names=["Traduction Mooré-Francais", "Mooré TTS & Traduction", "Mooré ASR & Traduction", "Mooré ASR en direct"]
     )
 
 demo.queue().launch(ssr_mode=False)
@@ -0,0 +1,318 @@
+import os
+import time
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+import torch
+
+from goai_helpers.audio import FonduEnchaine
+
+
+MODES = ("parallele", "enchaine")
+# découpage des longs audios: durée des morceaux et de leur chevauchement
+FENETRE_S = 10
+CHEVAUCHEMENT_S = 1
+
+
+class ErreurFilePleine(RuntimeError):
+    pass
+
+
+def charger_enhancer(device):
+    """
+    Charge une instance resemble-enhance (débruiteur + améliorateur) propre à un travailleur.
+    `load_enhancer` est mémoïsé par device; on contourne ce cache car `configurate_` modifie
+    le modèle (nfe, solveur, ...) et ne doit pas être partagé entre travailleurs concurrents.
+    """
+    from resemble_enhance.enhancer.inference import load_enhancer
+    from resemble_enhance.inference import remove_weight_norm_recursively
+
+    enhancer = load_enhancer.__wrapped__(None, device)
+    remove_weight_norm_recursively(enhancer)
+    return enhancer
+
+
+def _lambd_amelioration(mode, lambd):
+    # l'améliorateur mêle déjà sa propre sortie débruitée (dosée par lambd): en mode "enchaine",
+    # son entrée est déjà débruitée, on ne débruite pas une seconde fois
+    return 0.0 if mode == "enchaine" else lambd
+
+
+def _ameliorer(enhancer, device, audio, sampling_rate, mode, nfe, solver, lambd, tau):
+    """
+    Débruite puis améliore un audio avec le modèle du travailleur.
+    En mode "enchaine", l'améliorateur reçoit la sortie du débruiteur; en mode "parallele",
+    les deux partent de l'audio d'origine (comportement historique).
+    Les erreurs d'inférence sont propagées à l'appelant (via le Future).
+    """
+    from resemble_enhance.inference import inference
+
+    dwav = torch.as_tensor(audio, dtype=torch.float32).reshape(-1)
+    denoised, sr_denoised = inference(model=enhancer.denoiser, dwav=dwav, sr=sampling_rate, device=device)
+
+    source, sr_source = (denoised, sr_denoised) if mode == "enchaine" else (dwav, sampling_rate)
+    enhancer.configurate_(nfe=nfe, solver=solver, lambd=_lambd_amelioration(mode, lambd), tau=tau)
+    enhanced, sr_enhanced = inference(model=enhancer, dwav=source, sr=sr_source, device=device)
+
+    return (sr_denoised, denoised.cpu().numpy()), (sr_enhanced, enhanced.cpu().numpy())
+
+
+@torch.inference_mode()
+def _inference_lot(model, morceaux, sampling_rate, device, npad=441):
+    """
+    Équivalent par lots de resemble_enhance.inference.inference_chunk: chaque morceau est
+    rééchantillonné au taux du modèle (mêmes paramètres que resemble-enhance), normalisé par
+    son maximum, complété de zéros, puis tous passent ensemble dans le modèle.
+    """
+    from torchaudio.functional import resample
+
+    wav_rate = model.hp.wav_rate
+    dwavs = [
+        resample(morceau, orig_freq=sampling_rate, new_freq=wav_rate, lowpass_filter_width=64,
+                 rolloff=0.9475937167399596, resampling_method="sinc_interp_kaiser", beta=14.769656459379492)
+        for morceau in morceaux
+    ]
+    longueurs = [dwav.shape[-1] for dwav in dwavs]
+    maximums = [dwav.abs().max().clamp(min=1e-7) for dwav in dwavs]
+
+    lot = torch.zeros(len(dwavs), max(longueurs) + npad)
+    for i, (dwav, maximum) in enumerate(zip(dwavs, maximums)):
+        lot[i, :longueurs[i]] = dwav / maximum
+    hwav = model(lot.to(device)).cpu()
+    return [hwav[i, :longueurs[i]] * maximums[i] for i in range(len(dwavs))], wav_rate
+
+
+def _ameliorer_lot(enhancer, device, morceaux, sampling_rate, mode, nfe, solver, lambd, tau):
+    """
+    Débruite puis améliore un lot de morceaux; retourne (sr, débruités, améliorés).
+    Comme pour _ameliorer, les erreurs d'inférence sont propagées à l'appelant.
+    """
+    debruites, sr_debruite = _inference_lot(enhancer.denoiser, morceaux, sampling_rate, device)
+    enhancer.configurate_(nfe=nfe, solver=solver, lambd=_lambd_amelioration(mode, lambd), tau=tau)
+    if mode == "enchaine":
+        ameliores, sr_ameliore = _inference_lot(enhancer, debruites, sr_debruite, device)
+    else:
+        ameliores, sr_ameliore = _inference_lot(enhancer, morceaux, sampling_rate, device)
+    assert sr_debruite == sr_ameliore
+    return sr_ameliore, debruites, ameliores
+
+
+def _aligner(precedent, morceau, chevauchement: int, sampling_rate: int):
+    """
+    Recale un morceau sur la fin du précédent avant le fondu, comme merge_chunks de resemble-enhance:
+    le décalage entre les deux versions de la zone de chevauchement est estimé par compute_offset,
+    puis le morceau est avancé (début coupé) ou retardé (zéros ajoutés) d'autant.
+    """
+    from resemble_enhance.inference import compute_offset
+
+    n = min(chevauchement, precedent.shape[-1], morceau.shape[-1])
+    if n == 0:
+        return morceau
+    decalage = compute_offset(precedent[-n:], morceau[:n], sr=sampling_rate)
+    if decalage > 0:
+        return morceau[decalage:]
+    if decalage < 0:
+        return torch.nn.functional.pad(morceau, (-decalage, 0))
+    return morceau
+
+
+def decouper_fenetres(longueur: int, fenetre: int, chevauchement: int) -> list:
+    """
+    Débuts des fenêtres de `fenetre` échantillons, se chevauchant de `chevauchement`,
+    qui couvrent un signal de `longueur` échantillons (une seule si le signal est court).
+    """
+    debuts = [0]
+    while debuts[-1] + fenetre < longueur:
+        debuts.append(debuts[-1] + fenetre - chevauchement)
+    return debuts
+
+
+class _Travailleur(threading.Thread):
+    """
+    Fil d'exécution attaché à un device, qui garde son modèle chargé entre les tâches.
+    """
+
+    def __init__(self, service, device):
+        super().__init__(daemon=True, name=f"amelioration-{device}")
+        self.service = service
+        self.device = device
+        self.enhancer = None
+
+    def run(self):
+        while True:
+            tache = self.service._file.get()
+            if tache is None:
+                self.service._file.task_done()
+                return
+            fonction, args, future = tache
+            try:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                if self.enhancer is None:
+                    self.enhancer = charger_enhancer(self.device)
+                debut = time.perf_counter()
+                future.set_result(fonction(self.enhancer, self.device, *args))
+                self.service._compter(time.perf_counter() - debut)
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                self.service._file.task_done()
+
+
+class ServiceAmelioration:
+    """
+    Service d'amélioration de la parole (resemble-enhance) à longue durée de vie.
+
+    Un nombre configurable de travailleurs par device se partagent une file de tâches bornée;
+    chaque travailleur charge ses modèles une seule fois et exécute le débruitage puis
+    l'amélioration l'un après l'autre, sans que les deux se disputent le même device.
+
+    Attributs :
+        devices (list) : les devices utilisés (tous les GPU visibles, sinon le CPU).
+        travailleurs_par_device (int) : nombre de travailleurs par device.
+        taille_file (int) : nombre maximal de tâches en attente.
+        attente_max_s (float) : durée maximale d'attente d'une place dans la file.
+    """
+
+    def __init__(self, travailleurs_par_device: int = 1, taille_file: int = 8, attente_max_s: float = 30.0,
+                 devices: list = None):
+        if devices is None:
+            if torch.cuda.is_available():
+                devices = [torch.device(f"cuda:{i}") for i in range(torch.cuda.device_count())]
+            else:
+                devices = [torch.device("cpu")]
+        self.devices = devices
+        self.travailleurs_par_device = travailleurs_par_device
+        self.taille_file = taille_file
+        self.attente_max_s = attente_max_s
+
+        self._file = queue.Queue(maxsize=taille_file)
+        self._verrou = threading.Lock()
+        self.taches = 0
+        self.temps_total = 0.0
+
+        self._travailleurs = [
+            _Travailleur(self, device) for device in devices for _ in range(travailleurs_par_device)
+        ]
+        for travailleur in self._travailleurs:
+            travailleur.start()
+
+    def _compter(self, duree: float):
+        with self._verrou:
+            self.taches += 1
+            self.temps_total += duree
+
+    def soumettre_tache(self, fonction, *args) -> Future:
+        """
+        Place `fonction(enhancer, device, *args)` dans la file et retourne son Future.
+        Lève ErreurFilePleine si la file reste pleine plus de `attente_max_s` secondes.
+        """
+        future = Future()
+        try:
+            self._file.put((fonction, args, future), timeout=self.attente_max_s)
+        except queue.Full:
+            raise ErreurFilePleine(f"File d'amélioration pleine ({self.taille_file} tâches en attente).")
+        return future
+
+    def soumettre(self, audio, sampling_rate, mode="parallele", nfe=64, solver="midpoint", lambd=0.1,
+                  tau=0.5) -> Future:
+        """
+        Soumet le débruitage et l'amélioration d'un audio. Le Future donne
+        ((sr, débruité), (sr, amélioré)) en tableaux numpy.
+        """
+        if mode not in MODES:
+            raise ValueError(f"mode inconnu: {mode} (attendu: {', '.join(MODES)}).")
+        return self.soumettre_tache(_ameliorer, audio, sampling_rate, mode, int(nfe), solver.lower(), lambd, tau)
+
+    def ameliorer(self, *args, **kwargs):
+        """
+        Version bloquante de `soumettre`.
+        """
+        return self.soumettre(*args, **kwargs).result()
+
+    def ameliorer_par_morceaux(self, audio, sampling_rate, mode="parallele", nfe=64, solver="midpoint", lambd=0.1,
+                               tau=0.5, fenetre_s=FENETRE_S, chevauchement_s=CHEVAUCHEMENT_S, morceaux_par_lot=4):
+        """
+        Amélioration d'un long audio par morceaux, rendus au fil de l'eau.
+
+        L'audio est découpé en fenêtres de `fenetre_s` secondes qui se chevauchent de
+        `chevauchement_s`; les fenêtres sont traitées par lots de `morceaux_par_lot` par les
+        travailleurs (en parallèle s'il y en a plusieurs), puis recollées dans l'ordre par
+        un fondu enchaîné sur la zone de chevauchement, après recalage de chaque morceau sur le
+        précédent (voir _aligner). Au plus un lot par travailleur (plus un)
+        est en cours à la fois, ce qui borne la mémoire quelle que soit la durée. Un audio plus
+        court qu'une fenêtre est traité d'un seul morceau, comme par enhance_speech.
+
+        Yields:
+            tuple: ((sr, débruité), (sr, amélioré)), morceaux consécutifs en tableaux numpy.
+        """
+        if mode not in MODES:
+            raise ValueError(f"mode inconnu: {mode} (attendu: {', '.join(MODES)}).")
+        dwav = torch.as_tensor(np.asarray(audio), dtype=torch.float32).reshape(-1)
+        fenetre = int(fenetre_s * sampling_rate)
+        chevauchement = int(chevauchement_s * sampling_rate)
+        debuts = decouper_fenetres(len(dwav), fenetre, chevauchement)
+        lots = [debuts[i:i + morceaux_par_lot] for i in range(0, len(debuts), morceaux_par_lot)]
+
+        def resultats():
+            en_vol = deque()
+            a_soumettre = iter(lots)
+            while True:
+                while len(en_vol) <= len(self._travailleurs):
+                    lot = next(a_soumettre, None)
+                    if lot is None:
+                        break
+                    morceaux = [dwav[debut:debut + fenetre] for debut in lot]
+                    en_vol.append(self.soumettre_tache(
+                        _ameliorer_lot, morceaux, sampling_rate, mode, int(nfe), solver.lower(), lambd, tau
+                    ))
+                if not en_vol:
+                    return
+                sr, debruites, ameliores = en_vol.popleft().result()
+                for pistes in zip(debruites, ameliores):
+                    yield sr, pistes
+
+        # débruité et amélioré sont recalés et enchaînés séparément, leurs décalages pouvant différer
+        fondus, precedents, sr = None, None, None
+        for sr, pistes in resultats():
+            if fondus is None:
+                fondus = [FonduEnchaine(sr, chevauchement_s * 1000) for _ in pistes]
+            alignees = pistes if precedents is None else [
+                _aligner(precedent, piste, int(chevauchement_s * sr), sr) for precedent, piste in zip(precedents, pistes)
+            ]
+            precedents = pistes
+            sorties = [fondu.ajouter(piste.numpy()) for fondu, piste in zip(fondus, alignees)]
+            if any(sortie.shape[-1] for sortie in sorties):
+                yield (sr, sorties[0]), (sr, sorties[1])
+        if fondus is not None:
+            yield (sr, fondus[0].terminer()), (sr, fondus[1].terminer())
+
+    def stats(self) -> dict:
+        with self._verrou:
+            return {
+                "travailleurs": len(self._travailleurs),
+                "en_attente": self._file.qsize(),
+                "taches": self.taches,
+                "temps_moyen": self.temps_total / self.taches if self.taches else 0.0,
+            }
+
+
+_service = None
+_verrou_service = threading.Lock()
+
+
+def get_service() -> ServiceAmelioration:
+    """
+    Retourne le service d'amélioration du processus, créé (et ses travailleurs démarrés) au premier appel.
+    """
+    global _service
+    with _verrou_service:
+        if _service is None:
+            _service = ServiceAmelioration(
+                travailleurs_par_device=int(os.getenv("GOAI_AMELIORATION_TRAVAILLEURS", 1)),
+                taille_file=int(os.getenv("GOAI_AMELIORATION_FILE", 8)),
+            )
+    return _service
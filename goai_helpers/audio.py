@@ -0,0 +1,216 @@
+import time
+import threading
+from functools import lru_cache
+from math import gcd
+
+import numpy as np
+import librosa
+from scipy.io import wavfile
+from scipy.signal import firwin, resample_poly
+
+
+# temps cumulés (secondes) de chaque étape de l'ingestion audio
+compteurs = {"appels": 0, "lecture": 0.0, "downmix": 0.0, "resample": 0.0}
+_verrou = threading.Lock()
+
+
+def _compter(etape: str, debut: float):
+    with _verrou:
+        compteurs[etape] += time.perf_counter() - debut
+
+
+def stats_ingest() -> dict:
+    """
+    Retourne une copie des compteurs de temps de l'ingestion audio.
+    """
+    with _verrou:
+        return dict(compteurs)
+
+
+@lru_cache(maxsize=32)
+def filtre_polyphase(orig_sr: int, target_sr: int) -> np.ndarray:
+    """
+    Filtre passe-bas (float32) utilisé pour rééchantillonner de `orig_sr` vers `target_sr`,
+    conçu une seule fois par couple de taux (même conception que scipy.signal.resample_poly).
+    """
+    diviseur = gcd(orig_sr, target_sr)
+    max_rate = max(orig_sr, target_sr) // diviseur
+    return firwin(2 * 10 * max_rate + 1, 1.0 / max_rate, window=("kaiser", 5.0)).astype(np.float32)
+
+
+def _lire(chemin: str):
+    """
+    Lit un fichier audio: les WAV PCM sont projetés en mémoire (mmap, sans copie),
+    les autres formats (mp3, ...) sont décodés par librosa à leur taux d'origine.
+    Retourne (sampling_rate, signal) avec signal de forme (n,) ou (n, canaux).
+    """
+    if chemin.lower().endswith(".wav"):
+        try:
+            return wavfile.read(chemin, mmap=True)
+        except ValueError:
+            # WAV compressé ou format non pris en charge par scipy
+            pass
+    signal, sampling_rate = librosa.load(chemin, sr=None, mono=False, dtype=np.float32)
+    return sampling_rate, signal.T
+
+
+def _mono_float32(signal: np.ndarray) -> np.ndarray:
+    """
+    Mixe les canaux en mono puis convertit en float32 dans [-1, 1].
+    Le mixage se fait avant le rééchantillonnage, qui ne traite alors qu'un seul canal.
+    """
+    echelle, decalage = 1.0, 0.0
+    if signal.dtype.kind in "iu":
+        info = np.iinfo(signal.dtype)
+        if signal.dtype.kind == "u":
+            decalage = (info.max + 1) / 2
+            echelle = 1.0 / decalage
+        else:
+            echelle = 1.0 / (info.max + 1)
+
+    if signal.ndim > 1:
+        # les canaux sont sur le plus petit axe (gradio et scipy: (n, canaux))
+        signal = signal.mean(axis=int(np.argmin(signal.shape)), dtype=np.float32)
+    else:
+        signal = signal.astype(np.float32, copy=False)
+
+    # pour les entrées entières, `signal` est déjà une copie et peut être modifié sur place
+    if decalage:
+        signal = signal - np.float32(decalage)
+    if echelle != 1.0:
+        signal *= np.float32(echelle)
+    return signal
+
+
+def charger_audio(source, target_sr: int = 16000) -> np.ndarray:
+    """
+    Charge un audio en signal mono float32 au taux `target_sr`.
+
+    Args:
+        source (str | tuple[int, np.ndarray]): le chemin d'un fichier audio ou le tuple
+            (taux d'échantillonnage, données) fourni par gradio.
+        target_sr (int): le taux d'échantillonnage voulu.
+
+    Returns:
+        np.ndarray: le signal mono en float32.
+    """
+    with _verrou:
+        compteurs["appels"] += 1
+
+    debut = time.perf_counter()
+    if isinstance(source, str):
+        sampling_rate, signal = _lire(source)
+    else:
+        sampling_rate, signal = source
+        signal = np.asarray(signal)
+    _compter("lecture", debut)
+
+    debut = time.perf_counter()
+    signal = _mono_float32(signal)
+    _compter("downmix", debut)
+
+    if sampling_rate != target_sr:
+        debut = time.perf_counter()
+        diviseur = gcd(int(sampling_rate), target_sr)
+        signal = resample_poly(
+            signal,
+            target_sr // diviseur,
+            int(sampling_rate) // diviseur,
+            window=filtre_polyphase(int(sampling_rate), target_sr)
+        ).astype(np.float32, copy=False)
+        _compter("resample", debut)
+
+    return signal
+
+
+class ReechantillonneurFlux:
+    """
+    Rééchantillonnage polyphase d'un flux reçu par morceaux (microphone), sans effet de bord
+    aux jonctions: le résultat est celui de `charger_audio` sur le signal entier.
+
+    Les derniers échantillons d'entrée sont conservés d'un morceau à l'autre; une sortie n'est
+    rendue qu'une fois tout son voisinage (demi-longueur du filtre) reçu, elle est donc retardée
+    de quelques millisecondes.
+    """
+
+    def __init__(self, orig_sr: int, target_sr: int):
+        diviseur = gcd(int(orig_sr), target_sr)
+        self.haut = target_sr // diviseur
+        self.bas = int(orig_sr) // diviseur
+        self.filtre = filtre_polyphase(int(orig_sr), target_sr) if self.haut != self.bas else None
+        # voisinage d'une sortie, en échantillons d'entrée
+        self.marge = -(-len(self.filtre) // (2 * self.haut)) + 1 if self.filtre is not None else 0
+
+        self.entree = np.zeros(0, dtype=np.float32)
+        self.debut = 0    # indice (dans le flux) du premier échantillon conservé, multiple de `bas`
+        self.rendus = 0   # nombre d'échantillons de sortie déjà rendus
+
+    def ajouter(self, signal: np.ndarray) -> np.ndarray:
+        """
+        Ajoute un morceau (mono float32 au taux d'origine) et retourne les nouveaux échantillons
+        de sortie définitifs (éventuellement aucun).
+        """
+        self.entree = np.concatenate([self.entree, signal])
+        if self.haut == self.bas:
+            sortie, self.entree = self.entree, self.entree[:0]
+            return sortie
+
+        debut = time.perf_counter()
+        # sorties dont tout le voisinage d'entrée est reçu
+        fin = (self.debut + len(self.entree) - self.marge) * self.haut // self.bas
+        premiere = self.debut * self.haut // self.bas
+        sortie = np.zeros(0, dtype=np.float32)
+        if fin > self.rendus:
+            reechantillonne = resample_poly(self.entree, self.haut, self.bas, window=self.filtre)
+            sortie = reechantillonne[self.rendus - premiere:fin - premiere].astype(np.float32, copy=False)
+            self.rendus = fin
+
+        # ne garder que l'entrée nécessaire aux prochaines sorties, en restant aligné sur `bas`
+        garder = max(self.rendus * self.bas // self.haut - self.marge, self.debut)
+        garder -= garder % self.bas
+        self.entree = self.entree[garder - self.debut:]
+        self.debut = garder
+        _compter("resample", debut)
+        return sortie
+
+
+class FonduEnchaine:
+    """
+    Enchaîne des morceaux audio produits au fil de l'eau avec un court fondu enchaîné
+    à chaque jonction, pour éviter les clics entre phrases synthétisées séparément.
+
+    Les `fondu_ms` dernières millisecondes de chaque morceau sont retenues jusqu'à l'arrivée
+    du suivant (ou jusqu'à `terminer`), le reste est rendu immédiatement. Le temps est sur le
+    dernier axe: plusieurs pistes de même longueur peuvent être enchaînées ensemble.
+    """
+
+    def __init__(self, sampling_rate: int, fondu_ms: float = 20):
+        self.fondu = int(sampling_rate * fondu_ms / 1000)
+        self.reste = None
+
+    def ajouter(self, morceau) -> np.ndarray:
+        """
+        Ajoute un morceau et retourne la partie de l'audio désormais définitive (éventuellement vide).
+        """
+        morceau = np.asarray(morceau, dtype=np.float32)
+        reste = self.reste
+        if reste is None:
+            reste = np.zeros(morceau.shape[:-1] + (0,), dtype=np.float32)
+        n = min(self.fondu, reste.shape[-1], morceau.shape[-1])
+        if n:
+            rampe = np.linspace(0.0, 1.0, n, dtype=np.float32)
+            jonction = reste[..., reste.shape[-1] - n:] * (1 - rampe) + morceau[..., :n] * rampe
+            corps = np.concatenate([reste[..., :reste.shape[-1] - n], jonction, morceau[..., n:]], axis=-1)
+        else:
+            corps = np.concatenate([reste, morceau], axis=-1)
+
+        coupure = max(corps.shape[-1] - self.fondu, 0)
+        self.reste = corps[..., coupure:]
+        return corps[..., :coupure]
+
+    def terminer(self) -> np.ndarray:
+        """
+        Retourne la fin retenue du dernier morceau.
+        """
+        reste, self.reste = self.reste, None
+        return reste if reste is not None else np.zeros(0, dtype=np.float32)
@@ -0,0 +1,167 @@
+import os
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from goai_helpers.traduction_cache import CACHE_DIR, normaliser_texte
+
+
+class CacheAudio:
+    """
+    Cache persistant des formes d'onde synthétisées, phrase par phrase.
+
+    Une clé est le sha256 de la phrase normalisée, de l'empreinte de la voix, du modèle
+    (identifiant et révision) et des paramètres d'échantillonnage. Les formes d'onde sont
+    stockées sur disque en int16 (fichiers .npy); la taille totale est plafonnée à `max_octets`
+    en supprimant les entrées les moins récemment utilisées.
+
+    Attributs :
+        dossier (str) : dossier de stockage.
+        max_octets (int) : taille maximale du cache sur disque.
+        hits (int), misses (int) : compteurs d'accès.
+    """
+
+    def __init__(self, dossier: str = None, max_octets: int = 512 * 2**20):
+        self.dossier = dossier or os.path.join(CACHE_DIR, "audio")
+        self.max_octets = max_octets
+
+        self._verrou = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(self.dossier, exist_ok=True)
+        # index LRU cle -> taille, initialisé par date de dernier accès
+        fichiers = [f for f in os.listdir(self.dossier) if f.endswith(".npy")]
+        fichiers.sort(key=lambda f: os.path.getmtime(os.path.join(self.dossier, f)))
+        self._index = OrderedDict(
+            (f[:-len(".npy")], os.path.getsize(os.path.join(self.dossier, f))) for f in fichiers
+        )
+        self._octets = sum(self._index.values())
+
+    @staticmethod
+    def cle(texte: str, voix: str, modele: str, parametres: tuple) -> str:
+        contenu = "\x1f".join([normaliser_texte(texte), voix, modele] + [str(p) for p in parametres])
+        return hashlib.sha256(contenu.encode("utf-8")).hexdigest()
+
+    def _chemin(self, cle: str) -> str:
+        return os.path.join(self.dossier, cle + ".npy")
+
+    def get(self, cle: str):
+        """
+        Retourne la forme d'onde (float32) de la clé, ou None si elle est absente.
+        """
+        with self._verrou:
+            present = cle in self._index
+            if present:
+                self._index.move_to_end(cle)
+        wav = None
+        if present:
+            try:
+                wav = np.load(self._chemin(cle)).astype(np.float32) / 32767
+                os.utime(self._chemin(cle))
+            except (OSError, ValueError) as e:
+                print(f"Audio en cache illisible {cle}: {e}")
+                with self._verrou:
+                    self._octets -= self._index.pop(cle, 0)
+
+        with self._verrou:
+            if wav is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return wav
+
+    def put(self, cle: str, wav):
+        """
+        Enregistre une forme d'onde (valeurs dans [-1, 1]) en int16, puis libère de la place si besoin.
+        """
+        donnees = (np.clip(np.asarray(wav, dtype=np.float32), -1.0, 1.0) * 32767).astype(np.int16)
+        chemin = self._chemin(cle)
+        # fichier temporaire propre à cet écrivain: plusieurs fils ou processus peuvent écrire la même clé
+        with tempfile.NamedTemporaryFile(dir=self.dossier, suffix=".tmp", delete=False) as f:
+            np.save(f, donnees)
+        os.replace(f.name, chemin)
+
+        with self._verrou:
+            self._octets -= self._index.pop(cle, 0)
+            self._index[cle] = os.path.getsize(chemin)
+            self._octets += self._index[cle]
+            evincees = []
+            while self._octets > self.max_octets and len(self._index) > 1:
+                ancienne, taille = self._index.popitem(last=False)
+                self._octets -= taille
+                evincees.append(ancienne)
+        for ancienne in evincees:
+            try:
+                os.remove(self._chemin(ancienne))
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        with self._verrou:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entrees": len(self._index),
+                "octets": self._octets,
+            }
+
+
+_cache = None
+_verrou_cache = threading.Lock()
+
+
+def get_cache_audio() -> CacheAudio:
+    """
+    Retourne le cache audio du processus, créé au premier appel.
+    """
+    global _cache
+    with _verrou_cache:
+        if _cache is None:
+            _cache = CacheAudio(max_octets=int(os.getenv("GOAI_AUDIO_CACHE_MO", 512)) * 2**20)
+    return _cache
+
+
+def synthetiser_avec_cache(phrases: list, voix: str, modele: str, parametres: tuple, synthetiser) -> list:
+    """
+    Synthétise une liste de phrases en ne calculant que celles absentes du cache.
+
+    Les phrases identiques (après normalisation) ne sont synthétisées qu'une fois.
+
+    Args:
+        phrases (list[str]): les phrases, dans l'ordre.
+        voix (str): l'empreinte de la voix de référence ("" pour un modèle à voix unique).
+        modele (str): l'identifiant et la révision du modèle.
+        parametres (tuple): les paramètres d'échantillonnage.
+        synthetiser (callable): `synthetiser(phrases)` retourne une forme d'onde par phrase.
+
+    Returns:
+        list[np.ndarray]: une forme d'onde float32 par phrase.
+    """
+    cache = get_cache_audio()
+    cles = [cache.cle(phrase, voix, modele, parametres) for phrase in phrases]
+
+    resultats = {}
+    manquantes = {}
+    for cle, phrase in zip(cles, phrases):
+        if cle in resultats or cle in manquantes:
+            continue
+        wav = cache.get(cle)
+        if wav is None:
+            manquantes[cle] = phrase
+        else:
+            resultats[cle] = wav
+
+    if manquantes:
+        wavs = synthetiser(list(manquantes.values()))
+        for cle, wav in zip(manquantes, wavs):
+            wav = np.asarray(wav, dtype=np.float32).reshape(-1)
+            cache.put(cle, wav)
+            resultats[cle] = wav
+
+    return [resultats[cle] for cle in cles]
@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import platform
+import tempfile
+import argparse
+
+import numpy as np
+import torch
+
+from goai_helpers.amelioration import get_service, MODES, FENETRE_S
+from goai_helpers.traduction_cache import CACHE_DIR
+
+
+CHEMIN_TABLE = os.path.join(CACHE_DIR, "calibration_amelioration.json")
+NFES = (8, 16, 32, 64, 128)
+SOLVERS = ("midpoint", "rk4", "euler")
+# chemins d'exécution d'enhance_speech: un seul morceau (au plus FENETRE_S secondes) ou par morceaux
+CHEMINS = ("court", "long")
+
+
+def chemin_execution(duree_audio_s: float) -> str:
+    return "court" if duree_audio_s <= FENETRE_S else "long"
+
+
+def nom_machine() -> str:
+    """
+    Identifiant de la machine pour la table de calibration (modèle de GPU, sinon processeur).
+    """
+    if torch.cuda.is_available():
+        return f"{torch.cuda.get_device_name(0)} x{torch.cuda.device_count()}"
+    return f"cpu {platform.processor() or platform.machine()} x{os.cpu_count()}"
+
+
+def charger_table(chemin: str = CHEMIN_TABLE, machine: str = None) -> dict:
+    """
+    Retourne la table {mode: {chemin: {solver: {nfe: secondes par seconde d'audio}}}} de la machine,
+    ou {} si elle n'a pas été calibrée (les tables d'un ancien format sont ignorées).
+    """
+    if not os.path.exists(chemin):
+        return {}
+    with open(chemin, encoding="utf-8") as f:
+        tables = json.load(f)
+    table = tables.get(machine or nom_machine(), {})
+    return {
+        mode: {
+            chemin_exec: {solver: {int(nfe): cout for nfe, cout in couts.items()} for solver, couts in solvers.items()}
+            for chemin_exec, solvers in table[mode].items() if chemin_exec in CHEMINS
+        }
+        for mode in MODES if isinstance(table.get(mode), dict)
+    }
+
+
+def _mesurer(service, audio, sampling_rate, mode, nfe, solver) -> float:
+    """
+    Durée (secondes) du débruitage + amélioration d'un audio par le même chemin qu'enhance_speech.
+    """
+    start_time = time.time()
+    if chemin_execution(len(audio) / sampling_rate) == "court":
+        service.ameliorer(audio, sampling_rate, mode=mode, nfe=nfe, solver=solver)
+    else:
+        for _ in service.ameliorer_par_morceaux(audio, sampling_rate, mode=mode, nfe=nfe, solver=solver):
+            pass
+    return time.time() - start_time
+
+
+def calibrer(duree_court_s: float = FENETRE_S, duree_long_s: float = 3 * FENETRE_S, nfes=NFES, solvers=SOLVERS,
+             modes=MODES, sampling_rate: int = 24000, chemin: str = CHEMIN_TABLE) -> dict:
+    """
+    Mesure le coût du débruitage + amélioration pour chaque (mode, chemin, solver, nfe) et enregistre
+    la table de la machine dans `chemin`. Le chemin "court" est mesuré sur `duree_court_s` secondes
+    (un seul morceau), le chemin "long" sur `duree_long_s` secondes (par morceaux, avec recollage):
+    ce sont ces longs audios qui risquent de dépasser la fenêtre GPU.
+
+    Returns:
+        dict: {mode: {chemin: {solver: {nfe: secondes de calcul par seconde d'audio}}}}.
+    """
+    if duree_court_s > FENETRE_S or duree_long_s <= FENETRE_S:
+        raise ValueError(f"il faut duree_court_s <= {FENETRE_S} < duree_long_s.")
+    service = get_service()
+    rng = np.random.default_rng(0)
+    # bruit modulé en amplitude, pour que le débruiteur et l'améliorateur aient du travail
+    t = np.arange(int(duree_long_s * sampling_rate)) / sampling_rate
+    audio = (0.1 * rng.standard_normal(len(t)) * (1 + np.sin(2 * np.pi * 3 * t))).astype(np.float32)
+    audios = {"court": audio[:int(duree_court_s * sampling_rate)], "long": audio}
+
+    # chargement des modèles et préchauffage, non mesurés
+    service.ameliorer(audio[:sampling_rate], sampling_rate, nfe=min(nfes), solver=solvers[0])
+
+    table = {}
+    for mode in modes:
+        table[mode] = {}
+        for chemin_exec, extrait in audios.items():
+            table[mode][chemin_exec] = {}
+            for solver in solvers:
+                table[mode][chemin_exec][solver] = {}
+                for nfe in nfes:
+                    cout = _mesurer(service, extrait, sampling_rate, mode, nfe, solver) * sampling_rate / len(extrait)
+                    table[mode][chemin_exec][solver][nfe] = cout
+                    print(f"{mode} {chemin_exec} {solver} nfe={nfe}: {cout:.3f} s par seconde d'audio")
+
+    tables = {}
+    if os.path.exists(chemin):
+        with open(chemin, encoding="utf-8") as f:
+            tables = json.load(f)
+    # une calibration partielle (--modes) garde les mesures des autres modes
+    existante = {mode: v for mode, v in tables.get(nom_machine(), {}).items() if mode in MODES}
+    tables[nom_machine()] = {**existante, **table}
+    os.makedirs(os.path.dirname(chemin), exist_ok=True)
+    with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(chemin), suffix=".tmp", delete=False,
+                                     encoding="utf-8") as f:
+        json.dump(tables, f, indent=2)
+    os.replace(f.name, chemin)
+    return table
+
+
+def predire(table: dict, solver: str, nfe: int, duree_audio_s: float, mode: str = "parallele"):
+    """
+    Durée prédite (secondes) de l'amélioration de `duree_audio_s` secondes d'audio dans `mode`, par
+    interpolation linéaire en nfe entre les points mesurés pour le chemin d'exécution correspondant
+    à cette durée; None si ce cas n'est pas calibré.
+    """
+    couts = table.get(mode, {}).get(chemin_execution(duree_audio_s), {}).get(solver.lower())
+    if not couts:
+        return None
+    points = sorted(couts.items())
+    nfes = [n for n, _ in points]
+    cout = float(np.interp(nfe, nfes, [c for _, c in points]))
+    if nfe > nfes[-1] and len(points) > 1:
+        # extrapolation linéaire au-delà du dernier point
+        (n1, c1), (n2, c2) = points[-2], points[-1]
+        cout = c2 + (nfe - n2) * (c2 - c1) / (n2 - n1)
+    return cout * duree_audio_s
+
+
+def choisir_nfe(duree_audio_s: float, latence_cible_s: float, solver: str = "midpoint", nfe_max: int = 128,
+                table: dict = None, nfes=NFES, mode: str = "parallele"):
+    """
+    Choisit le plus grand nfe (au plus `nfe_max`) dont la durée prédite, attente dans la file
+    du service d'amélioration comprise, tient dans `latence_cible_s`.
+
+    Returns:
+        tuple[int, float | None]: le nfe retenu et la durée prédite (None sans calibration, le nfe
+        demandé étant alors conservé). Si aucun nfe ne tient, le plus petit est retenu.
+    """
+    table = charger_table() if table is None else table
+    if predire(table, solver, nfe_max, duree_audio_s, mode) is None:
+        return nfe_max, None
+
+    stats = get_service().stats()
+    attente = stats["en_attente"] * stats["temps_moyen"] / max(stats["travailleurs"], 1)
+
+    candidats = sorted({n for n in nfes if n <= nfe_max} | {nfe_max})
+    for nfe in reversed(candidats):
+        prediction = attente + predire(table, solver, nfe, duree_audio_s, mode)
+        if prediction <= latence_cible_s:
+            return nfe, prediction
+    return candidats[0], attente + predire(table, solver, candidats[0], duree_audio_s, mode)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibration du coût de l'amélioration de la parole sur cette machine.")
+    parser.add_argument("--duree-court", type=float, default=FENETRE_S, help="durée de l'audio court, en un morceau (secondes)")
+    parser.add_argument("--duree-long", type=float, default=3 * FENETRE_S, help="durée de l'audio long, par morceaux (secondes)")
+    parser.add_argument("--nfes", type=int, nargs="+", default=list(NFES))
+    parser.add_argument("--solvers", nargs="+", default=list(SOLVERS))
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--chemin", default=CHEMIN_TABLE)
+    args = parser.parse_args()
+
+    calibrer(args.duree_court, args.duree_long, tuple(args.nfes), tuple(args.solvers), tuple(args.modes),
+             chemin=args.chemin)
+    print(f"Table de {nom_machine()} enregistrée dans {args.chemin}")
@@ -0,0 +1,217 @@
+import re
+import time
+import argparse
+import statistics
+
+from goai_helpers.utils import diviser_phrases_moore
+
+
+# limites de propositions: après , ; : ou avant un tiret d'incise
+fin_de_proposition = re.compile(r"(?<=[,;:])\s+|\s+(?=[-–—]\s)")
+
+
+def compteur_xtts(tokenizer, langue: str = "mos"):
+    """
+    Longueur d'un texte en tokens pour le VoiceBpeTokenizer de XTTS (même prétraitement que l'inférence).
+    """
+    return lambda texte: len(tokenizer.encode(texte.strip().lower(), lang=langue))
+
+
+def compteur_nllb(tokenizer):
+    """
+    Longueur d'un texte en tokens pour un tokenizer NLLB (tokens spéciaux compris).
+    """
+    return lambda texte: len(tokenizer(texte).input_ids)
+
+
+def _decouper_mots(texte: str, longueur, max_tokens: int) -> list:
+    """
+    Dernier recours pour une proposition trop longue: découpe entre les mots.
+    """
+    morceaux, courant = [], []
+    for mot in texte.split():
+        if courant and longueur(" ".join(courant + [mot])) > max_tokens:
+            morceaux.append(" ".join(courant))
+            courant = []
+        courant.append(mot)
+    if courant:
+        morceaux.append(" ".join(courant))
+    return morceaux
+
+
+def _regrouper(morceaux: list, longueur, cible: int, min_tokens: int = None) -> list:
+    """
+    Regroupe les morceaux consécutifs tant que leur longueur cumulée ne dépasse pas `cible`.
+    Avec `min_tokens`, seuls les morceaux plus courts sont regroupés; les autres restent seuls.
+    """
+    regroupes, courant, total = [], [], 0
+    for morceau in morceaux:
+        n = longueur(morceau)
+        seul = min_tokens is not None and n >= min_tokens
+        if courant and (seul or total + n > cible):
+            regroupes.append(" ".join(courant))
+            courant, total = [], 0
+        if seul:
+            regroupes.append(morceau)
+            continue
+        courant.append(morceau)
+        total += n
+    if courant:
+        regroupes.append(" ".join(courant))
+    return regroupes
+
+
+def decouper_par_budget(texte: str, compter, max_tokens: int, cible_tokens: int = None,
+                        min_tokens: int = None) -> list:
+    """
+    Découpe un texte en morceaux dont la longueur, mesurée avec le vrai tokenizer, respecte un budget.
+
+    Le texte est d'abord divisé en phrases (diviser_phrases_moore). Une phrase trop longue est
+    redécoupée à ses limites de propositions (puis entre les mots si une proposition dépasse
+    encore le budget); les phrases voisines de moins de `min_tokens` tokens sont ensuite
+    regroupées jusqu'à `cible_tokens`, une phrase trop courte ne valant pas un appel au décodeur.
+    Les autres phrases restent seules, de sorte que les caches de traduction et d'audio, dont
+    les clés sont les morceaux, gardent la granularité de la phrase.
+
+    Args:
+        texte (str): le texte à découper.
+        compter (callable): `compter(texte)` retourne la longueur en tokens (compteur_xtts, compteur_nllb).
+        max_tokens (int): longueur maximale d'un morceau.
+        cible_tokens (int): longueur visée lors du regroupement (par défaut `max_tokens`).
+        min_tokens (int): longueur en dessous de laquelle une phrase est regroupée avec ses voisines
+            (toutes les phrases le sont si None).
+
+    Returns:
+        list[str]: les morceaux, dans l'ordre du texte.
+    """
+    cible = min(cible_tokens or max_tokens, max_tokens)
+    memo = {}
+
+    def longueur(morceau):
+        if morceau not in memo:
+            memo[morceau] = compter(morceau)
+        return memo[morceau]
+
+    morceaux = []
+    for phrase in diviser_phrases_moore(texte):
+        if longueur(phrase) <= max_tokens:
+            morceaux.append(phrase)
+            continue
+        propositions = []
+        for proposition in fin_de_proposition.split(phrase):
+            proposition = proposition.strip()
+            if not proposition:
+                continue
+            if longueur(proposition) <= max_tokens:
+                propositions.append(proposition)
+            else:
+                propositions.extend(_decouper_mots(proposition, longueur, max_tokens))
+        # recoller les propositions en morceaux aussi longs que le budget le permet
+        morceaux.extend(_regrouper(propositions, longueur, max_tokens))
+
+    return _regrouper(morceaux, longueur, cible, min_tokens)
+
+
+def _statistiques(morceaux: list, compter, max_tokens: int, taille_paquet: int) -> dict:
+    longueurs = [compter(morceau) for morceau in morceaux]
+    # efficacité du padding en paquets triés par longueur, comme goai_traduction et inference_lot
+    triees = sorted(longueurs)
+    paquets = [triees[i:i + taille_paquet] for i in range(0, len(triees), taille_paquet)]
+    utile = sum(triees)
+    avec_padding = sum(max(paquet) * len(paquet) for paquet in paquets)
+    return {
+        "morceaux": len(longueurs),
+        "moyenne": statistics.mean(longueurs) if longueurs else 0.0,
+        "ecart_type": statistics.pstdev(longueurs) if longueurs else 0.0,
+        "max": max(longueurs, default=0),
+        "hors_budget": sum(n > max_tokens for n in longueurs),
+        "paquets": len(paquets),
+        "efficacite_padding": utile / avec_padding if avec_padding else 1.0,
+    }
+
+
+def benchmark(textes: list, compter, max_tokens: int, cible_tokens: int, min_tokens: int = None, taille_paquet: int = 8,
+              traduire=None):
+    """
+    Compare diviser_phrases_moore et decouper_par_budget sur des textes: nombre et longueurs des
+    morceaux, dépassements du budget, efficacité du padding et, si `traduire(morceaux)` est fourni,
+    débit de bout en bout (caractères de texte source par seconde).
+    """
+    decoupeurs = {
+        "phrases": diviser_phrases_moore,
+        "budget": lambda texte: decouper_par_budget(texte, compter, max_tokens, cible_tokens, min_tokens),
+    }
+    nb_caracteres = sum(len(texte) for texte in textes)
+    resultats = {}
+    for nom, decouper in decoupeurs.items():
+        start_time = time.time()
+        morceaux = [morceau for texte in textes for morceau in decouper(texte)]
+        temps_decoupage = time.time() - start_time
+
+        stats = _statistiques(morceaux, compter, max_tokens, taille_paquet)
+        stats["temps_decoupage"] = temps_decoupage
+        if traduire is not None:
+            start_time = time.time()
+            traduire(morceaux)
+            stats["caracteres_par_seconde"] = nb_caracteres / (time.time() - start_time)
+        resultats[nom] = stats
+
+        print(
+            f"{nom}: {stats['morceaux']} morceaux, {stats['moyenne']:.1f} ± {stats['ecart_type']:.1f} tokens "
+            f"(max {stats['max']}, {stats['hors_budget']} hors budget), {stats['paquets']} paquets, "
+            f"padding utile {stats['efficacite_padding']:.0%}, découpage {temps_decoupage * 1000:.1f} ms"
+            + (f", {stats['caracteres_par_seconde']:.0f} car/s" if "caracteres_par_seconde" in stats else "")
+        )
+    return resultats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark du découpage par budget de tokens contre le découpage en phrases.")
+    parser.add_argument("fichiers", nargs="+", help="fichiers texte, un texte par paragraphe")
+    parser.add_argument("--tokenizer", choices=["nllb", "xtts"], default="nllb")
+    parser.add_argument("--vocab", help="vocab.json du modèle XTTS (avec --tokenizer xtts)")
+    parser.add_argument("--max-tokens", type=int, default=None)
+    parser.add_argument("--cible-tokens", type=int, default=None)
+    parser.add_argument("--min-tokens", type=int, default=None)
+    parser.add_argument("--traduire", action="store_true", help="mesurer aussi le débit de traduction fr -> mos")
+    args = parser.parse_args()
+
+    textes = []
+    for fichier in args.fichiers:
+        with open(fichier, encoding="utf-8") as f:
+            textes.extend(paragraphe for paragraphe in f.read().split("\n\n") if paragraphe.strip())
+
+    traduire = None
+    if args.tokenizer == "xtts":
+        from TTS.tts.layers.xtts.tokenizer import VoiceBpeTokenizer
+        from goai_helpers.goai_tts2 import MAX_TOKENS_PHRASE, CIBLE_TOKENS_PHRASE, MIN_TOKENS_PHRASE
+
+        compter = compteur_xtts(VoiceBpeTokenizer(vocab_file=args.vocab))
+        max_tokens, cible_tokens, min_tokens = MAX_TOKENS_PHRASE, CIBLE_TOKENS_PHRASE, MIN_TOKENS_PHRASE
+    else:
+        from goai_helpers import goai_traduction
+
+        model_id = goai_traduction.resoudre_modele("fra_Latn", "mos_Latn")
+        compter = compteur_nllb(goai_traduction.charger_tokenizer(model_id))
+        max_tokens, cible_tokens = goai_traduction.max_tokens_phrase, goai_traduction.cible_tokens_phrase
+        min_tokens = goai_traduction.min_tokens_phrase
+        if args.traduire:
+            # sans le cache de traduction, pour mesurer le modèle
+            import torch
+
+            device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+            tokenizer, model = goai_traduction.charger_modele(model_id, device)
+
+            def traduire(morceaux):
+                for paquet in goai_traduction.grouper_par_longueur([compter(m) for m in morceaux]):
+                    goai_traduction.traduire_paquet(
+                        tokenizer, model, [morceaux[i] for i in paquet], "fra_Latn", "mos_Latn", device
+                    )
+
+    benchmark(
+        textes, compter,
+        args.max_tokens or max_tokens,
+        args.cible_tokens or cible_tokens,
+        args.min_tokens or min_tokens,
+        traduire=traduire,
+    )
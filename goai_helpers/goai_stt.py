@@ -1,14 +1,112 @@
 import torch
-import librosa
 import time
 from transformers import set_seed, Wav2Vec2ForCTC, AutoProcessor
 import numpy as np
 import spaces
 import os
 
+from goai_helpers.audio import charger_audio, stats_ingest
+from goai_helpers.model_registry import registry
+from goai_helpers.vad import detecter_parole, extraire_segments
+
+auth_token = os.getenv('HF_SPACE_TOKEN')
+
+
+MODEL_ID = "ArissBandoss/wav2vec2-large-mms-1b-mos-V2"
+
+
+def charger_modele_ctc(device):
+    """
+    retourner le couple (processor, modèle) wav2vec2-mms depuis le registre partagé.
+    """
+    def loader():
+        processor = AutoProcessor.from_pretrained(MODEL_ID, token=auth_token)
+        model = Wav2Vec2ForCTC.from_pretrained(MODEL_ID, token=auth_token, target_lang="mos", ignore_mismatched_sizes=True).to(device)
+        model.eval()
+        return processor, model
+
+    return registry.get(MODEL_ID, loader, device=device)
+
+
+# fenêtrage de l'inférence CTC (secondes): fenêtre totale et contexte de chaque côté
+FENETRE_S = 20
+MARGE_S = 2
+
+
+def decouper_fenetres(longueur, fenetre, marge, pas_trame=1):
+    """
+    découper un signal de `longueur` échantillons en fenêtres chevauchantes.
+    chaque fenêtre garde `marge` échantillons de contexte de chaque côté (sauf aux extrémités du signal);
+    les zones utiles (hors contexte) des fenêtres successives se suivent exactement.
+
+    return
+    ---------- 
+    fenetres: list[tuple[int, int, int, int]]
+        (début, fin, contexte gauche, contexte droit) de chaque fenêtre, en échantillons.
+    """
+    # aligner sur la durée d'une trame de logits pour que les découpes tombent entre deux trames
+    fenetre = max(fenetre // pas_trame, 1) * pas_trame
+    marge = (marge // pas_trame) * pas_trame
+    pas = fenetre - 2 * marge
+    if pas <= 0:
+        raise ValueError("la fenêtre doit être plus longue que deux fois la marge.")
+
+    fenetres = []
+    debut = 0
+    while True:
+        fin = min(debut + fenetre, longueur)
+        gauche = 0 if debut == 0 else marge
+        derniere = fin >= longueur
+        fenetres.append((debut, fin, gauche, 0 if derniere else marge))
+        if derniere:
+            return fenetres
+        debut += pas
+
+
+def transcrire_ctc(processor, model, morceaux, device, batch_size=8, fenetre_s=FENETRE_S, marge_s=MARGE_S):
+    """
+    transcrire une liste de morceaux d'audio 16 kHz.
+
+    chaque morceau est découpé en fenêtres chevauchantes de `fenetre_s` secondes, et les fenêtres
+    de tous les morceaux passent dans le modèle par paquets de `batch_size`. les logits de chaque
+    fenêtre sont tronqués de leur contexte (`marge_s` secondes de chaque côté) puis recollés avant
+    le décodage, de sorte que la mémoire reste constante quelle que soit la durée de l'audio.
+    un morceau plus court qu'une fenêtre est traité en un seul passage, comme sans fenêtrage.
+    """
+    # nombre d'échantillons par trame de logits (320 pour wav2vec2)
+    pas_trame = int(np.prod(model.config.conv_stride))
+
+    fenetres = []
+    for i, morceau in enumerate(morceaux):
+        for debut, fin, gauche, droite in decouper_fenetres(len(morceau), int(fenetre_s * 16000), int(marge_s * 16000), pas_trame):
+            fenetres.append((i, debut, fin, gauche, droite))
+
+    # l'argmax étant calculé trame par trame, le recoller avant ou après l'argmax est équivalent:
+    # on ne conserve donc que les ids prédits des trames utiles
+    pred_ids = [[] for _ in morceaux]
+    for debut_paquet in range(0, len(fenetres), batch_size):
+        paquet = fenetres[debut_paquet:debut_paquet + batch_size]
+        signaux = [morceaux[i][debut:fin] for i, debut, fin, _, _ in paquet]
+        inputs = processor(signaux, sampling_rate=16000, return_tensors="pt", padding=True).to(device)
+
+        with torch.no_grad():
+            logits = model(**inputs).logits
+
+        longueurs = model._get_feat_extract_output_lengths(torch.tensor([len(signal) for signal in signaux]))
+        ids = torch.argmax(logits, dim=-1).cpu()
+        for j, (i, debut, fin, gauche, droite) in enumerate(paquet):
+            # la convolution rend ~L/pas_trame - 1 trames: la zone utile se compte depuis la gauche,
+            # la dernière fenêtre allant jusqu'à la dernière trame
+            trames = int(longueurs[j])
+            g = gauche // pas_trame
+            d = trames if droite == 0 else min(g + (fin - debut - gauche - droite) // pas_trame, trames)
+            pred_ids[i].append(ids[j, g:d])
+
+    return [processor.decode(torch.cat(ids)) if ids else "" for ids in pred_ids]
+
 
 @spaces.GPU
-def goai_stt(fichier):
+def goai_stt(fichier, vad=True, fenetre_s=FENETRE_S, marge_s=MARGE_S):
     """
     transcrire un fichier audio donné.
     
@@ -16,6 +114,10 @@ def goai_stt(fichier):
     ---------- 
     fichier: str | tuple[int, np.ndarray]
         le chemin d'accès au fichier audio ou le tuple contenant le taux d'échantillonnage et les données audio.
+    vad: bool
+        si True, seuls les segments de parole détectés sont transcrits (les silences sont ignorés).
+    fenetre_s, marge_s: float
+        durée des fenêtres d'inférence et du contexte gardé de chaque côté (voir `transcrire_ctc`).
         
     return
     ---------- 
@@ -35,40 +137,25 @@ def goai_stt(fichier):
     start_time = time.time()
     
     ### charger le modèle de transcription 
-    model_id = "ArissBandoss/wav2vec2-large-mms-1b-mos-V2"
-
-    processor = AutoProcessor.from_pretrained(model_id, token=auth_token)
-    model = Wav2Vec2ForCTC.from_pretrained(model_id, token=auth_token, target_lang="mos", ignore_mismatched_sizes=True).to(device)
+    processor, model = charger_modele_ctc(device)
 
-    if isinstance(fichier, str):
-        ### preprocessing de l'audio à partir d'un fichier
-        signal, sampling_rate = librosa.load(fichier, sr=16000)
-    else:
-        ### preprocessing de l'audio à partir d'un tableau numpy
-        sampling_rate, signal = fichier
+    ### preprocessing de l'audio (fichier ou tableau numpy): mono, float32, 16 kHz
+    signal = charger_audio(fichier, 16000)
 
-    # convert the signal to float32
-    if signal.dtype != np.float32:
-        signal = signal.astype(np.float32)
-    
-    if sampling_rate != 16000:
-        signal = librosa.resample(signal, orig_sr=sampling_rate, target_sr=16000)
-        sampling_rate = 16000
-        
-    if signal.ndim > 1:
-        signal = np.mean(signal, axis=1)
-        
     if len(signal) < 160:
         raise ValueError("Le fichier audio est trop court pour être traité.")
 
-    inputs = processor(signal, sampling_rate=16000, return_tensors="pt", padding=True).to(device)
-    
+    ### détecter les segments de parole
+    segments = detecter_parole(signal, 16000, repli=True) if vad else [(0, len(signal))]
+
     ### faire l'inférence
-    with torch.no_grad():
-        outputs = model(**inputs).logits
-    
-    pred_ids = torch.argmax(outputs, dim=-1)[0]
-    transcription = processor.decode(pred_ids)
+    transcriptions = transcrire_ctc(processor, model, extraire_segments(signal, segments), device, fenetre_s=fenetre_s, marge_s=marge_s)
+    transcription = " ".join(t for t in transcriptions if t)
 
     print("temps écoulé: ", int(time.time() - start_time), " secondes")
+    ingest = stats_ingest()
+    print(
+        f"ingestion audio (cumul sur {ingest['appels']} appels): lecture {ingest['lecture']:.2f} s, "
+        f"downmix {ingest['downmix']:.2f} s, rééchantillonnage {ingest['resample']:.2f} s"
+    )
     return transcription
@@ -2,7 +2,13 @@ import torch
 import spaces
 from transformers import pipeline
 
+from goai_helpers.audio import charger_audio
+from goai_helpers.model_registry import registry
+from goai_helpers.vad import detecter_parole, extraire_segments
+
 DEVICE = 0 if torch.cuda.is_available() else "cpu"
+# mode d'ASR assisté (voir goai_stt_speculatif.transcrire_assiste)
+MODELE_ASSISTE = "ArissBandoss/whisper-large-v3-turbo-mos (assisté par whisper-small-mos)"
 # Whisper's full language ID mapping
 LANG_TO_ID = {
     "en": 0, "zh": 1, "de": 2, "es": 3, "ru": 4, "ko": 5, "fr": 6, "ja": 7,
@@ -21,6 +27,16 @@ LANG_TO_ID = {
     "tt": 92, "haw": 93, "ln": 94, "ha": 95, "ba": 96, "jw": 97, "su": 98
 }
 
+
+def charger_pipeline(model):
+    # le pipeline est conservé dans le registre; le découpage est passé à l'appel
+    return registry.get(
+        model,
+        lambda: pipeline(task="automatic-speech-recognition", model=model, device=DEVICE),
+        device=DEVICE,
+    )
+
+
 @spaces.GPU
 def transcribe(
         inputs, 
@@ -28,19 +44,25 @@ def transcribe(
         language, 
         batch_size, 
         chunk_length_s, 
-        stride_length_s
+        stride_length_s,
+        vad=False
     ):
     
     if inputs is None:
         raise gr.Error("No audio file submitted! Please upload or record an audio file before submitting your request.")
     
-    pipe = pipeline(
-        task="automatic-speech-recognition",
-        model=model,
-        chunk_length_s=chunk_length_s,
-        stride_length_s=stride_length_s,
-        device=DEVICE,
-    )
+    if model == MODELE_ASSISTE:
+        # décodage assisté: whisper-small-mos propose, whisper-large-v3-turbo-mos vérifie; fenêtres
+        # fixes de 30 s (chunk_length_s et stride_length_s ne s'appliquent pas) ou segments de la VAD
+        from goai_helpers.goai_stt_speculatif import transcrire_assiste
+        signal = charger_audio(inputs, 16000)
+        fenetres = extraire_segments(signal, detecter_parole(signal, 16000, repli=True)) if vad else None
+        transcription_text, _ = transcrire_assiste(
+            signal, language if language in LANG_TO_ID else None, fenetres=fenetres, batch_size=batch_size
+        )
+        return transcription_text, ecrire_transcription(transcription_text)
+
+    pipe = charger_pipeline(model)
 
     
     forced_decoder_ids = None
@@ -51,9 +73,22 @@ def transcribe(
     if forced_decoder_ids:
         generate_kwargs["forced_decoder_ids"] = forced_decoder_ids
     
+    if vad:
+        # seuls les segments de parole (30 s max.) sont transcrits, par paquets de `batch_size`;
+        # ils remplacent le découpage chunk_length_s / stride_length_s
+        signal = charger_audio(inputs, 16000)
+        segments = detecter_parole(signal, 16000, repli=True)
+        morceaux = [{"raw": morceau, "sampling_rate": 16000} for morceau in extraire_segments(signal, segments)]
+        outputs = pipe(morceaux, batch_size=batch_size, **generate_kwargs) if morceaux else []
+
+        transcription_text = " ".join(t for t in (output['text'].strip() for output in outputs) if t)
+        return transcription_text, ecrire_transcription(transcription_text)
+
     output = pipe(
-        inputs, 
+        {"raw": charger_audio(inputs, 16000), "sampling_rate": 16000}, 
         batch_size=batch_size, 
+        chunk_length_s=chunk_length_s,
+        stride_length_s=stride_length_s,
         #padding=True, 
         #truncation=True, 
         **generate_kwargs
@@ -61,8 +96,15 @@ def transcribe(
 
     transcription_text = output['text']
 
+    return transcription_text, ecrire_transcription(transcription_text)
+
+
+def ecrire_transcription(transcription_text):
+    """
+    écrire la transcription dans un fichier
+    """
     transcription_file_path = "transcription.txt"
     with open(transcription_file_path, "w") as f:
         f.write(transcription_text)
     
-    return transcription_text, transcription_file_path
\ No newline at end of file
+    return transcription_file_path
\ No newline at end of file
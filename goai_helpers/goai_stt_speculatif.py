@@ -0,0 +1,394 @@
+import os
+import copy
+import glob
+import time
+import argparse
+
+import torch
+from transformers import AutoProcessor, WhisperConfig, WhisperForConditionalGeneration
+from transformers.modeling_outputs import BaseModelOutput
+
+from goai_helpers.audio import charger_audio
+from goai_helpers.model_registry import registry
+from goai_helpers.goai_stt2 import LANG_TO_ID
+
+auth_token = os.getenv('HF_SPACE_TOKEN')
+
+MODELE_PRINCIPAL = "ArissBandoss/whisper-large-v3-turbo-mos"
+MODELE_BROUILLON = "ArissBandoss/whisper-small-mos"
+
+DUREE_FENETRE = 30  # secondes d'audio par passage de l'encodeur Whisper
+MAX_NOUVEAUX_TOKENS = 440
+# correspondances d'ids entre les vocabulaires (principal, brouillon), calculées une fois par couple
+_correspondances = {}
+
+
+def _tronquer_cache(past, longueur):
+    """
+    Ne garde que les `longueur` premières positions du cache d'auto-attention du décodeur.
+    """
+    if hasattr(past, "crop"):
+        past.crop(longueur)
+        return past
+    return tuple((couche[0][:, :, :longueur], couche[1][:, :, :longueur]) + tuple(couche[2:]) for couche in past)
+
+
+class _Decodeur:
+    """
+    Décodeur Whisper avec cache KV qui ne recalcule que les tokens nouveaux
+    par rapport à la dernière séquence vue.
+    """
+
+    def __init__(self, model, encoder_outputs, suppress_tokens=None, begin_suppress_tokens=None):
+        self.model = model
+        self.encoder_outputs = encoder_outputs
+        self.suppress_tokens = list(suppress_tokens or [])
+        self.begin_suppress_tokens = list(begin_suppress_tokens or [])
+        self.device = encoder_outputs.last_hidden_state.device
+
+        self._past = None
+        self._tokens = []
+
+    def logits(self, sequence):
+        """
+        Retourne les logits des positions de `sequence` non encore en cache;
+        la dernière ligne prédit le token suivant la séquence.
+        """
+        # plus long préfixe commun avec le cache, en gardant au moins un token à calculer
+        commun = 0
+        limite = min(len(self._tokens), len(sequence) - 1)
+        while commun < limite and self._tokens[commun] == sequence[commun]:
+            commun += 1
+        if self._past is not None and commun < len(self._tokens):
+            self._past = _tronquer_cache(self._past, commun)
+
+        ids = torch.tensor([sequence[commun:]], device=self.device)
+        with torch.no_grad():
+            sortie = self.model(
+                encoder_outputs=self.encoder_outputs,
+                decoder_input_ids=ids,
+                past_key_values=self._past if commun else None,
+                use_cache=True,
+            )
+        self._past = sortie.past_key_values
+        self._tokens = list(sequence)
+        return sortie.logits[0].float()
+
+    def filtrer(self, logits, premiere_position):
+        """
+        Applique suppress_tokens, et begin_suppress_tokens à la première position générée.
+        `premiere_position` est l'indice (dans la partie générée) de la première ligne de `logits`.
+        """
+        logits = logits.clone()
+        if self.suppress_tokens:
+            logits[:, self.suppress_tokens] = -float("inf")
+        if self.begin_suppress_tokens and 0 <= -premiere_position < len(logits):
+            logits[-premiere_position, self.begin_suppress_tokens] = -float("inf")
+        return logits
+
+
+def decoder_speculatif(
+        principal,
+        prompt,
+        eos_token_id,
+        brouillon=None,
+        brouillon_depuis_principal=None,
+        principal_depuis_brouillon=None,
+        nb_proposes=4,
+        max_nouveaux_tokens=MAX_NOUVEAUX_TOKENS
+    ):
+    """
+    Décodage glouton du modèle principal, éventuellement accéléré par un modèle brouillon.
+
+    À chaque étape, le brouillon propose `nb_proposes` tokens de façon gloutonne; le principal
+    les vérifie en un seul passage et garde le plus long préfixe qui coïncide avec ses propres
+    prédictions, suivi de son token suivant. Le résultat est donc celui du décodage glouton
+    du modèle principal seul.
+
+    Args:
+        principal (_Decodeur): décodeur du modèle vérificateur.
+        prompt (list[int]): tokens de départ (ids du principal).
+        eos_token_id (int): token de fin du principal.
+        brouillon (_Decodeur): décodeur du modèle brouillon (None = décodage glouton simple).
+        brouillon_depuis_principal (list[int]): id brouillon de chaque id du principal.
+        principal_depuis_brouillon (list[int]): id principal de chaque id brouillon (-1 si absent).
+        nb_proposes (int): nombre de tokens proposés par le brouillon à chaque étape.
+        max_nouveaux_tokens (int): nombre maximal de tokens générés.
+
+    Returns:
+        tuple[list[int], dict]: les tokens générés (sans le prompt) et les statistiques
+        (étapes, tokens proposés et acceptés).
+    """
+    sequence = list(prompt)
+    stats = {"etapes": 0, "proposes": 0, "acceptes": 0}
+
+    while len(sequence) - len(prompt) < max_nouveaux_tokens:
+        position = len(sequence) - len(prompt)
+
+        # 1. propositions du brouillon
+        candidats = []
+        if brouillon is not None:
+            inconnu = brouillon_depuis_principal[eos_token_id]
+            base = [brouillon_depuis_principal[t] if t < len(brouillon_depuis_principal) else inconnu for t in sequence]
+            proposes = []
+            for i in range(nb_proposes):
+                logits = brouillon.filtrer(brouillon.logits(base + proposes)[-1:], position + i)
+                token = int(logits[0].argmax())
+                candidat = principal_depuis_brouillon[token]
+                if candidat < 0:
+                    break
+                proposes.append(token)
+                candidats.append(candidat)
+                if candidat == eos_token_id:
+                    break
+
+        # 2. vérification par le principal en un seul passage
+        logits = principal.logits(sequence + candidats)[-(len(candidats) + 1):]
+        predictions = principal.filtrer(logits, position).argmax(dim=-1).tolist()
+
+        acceptes = 0
+        while acceptes < len(candidats) and candidats[acceptes] == predictions[acceptes]:
+            acceptes += 1
+
+        stats["etapes"] += 1
+        stats["proposes"] += len(candidats)
+        stats["acceptes"] += acceptes
+
+        for token in candidats[:acceptes] + [predictions[acceptes]]:
+            sequence.append(token)
+            if token == eos_token_id or len(sequence) - len(prompt) >= max_nouveaux_tokens:
+                return sequence[len(prompt):], stats
+
+    return sequence[len(prompt):], stats
+
+
+def correspondance_vocabulaires(tokenizer_source, tokenizer_cible, defaut):
+    """
+    Associe à chaque id de `tokenizer_source` l'id du même token dans `tokenizer_cible`
+    (ou `defaut` s'il n'y existe pas). Les deux modèles Whisper ne partagent pas exactement
+    les mêmes ids de tokens spéciaux.
+    """
+    vocab_cible = tokenizer_cible.get_vocab()
+    tokens = tokenizer_source.convert_ids_to_tokens(list(range(len(tokenizer_source))))
+    return [vocab_cible.get(token, defaut) for token in tokens]
+
+
+def correspondances_modeles(principal_id, tokenizer_p, brouillon_id, tokenizer_b):
+    """
+    Retourne (id brouillon de chaque id principal, id principal de chaque id brouillon) pour le
+    couple de modèles, en ne les calculant qu'une fois (~51k conversions par vocabulaire).
+    """
+    cle = (principal_id, brouillon_id)
+    if cle not in _correspondances:
+        _correspondances[cle] = (
+            correspondance_vocabulaires(tokenizer_p, tokenizer_b, tokenizer_b.eos_token_id),
+            correspondance_vocabulaires(tokenizer_b, tokenizer_p, -1),
+        )
+    return _correspondances[cle]
+
+
+def charger_whisper(model_id, device, dtype):
+    """
+    Retourne le couple (processor, modèle) Whisper depuis le registre partagé.
+    """
+    def loader():
+        processor = AutoProcessor.from_pretrained(model_id, token=auth_token)
+        model = WhisperForConditionalGeneration.from_pretrained(model_id, token=auth_token, torch_dtype=dtype).to(device)
+        model.eval()
+        return processor, model
+
+    return registry.get(model_id, loader, device=device, dtype=dtype)
+
+
+def _encoder(processor, model, fenetres):
+    """
+    Encode un paquet de fenêtres (30 s max. chacune) en un seul passage; retourne la sortie
+    de l'encodeur de chaque fenêtre.
+    """
+    features = processor.feature_extractor(fenetres, sampling_rate=16000, return_tensors="pt").input_features
+    features = features.to(model.device, dtype=model.dtype)
+    with torch.no_grad():
+        etats = model.get_encoder()(features).last_hidden_state
+    return [BaseModelOutput(last_hidden_state=etats[i:i + 1]) for i in range(len(fenetres))]
+
+
+def _suppressions(model):
+    config = model.generation_config
+    return getattr(config, "suppress_tokens", None), getattr(config, "begin_suppress_tokens", None)
+
+
+def _prompt(tokenizer, model, encoder_outputs, language):
+    """
+    Construit le prompt [début, langue, transcription, sans horodatage]; si la langue
+    n'est pas imposée, elle est détectée par le modèle à partir du token de début.
+    """
+    sot = tokenizer.convert_tokens_to_ids("<|startoftranscript|>")
+    langues = {code: tokenizer.convert_tokens_to_ids(f"<|{code}|>") for code in LANG_TO_ID}
+    langues = {code: i for code, i in langues.items() if i != tokenizer.unk_token_id}
+
+    if language in langues:
+        langue = langues[language]
+    else:
+        with torch.no_grad():
+            logits = model(encoder_outputs=encoder_outputs, decoder_input_ids=torch.tensor([[sot]], device=model.device)).logits[0, -1]
+        ids = list(langues.values())
+        langue = ids[int(logits[ids].argmax())]
+
+    return [
+        sot,
+        langue,
+        tokenizer.convert_tokens_to_ids("<|transcribe|>"),
+        tokenizer.convert_tokens_to_ids("<|notimestamps|>"),
+    ]
+
+
+def transcrire_assiste(signal, language=None, nb_proposes=4, assiste=True, fenetres=None, batch_size=1):
+    """
+    Transcrit un signal 16 kHz avec whisper-large-v3-turbo-mos, assisté par whisper-small-mos.
+    L'audio est traité par fenêtres de 30 secondes, encodées par paquets de `batch_size`;
+    le décodage assisté reste fenêtre par fenêtre.
+
+    Args:
+        signal (np.ndarray): l'audio mono à 16 kHz.
+        language (str): code de langue Whisper imposé (détection automatique sinon).
+        nb_proposes (int): nombre de tokens proposés par le brouillon à chaque étape.
+        assiste (bool): si False, décodage glouton du modèle principal seul (référence).
+        fenetres (list[np.ndarray]): morceaux du signal (30 s max.) à transcrire à la place
+            du découpage fixe, par exemple les segments de parole de la VAD.
+        batch_size (int): nombre de fenêtres encodées ensemble.
+
+    Returns:
+        tuple[str, dict]: la transcription et les statistiques de décodage cumulées.
+    """
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    dtype = torch.float16 if device.type == "cuda" else torch.float32
+
+    processor_p, model_p = charger_whisper(MODELE_PRINCIPAL, device, dtype)
+    tokenizer_p = processor_p.tokenizer
+    if assiste:
+        processor_b, model_b = charger_whisper(MODELE_BROUILLON, device, dtype)
+        b_depuis_p, p_depuis_b = correspondances_modeles(
+            MODELE_PRINCIPAL, tokenizer_p, MODELE_BROUILLON, processor_b.tokenizer
+        )
+
+    if fenetres is None:
+        taille_fenetre = DUREE_FENETRE * 16000
+        fenetres = [signal[debut:debut + taille_fenetre] for debut in range(0, max(len(signal), 1), taille_fenetre)]
+
+    textes = []
+    stats = {"etapes": 0, "proposes": 0, "acceptes": 0}
+    batch_size = max(int(batch_size), 1)
+    for debut in range(0, len(fenetres), batch_size):
+        paquet = fenetres[debut:debut + batch_size]
+        sorties_p = _encoder(processor_p, model_p, paquet)
+        sorties_b = _encoder(processor_b, model_b, paquet) if assiste else [None] * len(paquet)
+
+        for encoder_outputs, encoder_outputs_b in zip(sorties_p, sorties_b):
+            principal = _Decodeur(model_p, encoder_outputs, *_suppressions(model_p))
+            prompt = _prompt(tokenizer_p, model_p, encoder_outputs, language)
+
+            brouillon = None
+            if assiste:
+                brouillon = _Decodeur(model_b, encoder_outputs_b, *_suppressions(model_b))
+
+            tokens, stats_fenetre = decoder_speculatif(
+                principal,
+                prompt,
+                tokenizer_p.eos_token_id,
+                brouillon=brouillon,
+                brouillon_depuis_principal=b_depuis_p if assiste else None,
+                principal_depuis_brouillon=p_depuis_b if assiste else None,
+                nb_proposes=nb_proposes,
+            )
+            textes.append(tokenizer_p.decode(tokens, skip_special_tokens=True).strip())
+            for cle in stats:
+                stats[cle] += stats_fenetre[cle]
+
+    return " ".join(t for t in textes if t), stats
+
+
+def _modeles_synthetiques(bruit=0.02, seed=2024):
+    """
+    Petits modèles Whisper à poids aléatoires pour tester le décodage sans télécharger de checkpoint:
+    le brouillon est une copie bruitée du principal, ce qui donne un taux d'acceptation partiel.
+    """
+    torch.manual_seed(seed)
+    config = WhisperConfig(
+        vocab_size=512, num_mel_bins=80, d_model=256,
+        encoder_layers=4, decoder_layers=4, encoder_attention_heads=4, decoder_attention_heads=4,
+        encoder_ffn_dim=1024, decoder_ffn_dim=1024, max_source_positions=1500, max_target_positions=448,
+        decoder_start_token_id=1, eos_token_id=2, pad_token_id=2, bos_token_id=1,
+        suppress_tokens=[], begin_suppress_tokens=[],
+    )
+    principal = WhisperForConditionalGeneration(config).eval()
+    brouillon = copy.deepcopy(principal)
+    brouillon.model.decoder.layers = brouillon.model.decoder.layers[:1]
+    with torch.no_grad():
+        for p in brouillon.parameters():
+            p.add_(torch.randn_like(p) * bruit)
+    return config, principal, brouillon
+
+
+def benchmark(fichiers=None, nb_proposes=4, synthetique=False, language=None):
+    """
+    Compare le décodage glouton du modèle principal seul et le décodage assisté:
+    temps, accélération, taux d'acceptation et identité des sorties.
+    """
+    resultats = []
+
+    if synthetique:
+        config, model_p, model_b = _modeles_synthetiques()
+        identite = list(range(config.vocab_size))
+        for i in range(4):
+            features = torch.randn(1, config.num_mel_bins, 3000)
+            with torch.no_grad():
+                enc_p = model_p.get_encoder()(features)
+                enc_b = model_b.get_encoder()(features)
+
+            start_time = time.time()
+            ref, _ = decoder_speculatif(_Decodeur(model_p, enc_p), [1], 2, max_nouveaux_tokens=128)
+            temps_ref = time.time() - start_time
+
+            start_time = time.time()
+            sortie, stats = decoder_speculatif(
+                _Decodeur(model_p, enc_p), [1], 2,
+                brouillon=_Decodeur(model_b, enc_b),
+                brouillon_depuis_principal=identite,
+                principal_depuis_brouillon=identite,
+                nb_proposes=nb_proposes,
+                max_nouveaux_tokens=128,
+            )
+            temps_assiste = time.time() - start_time
+            resultats.append((f"synthetique-{i}", temps_ref, temps_assiste, stats, ref == sortie))
+    else:
+        for fichier in fichiers:
+            signal = charger_audio(fichier, 16000)
+
+            start_time = time.time()
+            ref, _ = transcrire_assiste(signal, language, assiste=False)
+            temps_ref = time.time() - start_time
+
+            start_time = time.time()
+            sortie, stats = transcrire_assiste(signal, language, nb_proposes=nb_proposes)
+            temps_assiste = time.time() - start_time
+            resultats.append((os.path.basename(fichier), temps_ref, temps_assiste, stats, ref == sortie))
+
+    for nom, temps_ref, temps_assiste, stats, identique in resultats:
+        acceptation = stats["acceptes"] / stats["proposes"] if stats["proposes"] else 0.0
+        print(
+            f"{nom}: glouton {temps_ref:.2f}s, assisté {temps_assiste:.2f}s, "
+            f"accélération x{temps_ref / temps_assiste:.2f}, acceptation {acceptation:.0%}, "
+            f"sorties identiques: {identique}"
+        )
+    return resultats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark du décodage assisté Whisper (large-v3-turbo + small).")
+    parser.add_argument("fichiers", nargs="*", default=sorted(glob.glob("./audios/example*.mp3")))
+    parser.add_argument("--nb-proposes", type=int, default=4)
+    parser.add_argument("--synthetique", action="store_true", help="petits modèles aléatoires au lieu des checkpoints")
+    parser.add_argument("--language", default=None)
+    args = parser.parse_args()
+
+    benchmark(args.fichiers, args.nb_proposes, synthetique=args.synthetique or not args.fichiers, language=args.language)
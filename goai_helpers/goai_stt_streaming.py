@@ -0,0 +1,207 @@
+import spaces
+import numpy as np
+
+from goai_helpers.audio import charger_audio, ReechantillonneurFlux
+from goai_helpers.goai_stt2 import charger_pipeline, LANG_TO_ID
+from goai_helpers.goai_traduction import goai_traduction_batch
+from goai_helpers.utils import diviser_phrases_moore
+from goai_helpers.vad import detecter_parole
+
+
+SAMPLING_RATE = 16000
+
+
+class EtatFlux:
+    """
+    État d'une transcription en direct, conservé entre les morceaux reçus du microphone.
+
+    Le tampon ne contient que l'audio dont la transcription n'est pas encore validée.
+    Un mot est validé dès que deux décodages successifs du tampon s'accordent sur lui
+    (accord local); l'audio des segments Whisper dont tous les mots sont validés est aussitôt
+    retiré du tampon, si bien que seule la fin instable est redécodée. Le tampon est aussi
+    coupé dans les pauses, ou de force au-delà de `max_tampon_s` en gardant `chevauchement_s`
+    secondes de contexte. Le coût de chaque décodage et la latence restent ainsi bornés quelle
+    que soit la durée de la prise de parole. Le rééchantillonnage garde son état d'un morceau
+    du microphone à l'autre (voir ReechantillonneurFlux).
+
+    Attributs :
+        pas_s (float) : durée d'audio nouveau à accumuler avant de redécoder le tampon.
+        max_tampon_s (float) : durée maximale du tampon.
+        pause_s (float) : durée de silence en fin de tampon qui termine une phrase.
+        chevauchement_s (float) : contexte conservé lors d'une coupure forcée.
+    """
+
+    def __init__(self, pas_s=1.0, max_tampon_s=15.0, pause_s=0.6, chevauchement_s=1.0):
+        self.pas_s = pas_s
+        self.max_tampon_s = max_tampon_s
+        self.pause_s = pause_s
+        self.chevauchement_s = chevauchement_s
+
+        self.reechantillonneur = None
+        self.sr_entree = None
+        self.tampon = np.zeros(0, dtype=np.float32)
+        self.non_decode = 0
+        self.valides = []            # mots validés depuis le début
+        self.valides_tampon = 0      # mots de l'hypothèse courante déjà validés
+        self.hypothese = []
+        self.chevauchement = False   # le tampon commence par de l'audio déjà transcrit
+        self.mots_contexte = None    # mots de l'hypothèse qui transcrivent ce contexte
+
+        self.mots_traduits = 0
+        self.traduction = []
+
+    def texte(self) -> str:
+        return " ".join(self.valides)
+
+
+def _prefixe_commun(a, b) -> int:
+    n = 0
+    while n < min(len(a), len(b)) and a[n] == b[n]:
+        n += 1
+    return n
+
+
+def _retirer_chevauchement(valides, hypothese, max_mots=8) -> list:
+    """
+    Retire du début de l'hypothèse les mots qui répètent la fin du texte déjà validé
+    (audio de contexte conservé lors d'une coupure forcée).
+    """
+    for n in range(min(max_mots, len(valides), len(hypothese)), 0, -1):
+        if valides[-n:] == hypothese[:n]:
+            return hypothese[n:]
+    return hypothese
+
+
+@spaces.GPU
+def _decoder(model, signal, language):
+    """
+    Décode le tampon; retourne les segments Whisper [(mots, fin en secondes ou None)].
+    """
+    generate_kwargs = {}
+    if language in LANG_TO_ID:
+        generate_kwargs["forced_decoder_ids"] = [[2, LANG_TO_ID[language]]]
+    pipe = charger_pipeline(model)
+    sortie = pipe({"raw": signal, "sampling_rate": SAMPLING_RATE}, return_timestamps=True, **generate_kwargs)
+    segments = [(chunk["text"].split(), chunk["timestamp"][1]) for chunk in sortie.get("chunks") or []]
+    return segments or [(sortie["text"].split(), None)]
+
+
+def _valider(etat: EtatFlux, mots):
+    etat.valides.extend(mots)
+    etat.valides_tampon += len(mots)
+
+
+def _retirer_valide(etat: EtatFlux, segments, contexte: int):
+    """
+    Retire du tampon l'audio des premiers segments Whisper dont tous les mots (contexte compris)
+    sont validés; le dernier segment, encore instable, est toujours gardé. Le prochain
+    décodage repart ainsi du dernier point validé.
+    """
+    mots, fin_retiree = 0, None
+    for mots_segment, fin in segments[:-1]:
+        if fin is None or mots + len(mots_segment) > contexte + etat.valides_tampon:
+            break
+        mots += len(mots_segment)
+        fin_retiree = fin
+    if not fin_retiree:
+        return
+
+    etat.tampon = etat.tampon[int(fin_retiree * SAMPLING_RATE):]
+    retires_contexte = min(mots, contexte)
+    if etat.chevauchement:
+        etat.mots_contexte = contexte - retires_contexte
+        etat.chevauchement = etat.mots_contexte > 0
+    retires = mots - retires_contexte
+    etat.valides_tampon -= retires
+    etat.hypothese = etat.hypothese[retires:]
+
+
+def goai_stt_flux(morceau, model, language, etat=None):
+    """
+    Transcription en direct: traite un morceau audio du microphone et retourne le texte
+    Mooré validé, sa traduction en Français et l'état mis à jour.
+
+    Args:
+        morceau (tuple[int, np.ndarray]): le taux d'échantillonnage et les données reçues.
+        model (str): le modèle Whisper utilisé.
+        language (str): code de langue Whisper imposé (détection automatique sinon).
+        etat (EtatFlux): l'état de la transcription (None au premier morceau).
+
+    Returns:
+        tuple[str, str, EtatFlux]: le texte Mooré validé, la traduction et l'état.
+    """
+    if etat is None:
+        etat = EtatFlux()
+    if morceau is None:
+        return etat.texte(), " ".join(etat.traduction), etat
+
+    sampling_rate = int(morceau[0])
+    if etat.reechantillonneur is None or sampling_rate != etat.sr_entree:
+        etat.reechantillonneur = ReechantillonneurFlux(sampling_rate, SAMPLING_RATE)
+        etat.sr_entree = sampling_rate
+    signal = etat.reechantillonneur.ajouter(charger_audio(morceau, sampling_rate))
+    etat.tampon = np.concatenate([etat.tampon, signal])
+    etat.non_decode += len(signal)
+    if etat.non_decode < etat.pas_s * SAMPLING_RATE:
+        return etat.texte(), " ".join(etat.traduction), etat
+    etat.non_decode = 0
+
+    segments = detecter_parole(etat.tampon, SAMPLING_RATE, max_segment_s=etat.max_tampon_s)
+    fin_de_phrase = False
+    coupure_forcee = False
+
+    if not segments:
+        # que du silence: on ne garde qu'une courte marge, l'hypothèse du tampon coupé n'a plus cours
+        etat.tampon = etat.tampon[-int(etat.pause_s * SAMPLING_RATE):]
+        etat.hypothese = []
+        etat.valides_tampon = 0
+        etat.chevauchement = False
+    else:
+        segments_whisper = _decoder(model, etat.tampon, language)
+        hypothese = [mot for mots, _ in segments_whisper for mot in mots]
+        contexte = 0
+        if etat.chevauchement:
+            if etat.mots_contexte is None:
+                etat.mots_contexte = len(hypothese) - len(_retirer_chevauchement(etat.valides, hypothese))
+            contexte = etat.mots_contexte
+            hypothese = hypothese[contexte:]
+
+        # accord local: les mots identiques dans deux décodages successifs sont validés
+        stables = _prefixe_commun(hypothese, etat.hypothese)
+        if stables > etat.valides_tampon:
+            _valider(etat, hypothese[etat.valides_tampon:stables])
+        etat.hypothese = hypothese
+
+        fin_parole = segments[-1][1]
+        if len(etat.tampon) - fin_parole >= etat.pause_s * SAMPLING_RATE:
+            # pause: tout le tampon jusqu'à la fin de la parole est transcrit
+            _valider(etat, hypothese[etat.valides_tampon:])
+            etat.tampon = etat.tampon[fin_parole:]
+            etat.chevauchement = False
+            fin_de_phrase = True
+        elif len(etat.tampon) > etat.max_tampon_s * SAMPLING_RATE:
+            # coupure forcée au point le plus calme de la dernière seconde, avec contexte
+            fenetre = SAMPLING_RATE
+            energie = np.convolve(etat.tampon[-fenetre:] ** 2, np.ones(160, dtype=np.float32), mode="same")
+            coupure = len(etat.tampon) - fenetre + int(np.argmin(energie))
+            _valider(etat, hypothese[etat.valides_tampon:])
+            etat.tampon = etat.tampon[max(coupure - int(etat.chevauchement_s * SAMPLING_RATE), 0):]
+            etat.chevauchement = True
+            etat.mots_contexte = None
+            coupure_forcee = True
+
+        if fin_de_phrase or coupure_forcee:
+            etat.valides_tampon = 0
+            etat.hypothese = []
+        else:
+            _retirer_valide(etat, segments_whisper, contexte)
+
+    # traduire les phrases terminées qui ne l'ont pas encore été
+    phrases = diviser_phrases_moore(" ".join(etat.valides[etat.mots_traduits:]))
+    if phrases and not fin_de_phrase and phrases[-1][-1] not in ".!?":
+        phrases = phrases[:-1]
+    if phrases:
+        etat.traduction.extend(goai_traduction_batch(phrases, src_lang="mos_Latn", tgt_lang="fra_Latn"))
+        etat.mots_traduits += sum(len(phrase.split()) for phrase in phrases)
+
+    return etat.texte(), " ".join(etat.traduction), etat
@@ -18,7 +18,8 @@ def goai_stt_ttt(
         language, 
         batch_size, 
         chunk_length_s, 
-        stride_length_s
+        stride_length_s,
+        vad=False
     ):
 
     # 1. STT: Speech To Text
@@ -28,7 +29,8 @@ def goai_stt_ttt(
         language, 
         batch_size, 
         chunk_length_s, 
-        stride_length_s
+        stride_length_s,
+        vad
     )[0]
     yield mos_text, None
 
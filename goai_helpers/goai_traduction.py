@@ -1,37 +1,262 @@
 import torch
 import spaces
-from transformers import pipeline, AutoModelForSeq2SeqLM, AutoTokenizer
+import threading
+from functools import lru_cache
+from transformers import AutoModelForSeq2SeqLM, AutoTokenizer, TextIteratorStreamer
 import os
 from huggingface_hub import login
 
+from goai_helpers.model_registry import registry, revision_hub
+from goai_helpers.traduction_cache import get_cache
+from goai_helpers.decoupage import decouper_par_budget, compteur_nllb
+
 max_length = 512
+max_tokens_par_batch = 4096
+phrases_par_batch = 8
+# découpage des longs textes: longueur maximale et longueur visée d'un morceau (en tokens),
+# seules les phrases de moins de `min_tokens_phrase` tokens étant regroupées
+max_tokens_phrase = 200
+cible_tokens_phrase = 48
+min_tokens_phrase = 12
+# suffixe de l'identifiant du modèle pour les traductions du décodage glouton (goai_traduction_stream),
+# mises en cache à part de celles de la recherche en faisceau
+SUFFIXE_GLOUTON = "#glouton"
+# la langue source est un état du tokenizer, partagé par le registre entre les requêtes concurrentes
+_verrou_tokenizer = threading.Lock()
 auth_token = os.getenv('HF_SPACE_TOKEN')
 login(token=auth_token)
 
 
+def resoudre_modele(src_lang, tgt_lang):
+    """
+    Retourne l'identifiant du modèle NLLB fine-tuné pour la direction de traduction donnée.
+    """
+    if src_lang == "fra_Latn" and tgt_lang == "mos_Latn":
+        return "ArissBandoss/nllb-200-distilled-600M-finetuned-fr-to-mos-V4"
+
+    elif src_lang == "mos_Latn" and tgt_lang == "fra_Latn":
+        return "ArissBandoss/nllb-200-distilled-600M-finetuned-mos-to-fr-V5"
+
+    return "ArissBandoss/nllb-200-distilled-600M-finetuned-fr-to-mos-V4"
+
+
+def charger_modele(model_id, device, revision=None):
+    """
+    Retourne le couple (tokenizer, modèle) depuis le registre partagé, en le chargeant au besoin.
+    """
+    revision_hf = None if revision == "local" else revision
+
+    def loader():
+        tokenizer = AutoTokenizer.from_pretrained(model_id, token=auth_token, revision=revision_hf)
+        model     = AutoModelForSeq2SeqLM.from_pretrained(model_id, token=auth_token, revision=revision_hf).to(device)
+        model.eval()
+        return tokenizer, model
+
+    return registry.get(model_id, loader, revision=revision, device=device)
+
+
+@lru_cache(maxsize=8)
+def charger_tokenizer(model_id, revision=None):
+    """
+    Retourne le tokenizer seul (pour découper un texte sans charger le modèle).
+    """
+    revision_hf = None if revision == "local" else revision
+    return AutoTokenizer.from_pretrained(model_id, token=auth_token, revision=revision_hf)
+
+
+def decouper_texte(text, model_id, revision=None):
+    """
+    Découpe un texte en morceaux d'au plus `max_tokens_phrase` tokens NLLB, les phrases de moins
+    de `min_tokens_phrase` tokens voisines étant regroupées jusqu'à `cible_tokens_phrase` tokens.
+    """
+    compter = compteur_nllb(charger_tokenizer(model_id, revision))
+    return decouper_par_budget(text, compter, max_tokens_phrase, cible_tokens_phrase, min_tokens_phrase)
+
+
+def tokeniser(tokenizer, textes, src_lang, **kwargs):
+    """
+    Tokenise des textes avec le token de langue `src_lang`. Le changement de langue du tokenizer
+    et la tokenisation se font sous un même verrou, afin qu'une requête concurrente sur le même
+    tokenizer (autre direction) ne change pas la langue entre les deux; `generate` ne dépend
+    pas de cet état (la langue cible passe par forced_bos_token_id).
+    """
+    with _verrou_tokenizer:
+        tokenizer.src_lang = src_lang
+        return tokenizer(textes, truncation=True, max_length=max_length, **kwargs)
+
+
+def grouper_par_longueur(longueurs, max_tokens=max_tokens_par_batch):
+    """
+    Trie les entrées par longueur (en tokens) et les regroupe en paquets dont le coût
+    avec padding (taille du paquet x plus longue entrée) reste sous `max_tokens`.
+
+    Args:
+        longueurs (list[int]): longueur en tokens de chaque entrée.
+        max_tokens (int): budget de tokens (padding compris) par paquet.
+
+    Returns:
+        list[list[int]]: les indices des entrées, paquet par paquet.
+    """
+    ordre = sorted(range(len(longueurs)), key=lambda i: longueurs[i])
+
+    paquets, paquet = [], []
+    for i in ordre:
+        # les entrées étant triées, la i-ème est la plus longue du paquet
+        if paquet and (len(paquet) + 1) * longueurs[i] > max_tokens:
+            paquets.append(paquet)
+            paquet = []
+        paquet.append(i)
+    if paquet:
+        paquets.append(paquet)
+
+    return paquets
+
+
+def traduire_paquet(tokenizer, model, textes, src_lang, tgt_lang, device):
+    """
+    Traduit une liste de textes en un seul appel à `generate`, avec padding.
+    """
+    inputs = tokeniser(tokenizer, textes, src_lang, return_tensors="pt", padding=True).to(device)
+
+    with torch.no_grad():
+        generated = model.generate(
+            **inputs,
+            forced_bos_token_id=tokenizer.convert_tokens_to_ids(tgt_lang),
+            max_length=max_length
+        )
+
+    return tokenizer.batch_decode(generated, skip_special_tokens=True)
+
+
+def traduire_en_flux(tokenizer, model, texte, src_lang, tgt_lang, device):
+    """
+    Traduit un texte en renvoyant les morceaux de texte détokenisés au fil de la génération.
+    La génération tourne dans un thread séparé; le décodage est glouton (num_beams=1),
+    le streaming n'étant pas compatible avec la recherche en faisceau.
+    """
+    inputs = tokeniser(tokenizer, texte, src_lang, return_tensors="pt").to(device)
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+    erreurs = []
+
+    def generer():
+        try:
+            model.generate(
+                **inputs,
+                streamer=streamer,
+                forced_bos_token_id=tokenizer.convert_tokens_to_ids(tgt_lang),
+                max_length=max_length,
+                num_beams=1
+            )
+        except Exception as e:
+            erreurs.append(e)
+            streamer.end()
+
+    thread = threading.Thread(target=generer, daemon=True)
+    thread.start()
+    for morceau in streamer:
+        yield morceau
+    thread.join()
+
+    if erreurs:
+        raise erreurs[0]
+
+
+def traduire(texts, src_lang, tgt_lang, max_tokens=max_tokens_par_batch):
+    """
+    Traduit une liste de textes: les traductions déjà en cache sont réutilisées, les autres
+    (sans doublons) sont regroupées par longueur et traduites, puis ajoutées au cache.
+    Le modèle n'est chargé que s'il reste des textes à traduire.
+    """
+    if not texts:
+        return []
+
+    model_id = resoudre_modele(src_lang, tgt_lang)
+    revision = revision_hub(model_id)
+    cache = get_cache()
+
+    traductions = cache.get_many(texts, src_lang, tgt_lang, model_id, revision)
+    a_traduire = list(dict.fromkeys(t for t, trad in zip(texts, traductions) if trad is None))
+    if not a_traduire:
+        return traductions
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    tokenizer, model = charger_modele(model_id, device, revision)
+
+    longueurs = [len(ids) for ids in tokeniser(tokenizer, a_traduire, src_lang)["input_ids"]]
+
+    nouvelles = {}
+    for paquet in grouper_par_longueur(longueurs, max_tokens):
+        textes = [a_traduire[i] for i in paquet]
+        resultats = traduire_paquet(tokenizer, model, textes, src_lang, tgt_lang, device)
+        nouvelles.update(zip(textes, resultats))
+
+    cache.put_many(list(nouvelles), list(nouvelles.values()), src_lang, tgt_lang, model_id, revision)
+
+    return [trad if trad is not None else nouvelles[t] for t, trad in zip(texts, traductions)]
+
+
 @spaces.GPU
 def goai_traduction(text, src_lang, tgt_lang):
+    return traduire([text], src_lang, tgt_lang)[0]
+
+
+@spaces.GPU
+def goai_traduction_batch(texts, src_lang, tgt_lang, max_tokens=max_tokens_par_batch):
+    """
+    Traduit une liste de textes en les regroupant par longueur afin de limiter le padding.
+
+    Args:
+        texts (list[str]): les textes à traduire.
+        src_lang (str): code de la langue source (ex: "fra_Latn").
+        tgt_lang (str): code de la langue cible (ex: "mos_Latn").
+        max_tokens (int): budget de tokens (padding compris) par paquet.
+
+    Returns:
+        list[str]: les traductions, dans l'ordre des textes d'entrée.
+    """
+    return traduire(list(texts), src_lang, tgt_lang, max_tokens)
+
+
+@spaces.GPU
+def goai_traduction_stream(text, src_lang, tgt_lang):
+    """
+    Traduit un texte phrase par phrase en renvoyant la traduction au fil des tokens générés.
+    Les phrases déjà présentes dans le cache (recherche en faisceau de `traduire`, sinon
+    décodage glouton d'un flux précédent) sont renvoyées immédiatement. Les traductions
+    produites ici (décodage glouton) sont mises en cache sous `model_id + SUFFIXE_GLOUTON`,
+    sans jamais remplacer celles de la recherche en faisceau.
+
+    Args:
+        text (str): le texte à traduire.
+        src_lang (str): code de la langue source.
+        tgt_lang (str): code de la langue cible.
+
+    Yields:
+        str: la traduction partielle du texte.
+    """
+    model_id = resoudre_modele(src_lang, tgt_lang)
+    revision = revision_hub(model_id)
+    cache = get_cache()
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-    if src_lang == "fra_Latn" and tgt_lang == "mos_Latn":
-        model_id = "ArissBandoss/nllb-200-distilled-600M-finetuned-fr-to-mos-V4"
-        
-    elif src_lang == "mos_Latn" and tgt_lang == "fra_Latn":
-        model_id = "ArissBandoss/nllb-200-distilled-600M-finetuned-mos-to-fr-V5"
-
-    else:
-        model_id = "ArissBandoss/nllb-200-distilled-600M-finetuned-fr-to-mos-V4"
-
-    tokenizer = AutoTokenizer.from_pretrained(model_id, token=auth_token)
-    model     = AutoModelForSeq2SeqLM.from_pretrained(model_id, token=auth_token)
-        
-    trans_pipe = pipeline("translation", 
-                          model=model, 
-                          tokenizer=tokenizer, 
-                          src_lang=src_lang, 
-                          tgt_lang=tgt_lang, 
-                          max_length=max_length,
-                          device=device
-                )
-    
-    return trans_pipe(text)[0]["translation_text"]
+    phrases = decouper_texte(text, model_id, revision)
+    en_cache = cache.get_many(phrases, src_lang, tgt_lang, model_id, revision)
+    manquantes = [phrase for phrase, traduction in zip(phrases, en_cache) if traduction is None]
+    gloutonnes = dict(zip(manquantes, cache.get_many(manquantes, src_lang, tgt_lang, model_id + SUFFIXE_GLOUTON, revision)))
+
+    traductions = []
+    for phrase, traduction in zip(phrases, en_cache):
+        if traduction is None:
+            traduction = gloutonnes.get(phrase)
+        if traduction is None:
+            tokenizer, model = charger_modele(model_id, device, revision)
+            traduction = ""
+            for morceau in traduire_en_flux(tokenizer, model, phrase, src_lang, tgt_lang, device):
+                traduction += morceau
+                yield " ".join(traductions + [traduction.strip()])
+            traduction = traduction.strip()
+            gloutonnes[phrase] = traduction
+            cache.put_many([phrase], [traduction], src_lang, tgt_lang, model_id + SUFFIXE_GLOUTON, revision)
+
+        traductions.append(traduction)
+        yield " ".join(traductions)
@@ -3,14 +3,91 @@ import torch
 import spaces
 import os
 import numpy as np
-from transformers import pipeline, set_seed
+from transformers import AutoTokenizer, VitsModel, set_seed
 from huggingface_hub import login
 
+from goai_helpers.model_registry import registry, revision_hub
+from goai_helpers.audio_cache import synthetiser_avec_cache
+from goai_helpers.utils import diviser_phrases_moore
+from goai_helpers.goai_traduction import grouper_par_longueur
+
 
 auth_token = os.getenv('HF_SPACE_TOKEN')
 login(token=auth_token)
 
 
+MODEL_ID = "ArissBandoss/mms-tts-mos-V2"
+# budget de tokens (remplissage compris) d'un paquet de phrases envoyé à VITS
+max_tokens_par_batch = 2048
+
+
+def charger_modele_vits(device, model_id=MODEL_ID):
+    """
+    Retourne le couple (tokenizer, modèle VITS) depuis le registre partagé, en le chargeant au besoin.
+    """
+    def loader():
+        tokenizer = AutoTokenizer.from_pretrained(model_id, token=auth_token)
+        model = VitsModel.from_pretrained(model_id, token=auth_token).to(device)
+        model.eval()
+        return tokenizer, model
+
+    return registry.get(model_id, loader, device=device)
+
+
+@torch.inference_mode()
+def synthetiser_vits(tokenizer, model, phrases, device, max_tokens=max_tokens_par_batch):
+    """
+    Synthétise des phrases par paquets de longueurs homogènes.
+
+    Chaque paquet est complété (padding) et passé en une fois dans VITS; la forme d'onde de
+    chaque phrase est ensuite coupée à la durée prédite par le modèle, le reste n'étant que
+    du remplissage.
+
+    Args:
+        tokenizer, model: le tokenizer et le modèle VITS.
+        phrases (list[str]): les phrases à synthétiser.
+        device: le device du modèle.
+        max_tokens (int): budget de tokens (padding compris) par paquet.
+
+    Returns:
+        list[np.ndarray]: une forme d'onde float32 par phrase, dans l'ordre des phrases.
+    """
+    entrees = [tokenizer(phrase).input_ids for phrase in phrases]
+
+    wavs = [None] * len(phrases)
+    for paquet in grouper_par_longueur([len(ids) for ids in entrees], max_tokens):
+        inputs = tokenizer([phrases[i] for i in paquet], padding=True, return_tensors="pt").to(device)
+        sortie = model(**inputs)
+        # sequence_lengths est déjà en échantillons (trames prédites x produit des upsample_rates)
+        longueurs = sortie.sequence_lengths.tolist()
+        waveform = sortie.waveform.float().cpu().numpy()
+        for j, i in enumerate(paquet):
+            wavs[i] = waveform[j, :longueurs[j]]
+    return wavs
+
+
+def synthetiser_phrases(phrases, device=None):
+    """
+    Synthétise des phrases Mooré par paquets VITS, seules les phrases absentes du cache audio
+    étant passées dans le modèle.
+
+    Returns:
+        tuple[int, list[np.ndarray]]: le taux d'échantillonnage et une forme d'onde par phrase.
+    """
+    # Assurer la reproductibilité
+    set_seed(2024)
+    device = device or torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+    # Charger le modèle TTS avec le token d'authentification
+    tokenizer, model = charger_modele_vits(device)
+
+    def synthetiser(lot):
+        return synthetiser_vits(tokenizer, model, lot, device)
+
+    wavs = synthetiser_avec_cache(phrases, "", f"{MODEL_ID}@{revision_hub(MODEL_ID)}", (2024,), synthetiser)
+    return model.config.sampling_rate, wavs
+
+
 @spaces.GPU
 def goai_tts(texte):
     """
@@ -23,23 +100,13 @@ def goai_tts(texte):
         
     Return
     ------
-        Un tuple contenant le taux d'échantillonnage et les données audio sous forme de tableau numpy.
+        Un tuple contenant le taux d'échantillonnage et les données audio sous forme de tableau numpy (float32).
     """
-    
-    # Assurer la reproductibilité
-    set_seed(2024) 
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     start_time = time.time()
 
-    # Charger le modèle TTS avec le token d'authentification
-    model_id = "ArissBandoss/mms-tts-mos-V2"
-    synthesiser = pipeline("text-to-speech", model_id, device=device)
-
-    # Inférence
-    speech = synthesiser(texte)
-    
-    sample_rate = speech["sampling_rate"]
-    audio_data = np.array(speech["audio"][0], dtype=float)
+    # Inférence par paquets de phrases, seules les phrases absentes du cache audio sont synthétisées
+    sample_rate, wavs = synthetiser_phrases(diviser_phrases_moore(texte))
+    audio_data = np.concatenate(wavs) if wavs else np.zeros(0, dtype=np.float32)
 
     print("Temps écoulé: ", int(time.time() - start_time), " secondes")
     
@@ -1,18 +1,27 @@
 import os
 import time
+import tempfile
+import itertools
 import torch
-import torchaudio
 import spaces
-import tempfile
+import torch.nn.functional as F
+import gradio as gr
 from tqdm import tqdm
-from typing import Optional, Tuple
+from typing import Optional, Tuple, Union
+from collections import OrderedDict
 from huggingface_hub import hf_hub_download, hf_hub_url, login
 
 from TTS.tts.configs.xtts_config import XttsConfig
 from TTS.tts.models.xtts import Xtts
 
-from goai_helpers.utils import download_file, diviser_phrases_moore, enhance_speech
+from goai_helpers.utils import enhance_speech_flux
+from goai_helpers.decoupage import decouper_par_budget, compteur_xtts
+from goai_helpers.telechargement import metadonnees_hub, telecharger_tous
 from goai_helpers.goai_traduction import goai_traduction
+from goai_helpers.model_registry import registry, revision_hub
+from goai_helpers.latents_cache import CacheLatents, hash_fichier, hash_signal
+from goai_helpers.audio import charger_audio
+from goai_helpers.audio_cache import synthetiser_avec_cache
 
 # authentification
 auth_token = os.getenv('HF_SPACE_TOKEN')
@@ -21,6 +30,55 @@ login(token=auth_token)
 # device
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
+# latents de conditionnement des voix de référence, partagés par les instances MooreTTS
+latents_cache = CacheLatents()
+VOIX_REFERENCE_DIR = "./exples_voix"
+
+# paramètres d'échantillonnage du décodeur GPT, communs aux inférences séquentielle et par lots
+PARAMETRES_GENERATION = dict(temperature=0.1, length_penalty=1.0, repetition_penalty=10.0, top_k=10, top_p=0.3)
+# nombre maximal de phrases décodées ensemble
+PHRASES_PAR_LOT = int(os.getenv("GOAI_TTS_PHRASES_PAR_LOT", 8))
+# fenêtre GPU de goai_ttt_tts et marge gardée pour finir la requête
+DUREE_GPU_S = 120
+MARGE_GPU_S = 10
+# découpage du texte: longueur maximale et longueur visée d'un morceau (en tokens XTTS),
+# seules les phrases de moins de MIN_TOKENS_PHRASE tokens étant regroupées
+MAX_TOKENS_PHRASE = 150
+CIBLE_TOKENS_PHRASE = 48
+MIN_TOKENS_PHRASE = 12
+# nombre d'empreintes de fichiers de référence mémorisées (LRU)
+MAX_EMPREINTES = 256
+# clés des anciens points de contrôle qui doublent celles du GPT (ignorées au chargement)
+CLES_ALIAS_GPT = "gpt.gpt_inference."
+
+
+def poids_partages(model: torch.nn.Module) -> list:
+    """
+    Retourne les groupes de noms (paramètres et buffers) qui désignent le même tenseur dans le modèle.
+    """
+    groupes = {}
+    for nom, tenseur in itertools.chain(
+        model.named_parameters(remove_duplicate=False), model.named_buffers(remove_duplicate=False)
+    ):
+        groupes.setdefault(id(tenseur), []).append(nom)
+    return [noms for noms in groupes.values() if len(noms) > 1]
+
+
+def relier_poids(model: torch.nn.Module, groupes: list):
+    """
+    Fait de nouveau pointer chaque groupe de noms de `poids_partages` vers un même tenseur (le premier).
+    """
+    for premier, *autres in groupes:
+        module, _, attribut = premier.rpartition(".")
+        reference = getattr(model.get_submodule(module), attribut)
+        for nom in autres:
+            module, _, attribut = nom.rpartition(".")
+            sous_module = model.get_submodule(module)
+            if attribut in sous_module._parameters:
+                sous_module._parameters[attribut] = reference
+            else:
+                sous_module._buffers[attribut] = reference
+
 
 class MooreTTS:
     """
@@ -70,19 +128,22 @@ class MooreTTS:
         self.model = Xtts.init_from_config(self.config)
 
         #print(f"\n\n============ DEBUGGING   =========== {self.local_dir}\n\n")
-        # charger le point de contrôle du modèle dans le modèle initialisé
-        self.model.load_checkpoint(
-            self.config,
-            checkpoint_path=self.local_dir+ "/model_compressed.pth" ,
-            vocab_path=self.paths['vocab.json'],
-            use_deepspeed=False 
-        )
+        # conversion unique des poids .pth en safetensors, puis chargement par mmap
+        self.convertir_en_safetensors()
+        self.charger_safetensors()
 
         if torch.cuda.is_available():
             self.model.cuda()
             
         print("Model loaded successfully!")
 
+        # révision du modèle, utilisée dans les clés des caches
+        self.revision = f"{checkpoint_repo_or_dir}@{revision_hub(checkpoint_repo_or_dir)}"
+        self._empreintes = OrderedDict()
+
+        # précalculer les latents des voix fournies avec l'application
+        self.precalculer_voix(VOIX_REFERENCE_DIR)
+
     
     def ensure_checkpoint_is_downloaded(self):
         """
@@ -94,22 +155,189 @@ class MooreTTS:
         os.makedirs(self.local_dir, exist_ok=True)
         print("Téléchargement du point de contrôle depuis le hub...")
 
+        manquants = {}
         for filename, filepath in self.paths.items():
-            if os.path.exists(filepath):
+            if os.path.exists(filepath) or os.path.exists(self.chemin_safetensors(filepath)):
                 print(f"Fichier {filepath} déjà existant. Passé...")
                 continue
+            manquants[filename] = filepath
+        if not manquants:
+            return
 
-            file_url = hf_hub_url(repo_id=self.checkpoint_repo_or_dir, filename=filename)
-            print(f"Téléchargement de {filename} depuis {file_url}")
-            try:
-                download_file(file_url, filepath)
-            except Exception as e:
-                print(f"Téléchargement de {filename} échoué: {e}")
-
+        # tailles et sha256 attendus, vérifiés avant la mise en place de chaque fichier
+        metadonnees = metadonnees_hub(self.checkpoint_repo_or_dir, list(manquants))
+        taches = []
+        for filename, filepath in manquants.items():
+            taille, sha256 = metadonnees.get(filename, (None, None))
+            taches.append({
+                "url": hf_hub_url(repo_id=self.checkpoint_repo_or_dir, filename=filename),
+                "destination": filepath,
+                "taille": taille,
+                "sha256": sha256,
+            })
+        # une erreur interrompt le chargement: aucun fichier partiel n'est laissé à la place du fichier final
+        telecharger_tous(taches)
 
         print("Point de contrôle téléchargé avec succès !")
 
-        
+    @staticmethod
+    def chemin_safetensors(chemin_pth: str) -> str:
+        return os.path.splitext(chemin_pth)[0] + ".safetensors"
+
+    def convertir_en_safetensors(self):
+        """
+        Convertit une fois pour toutes les poids du modèle (model_compressed.pth) au format safetensors,
+        à côté du fichier d'origine. dvae.pth et mel_stats.pth ne servent qu'à l'entraînement
+        (Xtts.load_checkpoint ne les lit pas) et restent tels quels.
+        """
+        from safetensors.torch import save_file
+
+        filepath = self.paths['model_compressed.pth']
+        destination = self.chemin_safetensors(filepath)
+        if os.path.exists(destination) or not os.path.exists(filepath):
+            return
+
+        print("Conversion de model_compressed.pth en safetensors...")
+        # mêmes clés que celles chargées par Xtts.load_checkpoint
+        contenu = self.model.get_compatible_checkpoint_state_dict(filepath)
+
+        # safetensors refuse les tenseurs qui partagent leur stockage: on copie les doublons,
+        # les liens entre poids partagés étant rétablis au chargement (voir charger_safetensors)
+        tenseurs, stockages = {}, set()
+        for cle, tenseur in contenu.items():
+            if not isinstance(tenseur, torch.Tensor):
+                continue
+            tenseur = tenseur.contiguous()
+            if tenseur.untyped_storage().data_ptr() in stockages:
+                tenseur = tenseur.clone()
+            stockages.add(tenseur.untyped_storage().data_ptr())
+            tenseurs[cle] = tenseur
+
+        # écriture atomique dans un fichier temporaire propre à ce processus: un fichier partiel
+        # ne peut pas être pris pour un fichier converti, ni écrasé par une conversion concurrente
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(destination), suffix=".tmp", delete=False) as f:
+            temporaire = f.name
+        try:
+            save_file(tenseurs, temporaire)
+            os.replace(temporaire, destination)
+        finally:
+            if os.path.exists(temporaire):
+                os.remove(temporaire)
+
+    def charger_safetensors(self):
+        """
+        Charge les poids du modèle depuis model_compressed.safetensors par projection en mémoire (mmap):
+        les tenseurs sont assignés directement au modèle, sans copie intermédiaire en RAM, et les pages
+        du fichier sont partagées entre les processus qui chargent le même modèle.
+        Reproduit les étapes d'initialisation de Xtts.load_checkpoint, chargement strict compris:
+        seules les clés de gpt.gpt_inference (alias des modules du GPT présents dans les anciens
+        points de contrôle, reconstruits par init_gpt_for_inference) peuvent être en trop.
+        """
+        from safetensors.torch import load_file
+        from TTS.tts.layers.xtts.tokenizer import VoiceBpeTokenizer
+
+        self.model.tokenizer = VoiceBpeTokenizer(vocab_file=self.paths['vocab.json'])
+        self.model.init_models()
+
+        # poids partagés entre plusieurs modules: `assign` remplacerait chaque nom par un tenseur distinct
+        liens = poids_partages(self.model)
+
+        poids = load_file(self.chemin_safetensors(self.paths['model_compressed.pth']), device="cpu")
+        resultat = self.model.load_state_dict(poids, strict=False, assign=True)
+        inattendues = [cle for cle in resultat.unexpected_keys if not cle.startswith(CLES_ALIAS_GPT)]
+        if resultat.missing_keys or inattendues:
+            raise RuntimeError(
+                f"Poids incompatibles dans {self.chemin_safetensors(self.paths['model_compressed.pth'])}: "
+                f"clés manquantes {resultat.missing_keys}, clés inattendues {inattendues}."
+            )
+        relier_poids(self.model, liens)
+
+        self.model.hifigan_decoder.eval()
+        self.model.gpt.init_gpt_for_inference(kv_cache=self.model.args.kv_cache, use_deepspeed=False)
+        self.model.gpt.eval()
+        self.model.eval()
+
+    def empreinte_reference(self, reference) -> str:
+        """
+        Empreinte du contenu d'un audio de référence: pour un fichier, mémorisée tant qu'il ne
+        change pas; pour un audio en mémoire (sr, données), calculée sur les échantillons.
+        """
+        if not isinstance(reference, str):
+            return hash_signal(*reference)
+        etat = os.stat(reference)
+        cle = (os.path.abspath(reference), etat.st_size, etat.st_mtime_ns)
+        if cle in self._empreintes:
+            self._empreintes.move_to_end(cle)
+            return self._empreintes[cle]
+        empreinte = hash_fichier(reference)
+        self._empreintes[cle] = empreinte
+        while len(self._empreintes) > MAX_EMPREINTES:
+            self._empreintes.popitem(last=False)
+        return empreinte
+
+    @torch.inference_mode()
+    def latents_depuis_signal(self, reference: Tuple, load_sr: int = 22050):
+        """
+        Calcule les latents de conditionnement d'un audio en mémoire, sans passer par un fichier.
+        Reprend les étapes de Xtts.get_conditioning_latents: mono, rééchantillonnage à `load_sr`,
+        coupe à max_ref_len secondes et normalisation optionnelle.
+        Args :
+            reference : le tuple (taux d'échantillonnage, données) fourni par gradio.
+        """
+        config = self.model.config
+        signal = torch.from_numpy(charger_audio(reference, load_sr)).clamp_(-1, 1).unsqueeze(0)
+        audio = signal[:, :load_sr * config.max_ref_len].to(self.model.device)
+        if config.sound_norm_refs:
+            audio = (audio / torch.abs(audio).max()) * 0.75
+
+        speaker_embedding = self.model.get_speaker_embedding(audio, load_sr)
+        gpt_cond_latent = self.model.get_gpt_cond_latents(audio, load_sr, length=config.gpt_cond_len)
+        return gpt_cond_latent, speaker_embedding
+
+    def conditioning_latents(self, speaker_reference, epingler: bool = False):
+        """
+        Retourne (gpt_cond_latent, speaker_embedding) pour un audio de référence, depuis le cache
+        de latents si possible; sinon les calcule avec l'encodeur de conditionnement XTTS.
+        Args :
+            speaker_reference : chemin de l'audio de référence, ou tuple (sr, données) d'une voix
+                envoyée par l'utilisateur (traitée en mémoire, jamais écrite sur disque).
+            epingler : garder ces latents en mémoire sans jamais les évincer (voix fournies).
+        """
+        config = self.model.config
+        en_memoire = not isinstance(speaker_reference, str)
+        cle = latents_cache.cle(
+            self.empreinte_reference(speaker_reference),
+            self.revision,
+            (config.gpt_cond_len, config.max_ref_len, config.sound_norm_refs)
+        )
+
+        def calculer():
+            print("Calcul des latents de conditionnement de l'orateur...")
+            if en_memoire:
+                return self.latents_depuis_signal(speaker_reference)
+            return self.model.get_conditioning_latents(
+                audio_path=[speaker_reference],
+                gpt_cond_len=config.gpt_cond_len,
+                max_ref_length=config.max_ref_len,
+                sound_norm_refs=config.sound_norm_refs,
+            )
+
+        gpt_cond_latent, speaker_embedding = latents_cache.get(
+            cle, calculer, epingler=epingler, persister=not en_memoire
+        )
+        device_modele = next(self.model.parameters()).device
+        return gpt_cond_latent.to(device_modele), speaker_embedding.to(device_modele)
+
+    def precalculer_voix(self, dossier: str):
+        """
+        Calcule (ou recharge du disque) et épingle en mémoire les latents des voix d'un dossier.
+        """
+        if not os.path.isdir(dossier):
+            return
+        for nom in sorted(os.listdir(dossier)):
+            if nom.lower().endswith(".wav"):
+                self.conditioning_latents(os.path.join(dossier, nom), epingler=True)
+
     def default_local_dir(self, checkpoint_repo_or_dir: str) -> str:
         """
         Génère un chemin de répertoire local par défaut pour stocker le point de contrôle du modèle.
@@ -137,19 +365,143 @@ class MooreTTS:
         components = ['model_compressed.pth', 'config.json', 'vocab.json', 'dvae.pth', 'mel_stats.pth']
         return {name: os.path.join(local_dir, name) for name in components}
 
+    def decouper(self, texte: str) -> list:
+        """
+        Découpe un texte en morceaux d'au plus MAX_TOKENS_PHRASE tokens du tokenizer XTTS,
+        les phrases de moins de MIN_TOKENS_PHRASE tokens voisines étant regroupées jusqu'à
+        CIBLE_TOKENS_PHRASE tokens.
+        """
+        compter = compteur_xtts(self.model.tokenizer, self.language_code)
+        return decouper_par_budget(texte, compter, MAX_TOKENS_PHRASE, CIBLE_TOKENS_PHRASE, MIN_TOKENS_PHRASE)
+
+    def encoder_phrase(self, texte: str) -> torch.Tensor:
+        """
+        Tokenise une phrase comme Xtts.inference (minuscules, code de langue), forme (1, n).
+        """
+        tokens = self.model.tokenizer.encode(texte.strip().lower(), lang=self.language_code)
+        assert len(tokens) < self.model.args.gpt_max_text_tokens, \
+            f"XTTS ne peut générer qu'un texte de moins de {self.model.args.gpt_max_text_tokens} tokens."
+        return torch.IntTensor(tokens).unsqueeze(0).to(self.model.device)
+
+    @torch.inference_mode()
+    def inference_lot(self, textes: list, gpt_cond_latent, speaker_embedding) -> list:
+        """
+        Synthétise plusieurs phrases ensemble avec les mêmes latents de conditionnement.
+
+        Reprend les étapes de Xtts.inference pour un lot: les préfixes (latents + texte) sont
+        calculés phrase par phrase puis alignés à droite (remplissage à gauche masqué par
+        l'attention_mask), de sorte que chaque phrase voit exactement les mêmes positions qu'en
+        décodage séquentiel; le décodeur GPT autorégressif tourne une seule fois pour tout le lot.
+        Les latents audio sont recalculés phrase par phrase (une seule passe, peu coûteuse) puis
+        vocodés ensemble par HiFi-GAN et recoupés à la longueur de chaque phrase.
+        Args :
+            textes : les phrases à synthétiser.
+            gpt_cond_latent, speaker_embedding : les latents de l'orateur.
+        Returns :
+            La liste des formes d'onde (tenseurs 1D sur CPU), dans l'ordre des textes.
+        """
+        gpt = self.model.gpt
+        gpt_cond_latent = gpt_cond_latent.to(self.model.device)
+        speaker_embedding = speaker_embedding.to(self.model.device)
+
+        tokens = [self.encoder_phrase(texte) for texte in textes]
+        prefixes = []
+        for text_tokens in tokens:
+            entree = F.pad(text_tokens, (0, 1), value=gpt.stop_text_token)
+            entree = F.pad(entree, (1, 0), value=gpt.start_text_token)
+            emb = gpt.text_embedding(entree) + gpt.text_pos_embedding(entree)
+            prefixes.append(torch.cat([gpt_cond_latent, emb], dim=1)[0])
+
+        longueur = max(prefixe.shape[0] for prefixe in prefixes)
+        prefixe_lot = prefixes[0].new_zeros(len(prefixes), longueur, prefixes[0].shape[-1])
+        attention_mask = torch.zeros(len(prefixes), longueur + 1, dtype=torch.long, device=self.model.device)
+        for i, prefixe in enumerate(prefixes):
+            prefixe_lot[i, longueur - prefixe.shape[0]:] = prefixe
+            attention_mask[i, longueur - prefixe.shape[0]:] = 1
+
+        gpt.gpt_inference.store_prefix_emb(prefixe_lot)
+        gpt_inputs = torch.ones(len(prefixes), longueur + 1, dtype=torch.long, device=self.model.device)
+        gpt_inputs[:, -1] = gpt.start_audio_token
+        codes = gpt.gpt_inference.generate(
+            gpt_inputs,
+            attention_mask=attention_mask,
+            bos_token_id=gpt.start_audio_token,
+            pad_token_id=gpt.stop_audio_token,
+            eos_token_id=gpt.stop_audio_token,
+            max_length=gpt.max_gen_mel_tokens + gpt_inputs.shape[-1],
+            do_sample=True,
+            num_return_sequences=1,
+            num_beams=1,
+            output_attentions=False,
+            **PARAMETRES_GENERATION,
+        )[:, gpt_inputs.shape[-1]:]
+
+        latents = []
+        for i, text_tokens in enumerate(tokens):
+            # les séquences terminées sont complétées par le token d'arrêt: on garde le premier
+            fin = (codes[i] == gpt.stop_audio_token).nonzero()
+            gpt_codes = codes[i:i + 1, :int(fin[0]) + 1 if len(fin) else codes.shape[-1]]
+            latents.append(gpt(
+                text_tokens,
+                torch.tensor([text_tokens.shape[-1]], device=self.model.device),
+                gpt_codes,
+                torch.tensor([gpt_codes.shape[-1] * gpt.code_stride_len], device=self.model.device),
+                cond_latents=gpt_cond_latent,
+                return_attentions=False,
+                return_latent=True,
+            )[0])
+
+        longueur = max(latent.shape[0] for latent in latents)
+        latents_lot = latents[0].new_zeros(len(latents), longueur, latents[0].shape[-1])
+        for i, latent in enumerate(latents):
+            latents_lot[i, :latent.shape[0]] = latent
+        wavs = self.model.hifigan_decoder(latents_lot, g=speaker_embedding).cpu()
+        wavs = wavs.reshape(len(latents), -1)
+
+        # le vocodeur produit une durée proportionnelle au nombre de trames de latent, le nombre
+        # d'échantillons par trame n'étant pas entier (rééchantillonnage 22,05 -> 24 kHz)
+        return [wavs[i, :round(latent.shape[0] * wavs.shape[-1] / longueur)] for i, latent in enumerate(latents)]
+
+    def synthetiser_phrases(self, phrases: list, voix: str, gpt_cond_latent, speaker_embedding) -> list:
+        """
+        Synthétise des phrases en passant par le cache audio: seules les phrases absentes du cache
+        (et une seule fois chacune) sont décodées, triées par longueur en lots de PHRASES_PAR_LOT.
+        Args :
+            phrases : les phrases à synthétiser.
+            voix : l'empreinte de l'audio de référence.
+            gpt_cond_latent, speaker_embedding : les latents de l'orateur.
+        Returns :
+            La liste des formes d'onde (tenseurs 1D sur CPU), dans l'ordre des phrases.
+        """
+        def synthetiser(manquantes):
+            ordre = sorted(range(len(manquantes)), key=lambda i: len(manquantes[i]))
+            wavs = [None] * len(manquantes)
+            for debut in tqdm(range(0, len(ordre), PHRASES_PAR_LOT)):
+                indices = ordre[debut:debut + PHRASES_PAR_LOT]
+                lot = self.inference_lot([manquantes[i] for i in indices], gpt_cond_latent, speaker_embedding)
+                for i, wav in zip(indices, lot):
+                    wavs[i] = wav.numpy()
+            return wavs
+
+        parametres = tuple(sorted(PARAMETRES_GENERATION.items()))
+        wavs = synthetiser_avec_cache(phrases, voix, self.revision, parametres, synthetiser)
+        return [torch.from_numpy(wav) for wav in wavs]
+
     def text_to_speech(
             self,
             tts_text: str,
-            speaker_reference_wav_path: Optional[str] = None,
-            temperature: Optional[float] = 0.1
+            speaker_reference_wav_path: Optional[Union[str, Tuple]] = None,
+            temperature: Optional[float] = 0.1,
+            par_lot: bool = True
     ) -> Tuple[int, torch.Tensor]:
         """
         Convertit un texte en audio de synthèse vocale.
         Args :
             text : Le texte d'entrée à convertir en audio.
-            speaker_reference_wav_path : Un chemin vers un fichier WAV de référence pour l'orateur.
+            speaker_reference_wav_path : Un chemin vers un fichier WAV de référence pour l'orateur,
+                                         ou un tuple (sr, données) pour une voix clonée en mémoire.
             temperature : Le paramètre de température pour l'échantillonnage.
-            enable_text_splitting : Indicateur pour activer ou désactiver la découpe du texte.
+            par_lot : décoder les phrases par lots (inference_lot) plutôt qu'une à une.
         Returns :
             Un tuple contenant le taux d'échantillonnage et le tenseur audio généré.
         """
@@ -157,33 +509,28 @@ class MooreTTS:
             speaker_reference_wav_path = "./audios/ref1_male_17.wav"
             print("Utilisation du fichier de référence par défaut ./audios/ref1_male_17.wav")
 
-        print("Calcul des latents de conditionnement de l'orateur...")
-        gpt_cond_latent, speaker_embedding = self.model.get_conditioning_latents(
-            audio_path=[speaker_reference_wav_path],
-            gpt_cond_len=self.model.config.gpt_cond_len,
-            max_ref_length=self.model.config.max_ref_len,
-            sound_norm_refs=self.model.config.sound_norm_refs,
-        )
+        gpt_cond_latent, speaker_embedding = self.conditioning_latents(speaker_reference_wav_path)
 
-        tts_texts = diviser_phrases_moore(tts_text)
+        tts_texts = self.decouper(tts_text)
         
         print("Début de l'inférence...")
         start_time = time.time()
 
-        wav_chunks = []
-        for text in tqdm(tts_texts):
-            wav_chunk = self.model.inference(
-                text=text,
-                language=self.language_code,
-                gpt_cond_latent=gpt_cond_latent,
-                speaker_embedding=speaker_embedding,
-                temperature=0.1,
-                length_penalty=1.0,
-                repetition_penalty=10.0,
-                top_k=10,
-                top_p=0.3,
+        if par_lot:
+            wav_chunks = self.synthetiser_phrases(
+                tts_texts, self.empreinte_reference(speaker_reference_wav_path), gpt_cond_latent, speaker_embedding
             )
-            wav_chunks.append(torch.tensor(wav_chunk["wav"]))
+        else:
+            wav_chunks = []
+            for text in tqdm(tts_texts):
+                wav_chunk = self.model.inference(
+                    text=text,
+                    language=self.language_code,
+                    gpt_cond_latent=gpt_cond_latent,
+                    speaker_embedding=speaker_embedding,
+                    **PARAMETRES_GENERATION,
+                )
+                wav_chunks.append(torch.tensor(wav_chunk["wav"]))
         
         end_time = time.time()
 
@@ -195,30 +542,50 @@ class MooreTTS:
         return sampling_rate, audio
 
 
-# function to convert text to speech
-@spaces.GPU
-def text_to_speech(tts, text, reference_speaker: str, reference_audio: Optional[Tuple] = None):
-    if reference_audio is not None:
-        ref_sr, ref_audio = reference_audio
-        ref_audio = torch.from_numpy(ref_audio)
+    def text_to_speech_flux(self, tts_text: str, speaker_reference_wav_path: Optional[Union[str, Tuple]] = None):
+        """
+        Version en flux de text_to_speech: émet l'audio phrase par phrase dès sa synthèse.
+        La première phrase est synthétisée seule pour réduire le délai avant le premier son,
+        les suivantes par lots de PHRASES_PAR_LOT dans l'ordre du texte.
+        Args :
+            tts_text : Le texte d'entrée à convertir en audio.
+            speaker_reference_wav_path : Un chemin vers un fichier WAV de référence pour l'orateur,
+                                         ou un tuple (sr, données) pour une voix clonée en mémoire.
+        Yields :
+            Des tuples (taux d'échantillonnage, forme d'onde 1D sur CPU), un par phrase.
+        """
+        if speaker_reference_wav_path is None:
+            speaker_reference_wav_path = "./audios/ref1_male_17.wav"
+            print("Utilisation du fichier de référence par défaut ./audios/ref1_male_17.wav")
 
-        # Add a channel dimension if the audio is 1D
-        if ref_audio.ndim == 1:
-            ref_audio = ref_audio.unsqueeze(0)
+        gpt_cond_latent, speaker_embedding = self.conditioning_latents(speaker_reference_wav_path)
+        sampling_rate = self.config.model_args.output_sample_rate
 
-        # Save the reference audio to a temporary file if it's not None
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tmp:
-            torchaudio.save(tmp.name, ref_audio, ref_sr)
-            tmp_path = tmp.name
+        tts_texts = self.decouper(tts_text)
+        lots = [tts_texts[:1]] + [tts_texts[i:i + PHRASES_PAR_LOT] for i in range(1, len(tts_texts), PHRASES_PAR_LOT)]
+        voix = self.empreinte_reference(speaker_reference_wav_path)
+        start_time = time.time()
+        for lot in lots:
+            if not lot:
+                continue
+            for wav in self.synthetiser_phrases(lot, voix, gpt_cond_latent, speaker_embedding):
+                yield sampling_rate, wav
+            print(f"{len(lot)} phrase(s) générée(s) à {time.time() - start_time:.2f} secondes.")
 
-        # Use the temporary file as the speaker reference
-        sr, audio = tts.text_to_speech(text, speaker_reference_wav_path=tmp_path)
 
-        # Clean up the temporary file
-        os.unlink(tmp_path)
-    else:
-        # If no reference audio provided, proceed with the reference_speaker
-        sr, audio = tts.text_to_speech(text, speaker_reference_wav_path=reference_speaker)
+def charger_moore_tts(checkpoint_repo_or_dir: str) -> MooreTTS:
+    """
+    Retourne l'instance MooreTTS du registre partagé, en la chargeant au besoin.
+    """
+    return registry.get(checkpoint_repo_or_dir, lambda: MooreTTS(checkpoint_repo_or_dir), device=device)
+
+
+# function to convert text to speech
+@spaces.GPU
+def text_to_speech(tts, text, reference_speaker: str, reference_audio: Optional[Tuple] = None):
+    # la voix envoyée (sr, données) est conditionnée directement en mémoire
+    reference = reference_audio if reference_audio is not None else reference_speaker
+    sr, audio = tts.text_to_speech(text, speaker_reference_wav_path=reference)
 
     audio = audio.mean(dim=0)
     return audio, sr
@@ -233,11 +600,13 @@ def goai_tts2(
         solver="Midpoint",
         nfe=128,
         prior_temp=0.01,
-        denoise_before_enhancement=False
+        denoise_before_enhancement=False,
+        latence_cible=None,
+        enchainer=False
 ):
     # TTS pipeline
     tts_model = "ArissBandoss/coqui-tts-moore-V1"
-    tts = MooreTTS(tts_model)
+    tts = charger_moore_tts(tts_model)
     
     reference_speaker = os.path.join("./exples_voix", reference_speaker)
 
@@ -250,22 +619,23 @@ def goai_tts2(
 
     yield text, (sampling_rate, audio_array.numpy()), None, None
 
-    # enhance audio
-    denoised_audio, enhanced_audio = enhance_speech(
+    # enhance audio, par morceaux envoyés à des gr.Audio(streaming=True) dès leur amélioration
+    for denoised_audio, enhanced_audio in enhance_speech_flux(
         audio_array,
         sampling_rate,
         solver,
         nfe,
         prior_temp,
-        denoise_before_enhancement
-    )
-
-    yield (sampling_rate, audio_array.numpy()), denoised_audio, enhanced_audio
+        denoise_before_enhancement,
+        latence_cible_s=latence_cible,
+        enchainer=enchainer
+    ):
+        yield text, gr.update(), denoised_audio, enhanced_audio
 
 
 
 # gradio interface translation and text to speech function
-@spaces.GPU(duration=120)
+@spaces.GPU(duration=DUREE_GPU_S)
 def goai_ttt_tts(
         text,
         reference_speaker,
@@ -273,8 +643,11 @@ def goai_ttt_tts(
         solver="Midpoint",
         nfe=128,
         prior_temp=0.01,
-        denoise_before_enhancement=False
+        denoise_before_enhancement=False,
+        latence_cible=None,
+        enchainer=False
 ):
+    start_time = time.time()
 
     # translation    
     mos_text = goai_traduction(
@@ -287,7 +660,7 @@ def goai_ttt_tts(
     # TTS pipeline
     reference_speaker = os.path.join("./exples_voix", reference_speaker)
     tts_model = "ArissBandoss/coqui-tts-moore-V1"
-    tts = MooreTTS(tts_model)
+    tts = charger_moore_tts(tts_model)
     
     # convert translated text to speech with reference audio
     if reference_audio is not None:
@@ -297,14 +670,19 @@ def goai_ttt_tts(
 
     yield mos_text, (sampling_rate, audio_array.numpy()), None, None
 
-    # enhance audio
-    denoised_audio, enhanced_audio = enhance_speech(
+    # enhance audio, par morceaux envoyés à des gr.Audio(streaming=True) dès leur amélioration
+    for denoised_audio, enhanced_audio in enhance_speech_flux(
         audio_array,
         sampling_rate,
         solver,
         nfe,
         prior_temp,
-        denoise_before_enhancement
-    )
-
-    yield mos_text, (sampling_rate, audio_array.numpy()), denoised_audio, enhanced_audio
\ No newline at end of file
+        denoise_before_enhancement,
+        # l'amélioration doit tenir dans ce qui reste de la fenêtre GPU
+        latence_cible_s=min(
+            latence_cible if latence_cible is not None else float("inf"),
+            DUREE_GPU_S - MARGE_GPU_S - (time.time() - start_time)
+        ),
+        enchainer=enchainer
+    ):
+        yield mos_text, gr.update(), denoised_audio, enhanced_audio
\ No newline at end of file
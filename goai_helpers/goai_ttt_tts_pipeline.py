@@ -1,10 +1,15 @@
 import os
+import queue
 import spaces
+import threading
 from huggingface_hub import login
 
-from goai_helpers.goai_traduction import goai_traduction
-from goai_helpers.goai_tts2 import MooreTTS, text_to_speech
-from goai_helpers.goai_tts import goai_tts
+from goai_helpers.goai_traduction import resoudre_modele, decouper_texte, traduire
+from goai_helpers.model_registry import revision_hub
+from goai_helpers.audio import FonduEnchaine
+from goai_helpers.goai_tts2 import charger_moore_tts
+from goai_helpers.goai_tts import synthetiser_phrases
+from goai_helpers.utils import diviser_phrases_moore
 
 
 # authentification
@@ -12,34 +17,38 @@ auth_token = os.getenv('HF_SPACE_TOKEN')
 login(token=auth_token)
 
 
-# gradio interface text to speech function
-@spaces.GPU
-def goai_many_tts(
-        text,
-        tts_model,
-        reference_speaker,
-        reference_audio=None,
-    ):
+def _traduire_en_fond(text, file, stop):
+    """
+    Producteur: traduit le texte morceau par morceau (fr ==> mos) et dépose chaque
+    traduction dans la file dès qu'elle est prête; None marque la fin. S'arrête
+    avant le morceau suivant dès que `stop` est levé (consommateur fermé).
+    """
+    try:
+        model_id = resoudre_modele("fra_Latn", "mos_Latn")
+        for morceau in decouper_texte(text, model_id, revision_hub(model_id)):
+            if stop.is_set():
+                break
+            file.put(("phrase", traduire([morceau], "fra_Latn", "mos_Latn")[0]))
+    except Exception as e:
+        file.put(("erreur", e))
+    finally:
+        file.put(None)
 
-    if "coqui" in tts_model:
-        # TTS pipeline
-        tts = MooreTTS(tts_model)
-        reference_speaker = os.path.join("./exples_voix", reference_speaker)
-
-        # convert translated text to speech with reference audio
-        if reference_audio is not None:
-            audio_array, sampling_rate = text_to_speech(tts, text, reference_speaker, reference_audio)
-        else:
-            audio_array, sampling_rate = text_to_speech(tts, text, reference_speaker=reference_speaker)
-
-        return sampling_rate, audio_array.numpy()
-    
-    elif "mms" in tts_model:
-        sample_rate, audio_data = goai_tts(text)
-        return sample_rate, audio_data
 
+def _synthetiser(traductions, tts, reference):
+    """
+    Consommateur: synthétise des traductions Mooré, en morceaux (sr, np.ndarray) rendus au fil de l'eau.
+    Sans XTTS, leurs phrases passent ensemble dans les paquets VITS (cache audio compris).
+    """
+    if tts is not None:
+        for traduction in traductions:
+            for sample_rate, wav in tts.text_to_speech_flux(traduction, speaker_reference_wav_path=reference):
+                yield sample_rate, wav.numpy()
     else:
-        print("Erreur de modèle!!! Veuillez vérifier le modèle sélectionné.")
+        phrases = [phrase for traduction in traductions for phrase in diviser_phrases_moore(traduction)]
+        sample_rate, wavs = synthetiser_phrases(phrases)
+        for wav in wavs:
+            yield sample_rate, wav
 
 
 # gradio interface translation and text to speech function
@@ -50,20 +59,71 @@ def goai_ttt_tts(
         reference_speaker,
         reference_audio=None,
     ):
+    """
+    Traduction fr ==> mos puis synthèse vocale, en pipeline: la traduction tourne dans un fil
+    producteur qui émet les phrases Mooré une à une, pendant que la synthèse de la phrase
+    précédente se poursuit. Le texte et l'audio (fondu enchaîné entre les phrases) sont
+    envoyés à l'interface dès qu'ils sont disponibles.
 
-    # 1. TTT: Translation fr ==> mos    
-    mos_text = goai_traduction(
-        text, 
-        src_lang="fra_Latn", 
-        tgt_lang="mos_Latn"
-    )
-    yield mos_text, None
-    
-    # 2. TTS: Text to Speech
-    sample_rate, audio_data = goai_many_tts(
-        mos_text,
-        tts_model,
-        reference_speaker,
-        reference_audio=reference_audio,
-    )
-    yield mos_text, (sample_rate, audio_data)
\ No newline at end of file
+    Yields:
+        tuple[str, tuple | None]: le texte Mooré traduit jusqu'ici et le dernier morceau d'audio.
+    """
+    if "coqui" not in tts_model and "mms" not in tts_model:
+        print("Erreur de modèle!!! Veuillez vérifier le modèle sélectionné.")
+        return
+
+    tts, reference = None, None
+    if "coqui" in tts_model:
+        tts = charger_moore_tts(tts_model)
+        reference = reference_audio if reference_audio is not None else os.path.join("./exples_voix", reference_speaker)
+
+    # 1. TTT: Translation fr ==> mos, dans un fil producteur
+    file = queue.Queue()
+    stop = threading.Event()
+    threading.Thread(target=_traduire_en_fond, args=(text, file, stop), daemon=True).start()
+
+    # 2. TTS: Text to Speech, dès la traduction des phrases
+    phrases_mos = []
+    fondu, sample_rate = None, None
+    fini = False
+    try:
+        while not fini:
+            evenements = [file.get()]
+            if tts is None:
+                # MMS: les traductions déjà prêtes sont synthétisées ensemble
+                while True:
+                    try:
+                        evenements.append(file.get_nowait())
+                    except queue.Empty:
+                        break
+
+            traductions = []
+            for evenement in evenements:
+                if evenement is None:
+                    fini = True
+                    break
+                nature, contenu = evenement
+                if nature == "erreur":
+                    raise contenu
+                traductions.append(contenu)
+            if not traductions:
+                continue
+
+            phrases_mos.extend(traductions)
+            mos_text = " ".join(phrases_mos)
+            yield mos_text, None
+
+            for sample_rate, morceau in _synthetiser(traductions, tts, reference):
+                if fondu is None:
+                    fondu = FonduEnchaine(sample_rate)
+                sortie = fondu.ajouter(morceau)
+                if sortie.shape[-1]:
+                    yield mos_text, (sample_rate, sortie)
+    finally:
+        # générateur fermé (client parti) ou erreur: le producteur cesse de traduire
+        stop.set()
+
+    if fondu is not None:
+        yield " ".join(phrases_mos), (sample_rate, fondu.terminer())
+    elif not phrases_mos:
+        yield "", None
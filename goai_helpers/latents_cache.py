@@ -0,0 +1,132 @@
+import os
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import torch
+
+from goai_helpers.traduction_cache import CACHE_DIR
+
+
+def hash_fichier(chemin: str) -> str:
+    """
+    Empreinte sha256 du contenu d'un fichier audio de référence.
+    """
+    empreinte = hashlib.sha256()
+    with open(chemin, "rb") as f:
+        for bloc in iter(lambda: f.read(1 << 20), b""):
+            empreinte.update(bloc)
+    return empreinte.hexdigest()
+
+
+def hash_signal(sampling_rate: int, donnees) -> str:
+    """
+    Empreinte sha256 d'un audio en mémoire (taux d'échantillonnage, type, forme et échantillons).
+    """
+    donnees = np.ascontiguousarray(donnees)
+    empreinte = hashlib.sha256(f"{sampling_rate}|{donnees.dtype}|{donnees.shape}".encode("utf-8"))
+    empreinte.update(memoryview(donnees).cast("B"))
+    return empreinte.hexdigest()
+
+
+class CacheLatents:
+    """
+    Cache des latents de conditionnement XTTS (gpt_cond_latent, speaker_embedding).
+
+    Une clé est l'empreinte du contenu de l'audio de référence, la révision du modèle et les
+    paramètres de conditionnement. Les latents sont gardés en mémoire (LRU de `max_memoire`
+    entrées, les voix épinglées n'étant jamais évincées) et persistés sur disque
+    (au plus `max_disque` fichiers, les plus anciens étant supprimés).
+
+    Attributs :
+        dossier (str) : dossier de persistance des latents.
+        hits (int), misses (int) : compteurs d'accès.
+    """
+
+    def __init__(self, dossier: str = None, max_memoire: int = 64, max_disque: int = 1000):
+        self.dossier = dossier or os.path.join(CACHE_DIR, "latents")
+        self.max_memoire = max_memoire
+        self.max_disque = max_disque
+
+        self._memoire = OrderedDict()
+        self._epinglees = {}
+        self._verrou = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.dossier, exist_ok=True)
+
+    @staticmethod
+    def cle(empreinte: str, revision: str, parametres: tuple) -> str:
+        contenu = "\x1f".join([empreinte, revision] + [str(p) for p in parametres])
+        return hashlib.sha256(contenu.encode("utf-8")).hexdigest()
+
+    def get(self, cle: str, calculer, epingler: bool = False, persister: bool = True):
+        """
+        Retourne les latents de la clé, depuis la mémoire, le disque, ou en appelant `calculer()`.
+        Avec `persister=False` (voix envoyées par les utilisateurs), rien n'est lu ni écrit sur disque.
+        """
+        with self._verrou:
+            if cle in self._epinglees:
+                self.hits += 1
+                return self._epinglees[cle]
+            if cle in self._memoire:
+                self._memoire.move_to_end(cle)
+                self.hits += 1
+                return self._memoire[cle]
+
+        chemin = os.path.join(self.dossier, cle + ".pt")
+        latents = None
+        if persister and os.path.exists(chemin):
+            try:
+                latents = tuple(torch.load(chemin, map_location="cpu"))
+                os.utime(chemin)
+            except Exception as e:
+                print(f"Latents illisibles {chemin}: {e}")
+
+        if latents is None:
+            with self._verrou:
+                self.misses += 1
+            latents = tuple(t.detach().cpu() for t in calculer())
+            if persister:
+                # fichier temporaire propre à cet écrivain: plusieurs fils ou processus peuvent calculer la même clé
+                with tempfile.NamedTemporaryFile(dir=self.dossier, suffix=".tmp", delete=False) as f:
+                    torch.save(latents, f)
+                os.replace(f.name, chemin)
+                self._nettoyer_disque()
+        else:
+            with self._verrou:
+                self.hits += 1
+
+        with self._verrou:
+            if epingler:
+                self._epinglees[cle] = latents
+            else:
+                self._memoire[cle] = latents
+                while len(self._memoire) > self.max_memoire:
+                    self._memoire.popitem(last=False)
+        return latents
+
+    def _nettoyer_disque(self):
+        fichiers = [os.path.join(self.dossier, f) for f in os.listdir(self.dossier) if f.endswith(".pt")]
+        if len(fichiers) <= self.max_disque:
+            return
+        fichiers.sort(key=os.path.getmtime)
+        for chemin in fichiers[:len(fichiers) - self.max_disque]:
+            try:
+                os.remove(chemin)
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        with self._verrou:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "memoire": len(self._memoire),
+                "epinglees": len(self._epinglees),
+            }
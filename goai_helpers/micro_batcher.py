@@ -0,0 +1,204 @@
+import os
+import time
+import asyncio
+import threading
+from collections import Counter
+
+from goai_helpers.goai_traduction import (
+    goai_traduction_batch, goai_traduction_stream, phrases_par_batch, resoudre_modele, decouper_texte
+)
+from goai_helpers.model_registry import revision_hub
+
+
+# limites des classes de l'histogramme d'attente (en millisecondes)
+BORNES_ATTENTE_MS = [1, 5, 10, 20, 50, 100, 200, 500, 1000, 5000]
+
+
+class _Requete:
+    def __init__(self, textes, src_lang, tgt_lang, future):
+        self.textes = textes
+        self.src_lang = src_lang
+        self.tgt_lang = tgt_lang
+        self.future = future
+        self.arrivee = time.perf_counter()
+
+
+class MicroBatcher:
+    """
+    Regroupe les requêtes de traduction concurrentes en un seul appel au modèle.
+
+    Les requêtes arrivant pendant une fenêtre de `fenetre_ms` millisecondes (ou jusqu'à
+    `max_batch` textes) sont traduites ensemble par `goai_traduction_batch`, puis chaque
+    appelant reçoit ses propres traductions.
+
+    Attributs :
+        fenetre_ms (float) : durée de la fenêtre de collecte.
+        max_batch (int) : nombre maximal de textes par lot.
+        attente (Counter) : histogramme du temps d'attente en file (borne supérieure en ms -> nombre).
+        tailles (Counter) : histogramme des tailles de lot (nombre de textes -> nombre de lots).
+    """
+
+    def __init__(self, fenetre_ms: float = 20, max_batch: int = 32):
+        self.fenetre_ms = fenetre_ms
+        self.max_batch = max_batch
+        self.attente = Counter()
+        self.tailles = Counter()
+
+        self._file = None
+        self._tache = None
+
+    def _demarrer(self):
+        # la file et la tâche sont liées à la boucle asyncio en cours (celle de gradio); si la tâche
+        # s'est arrêtée, seule elle est relancée, les requêtes déjà en file restant à servir
+        if self._file is None:
+            self._file = asyncio.Queue()
+        if self._tache is None or self._tache.done():
+            if self._tache is not None and not self._tache.cancelled():
+                print(f"Micro-batcher: boucle relancée après l'erreur {self._tache.exception()!r}")
+            self._tache = asyncio.get_running_loop().create_task(self._boucle())
+
+    async def traduire(self, textes, src_lang, tgt_lang) -> list:
+        """
+        Soumet une liste de textes et attend leurs traductions.
+        """
+        if not textes:
+            return []
+        self._demarrer()
+        future = asyncio.get_running_loop().create_future()
+        await self._file.put(_Requete(list(textes), src_lang, tgt_lang, future))
+        return await future
+
+    async def _boucle(self):
+        loop = asyncio.get_running_loop()
+        lot = []
+        try:
+            while True:
+                lot = [await self._file.get()]
+                nb_textes = len(lot[0].textes)
+                echeance = loop.time() + self.fenetre_ms / 1000
+
+                while nb_textes < self.max_batch:
+                    reste = echeance - loop.time()
+                    if reste <= 0:
+                        break
+                    try:
+                        requete = await asyncio.wait_for(self._file.get(), reste)
+                    except asyncio.TimeoutError:
+                        break
+                    lot.append(requete)
+                    nb_textes += len(requete.textes)
+
+                await self._executer(lot)
+                lot = []
+        except BaseException as e:
+            # les requêtes déjà retirées de la file ne seraient plus servies: leurs appelants
+            # reçoivent l'exception qui a arrêté la boucle (ou l'annulation)
+            for requete in lot:
+                if requete.future.done():
+                    continue
+                if isinstance(e, asyncio.CancelledError):
+                    requete.future.cancel()
+                else:
+                    requete.future.set_exception(e)
+            raise
+
+    async def _executer(self, lot):
+        loop = asyncio.get_running_loop()
+        debut = time.perf_counter()
+        for requete in lot:
+            attente_ms = (debut - requete.arrivee) * 1000
+            self.attente[next((b for b in BORNES_ATTENTE_MS if attente_ms <= b), float("inf"))] += 1
+
+        # un appel au modèle par direction de traduction
+        directions = {}
+        for requete in lot:
+            directions.setdefault((requete.src_lang, requete.tgt_lang), []).append(requete)
+
+        for (src_lang, tgt_lang), requetes in directions.items():
+            textes = [texte for requete in requetes for texte in requete.textes]
+            self.tailles[len(textes)] += 1
+            try:
+                traductions = await loop.run_in_executor(None, goai_traduction_batch, textes, src_lang, tgt_lang)
+            except Exception as e:
+                for requete in requetes:
+                    if not requete.future.done():
+                        requete.future.set_exception(e)
+                continue
+
+            position = 0
+            for requete in requetes:
+                resultat = traductions[position:position + len(requete.textes)]
+                position += len(requete.textes)
+                if not requete.future.done():
+                    requete.future.set_result(resultat)
+
+    def stats(self) -> dict:
+        """
+        Retourne les histogrammes d'attente en file et de taille des lots.
+        """
+        return {"attente_ms": dict(sorted(self.attente.items())), "tailles_lot": dict(sorted(self.tailles.items()))}
+
+
+_batcher = None
+_verrou_batcher = threading.Lock()
+
+
+def get_batcher() -> MicroBatcher:
+    """
+    Retourne le micro-batcher du processus, créé au premier appel.
+    """
+    global _batcher
+    with _verrou_batcher:
+        if _batcher is None:
+            _batcher = MicroBatcher(
+                fenetre_ms=float(os.getenv("GOAI_BATCH_FENETRE_MS", 20)),
+                max_batch=int(os.getenv("GOAI_BATCH_MAX", 32)),
+            )
+    return _batcher
+
+
+async def goai_traduction_async(text, src_lang, tgt_lang, taille_paquet=phrases_par_batch):
+    """
+    Traduit un long texte par morceaux (voir decouper_texte), afin de ne pas dépasser `max_length`
+    tokens par entrée, et renvoie la traduction partielle après chaque paquet de `taille_paquet`
+    morceaux. Les morceaux de plusieurs utilisateurs simultanés sont traduits dans les mêmes lots
+    par le micro-batcher.
+
+    Yields:
+        str: la traduction des phrases déjà traitées.
+    """
+    batcher = get_batcher()
+    model_id = resoudre_modele(src_lang, tgt_lang)
+    # le chargement du tokenizer et la résolution de la révision peuvent bloquer: hors de la boucle
+    phrases = await asyncio.get_running_loop().run_in_executor(
+        None, lambda: decouper_texte(text, model_id, revision_hub(model_id))
+    )
+    traductions = []
+    for debut in range(0, len(phrases), taille_paquet):
+        traductions.extend(await batcher.traduire(phrases[debut:debut + taille_paquet], src_lang, tgt_lang))
+        yield " ".join(traductions)
+
+
+async def goai_traduction_interface(text, src_lang, tgt_lang, flux=False):
+    """
+    Point d'entrée de l'onglet de traduction: par défaut, traduction par lots partagés entre
+    utilisateurs (goai_traduction_async); avec `flux`, affichage au fil des tokens générés
+    (goai_traduction_stream, décodage glouton, hors micro-batcher).
+
+    Yields:
+        str: la traduction partielle du texte.
+    """
+    if not flux:
+        async for traduction in goai_traduction_async(text, src_lang, tgt_lang):
+            yield traduction
+        return
+
+    # le générateur synchrone avance dans un thread, pour ne pas bloquer la boucle de gradio
+    loop = asyncio.get_running_loop()
+    traductions = goai_traduction_stream(text, src_lang, tgt_lang)
+    fin = object()
+    while True:
+        traduction = await loop.run_in_executor(None, next, traductions, fin)
+        if traduction is fin:
+            return
+        yield traduction
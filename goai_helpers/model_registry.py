@@ -0,0 +1,224 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+import torch
+from huggingface_hub import model_info
+
+# durée (secondes) pendant laquelle une révision résolue sur le hub est réutilisée
+REVISION_TTL = int(os.getenv("GOAI_REVISION_TTL", 600))
+_revisions = {}
+
+
+def _budget_depuis_env(nom: str):
+    """
+    Lit un budget mémoire (en Go) depuis une variable d'environnement.
+    Retourne None (pas de limite) si la variable est absente ou vide.
+    """
+    valeur = os.getenv(nom)
+    if not valeur:
+        return None
+    return int(float(valeur) * 1024 ** 3)
+
+
+def type_device(device) -> str:
+    """
+    Ramène un device (str, int, torch.device ou None) à son type: 'cuda' ou 'cpu'.
+    """
+    if device is None:
+        return "cpu"
+    if isinstance(device, int):
+        return "cuda" if device >= 0 else "cpu"
+    return torch.device(device).type
+
+
+def revision_hub(model_id: str) -> str:
+    """
+    Résout la révision (sha du commit) courante d'un modèle sur le hub.
+    Le résultat est conservé `REVISION_TTL` secondes; pour un chemin local ou si le hub
+    est injoignable, la dernière révision connue (ou 'local') est retournée.
+    """
+    if os.path.exists(model_id):
+        return "local"
+
+    revision, horodatage = _revisions.get(model_id, (None, 0.0))
+    if revision is not None and time.time() - horodatage < REVISION_TTL:
+        return revision
+
+    try:
+        revision = model_info(model_id, token=os.getenv('HF_SPACE_TOKEN')).sha
+    except Exception as e:
+        print(f"Révision de {model_id} non résolue: {e}")
+        revision = revision or "local"
+
+    _revisions[model_id] = (revision, time.time())
+    return revision
+
+
+def estimer_taille(obj, _vus=None) -> int:
+    """
+    Estime la mémoire occupée (en octets) par les paramètres et buffers des modules torch
+    contenus dans un objet chargé (modèle, pipeline, tuple de composants, instance MooreTTS...).
+    """
+    if _vus is None:
+        _vus = set()
+    if obj is None or id(obj) in _vus:
+        return 0
+    _vus.add(id(obj))
+
+    if isinstance(obj, torch.nn.Module):
+        tenseurs = list(obj.parameters()) + list(obj.buffers())
+        return sum(t.numel() * t.element_size() for t in tenseurs)
+    if isinstance(obj, torch.Tensor):
+        return obj.numel() * obj.element_size()
+    if isinstance(obj, (tuple, list)):
+        return sum(estimer_taille(o, _vus) for o in obj)
+    if isinstance(obj, dict):
+        return sum(estimer_taille(o, _vus) for o in obj.values())
+
+    # pipelines transformers, MooreTTS, ... : on regarde l'attribut `model`
+    modele = getattr(obj, "model", None)
+    if modele is not None:
+        return estimer_taille(modele, _vus)
+    return 0
+
+
+class ModelRegistry:
+    """
+    Registre de modèles partagé par tout le processus.
+
+    Les modèles sont chargés paresseusement, identifiés par la clé
+    (model_id, revision, device, dtype), et conservés en mémoire dans la limite d'un budget
+    par type de device (RAM pour 'cpu', VRAM pour 'cuda'). Lorsque le budget est dépassé,
+    les modèles les moins récemment utilisés sont évincés.
+
+    Attributs :
+        budgets (dict) : budget en octets par type de device (None = illimité).
+        hits (int) : nombre de requêtes servies depuis le registre.
+        misses (int) : nombre de chargements effectués.
+        evictions (int) : nombre de modèles évincés.
+        temps_chargement (float) : temps cumulé passé à charger des modèles (secondes).
+    """
+
+    def __init__(self, budget_ram: int = None, budget_vram: int = None):
+        self.budgets = {"cpu": budget_ram, "cuda": budget_vram}
+        self._entrees = OrderedDict()
+        self._verrou = threading.RLock()
+        self._verrous_cle = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.temps_chargement = 0.0
+
+    @staticmethod
+    def cle(model_id: str, revision=None, device=None, dtype=None) -> tuple:
+        return (model_id, revision, str(device) if device is not None else None, str(dtype) if dtype is not None else None)
+
+    def get(self, model_id: str, loader, revision=None, device=None, dtype=None):
+        """
+        Retourne le modèle associé à la clé, en le chargeant avec `loader()` si nécessaire.
+        Args :
+            model_id : identifiant du modèle sur le hub (ou chemin local).
+            loader : fonction sans argument qui charge et retourne le modèle.
+            revision : révision du hub (branche, tag ou sha).
+            device : device sur lequel le modèle est placé.
+            dtype : type des poids du modèle.
+        Returns :
+            L'objet retourné par `loader`.
+        """
+        cle = self.cle(model_id, revision, device, dtype)
+
+        with self._verrou:
+            if cle in self._entrees:
+                self._entrees.move_to_end(cle)
+                self.hits += 1
+                return self._entrees[cle]["objet"]
+            verrou_cle = self._verrous_cle.setdefault(cle, threading.Lock())
+
+        # un seul chargement par clé, sans bloquer les accès aux autres modèles
+        with verrou_cle:
+            with self._verrou:
+                if cle in self._entrees:
+                    self._entrees.move_to_end(cle)
+                    self.hits += 1
+                    return self._entrees[cle]["objet"]
+
+            try:
+                start_time = time.time()
+                objet = loader()
+                duree = time.time() - start_time
+                taille = estimer_taille(objet)
+
+                with self._verrou:
+                    self.misses += 1
+                    self.temps_chargement += duree
+                    self._liberer(type_device(device), taille)
+                    self._entrees[cle] = {"objet": objet, "taille": taille, "device": type_device(device), "duree": duree}
+            finally:
+                # chargement réussi ou non: le verrou de la clé ne sert plus, et rien n'est réservé
+                # dans le budget pour un chargement en échec (il ne compte que les entrées présentes)
+                with self._verrou:
+                    self._verrous_cle.pop(cle, None)
+
+        print(f"Modèle {model_id} chargé en {duree:.2f} secondes ({taille / 1024 ** 2:.0f} Mo).")
+        return objet
+
+    def _liberer(self, device: str, taille: int):
+        """
+        Évince les modèles les moins récemment utilisés du même type de device
+        jusqu'à ce que `taille` octets supplémentaires tiennent dans le budget.
+        """
+        budget = self.budgets.get(device)
+        if budget is None:
+            return
+
+        utilise = sum(e["taille"] for e in self._entrees.values() if e["device"] == device)
+        for cle in [c for c, e in self._entrees.items() if e["device"] == device]:
+            if utilise + taille <= budget:
+                break
+            entree = self._entrees.pop(cle)
+            utilise -= entree["taille"]
+            self.evictions += 1
+            print(f"Modèle {cle[0]} évincé du registre ({entree['taille'] / 1024 ** 2:.0f} Mo).")
+
+        if device == "cuda" and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def evict(self, model_id: str = None):
+        """
+        Retire du registre toutes les entrées (ou seulement celles de `model_id`).
+        """
+        with self._verrou:
+            for cle in list(self._entrees):
+                if model_id is None or cle[0] == model_id:
+                    del self._entrees[cle]
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def stats(self) -> dict:
+        """
+        Retourne les compteurs du registre et la mémoire occupée par type de device.
+        """
+        with self._verrou:
+            memoire = {}
+            for entree in self._entrees.values():
+                memoire[entree["device"]] = memoire.get(entree["device"], 0) + entree["taille"]
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "temps_chargement": self.temps_chargement,
+                "modeles": [cle[0] for cle in self._entrees],
+                "memoire": memoire,
+            }
+
+
+# registre partagé par tous les goai_helpers
+registry = ModelRegistry(
+    budget_ram=_budget_depuis_env("GOAI_RAM_BUDGET_GB"),
+    budget_vram=_budget_depuis_env("GOAI_VRAM_BUDGET_GB"),
+)
@@ -0,0 +1,201 @@
+import os
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from tqdm import tqdm
+
+
+TAILLE_BLOC = 1 << 20                 # 1 Mo par écriture
+TAILLE_PARTIE_MIN = 64 * 2**20        # en dessous, un fichier est téléchargé d'un seul flux
+TIMEOUT = (10, 60)                    # connexion, lecture (secondes)
+
+
+class ErreurTelechargement(RuntimeError):
+    pass
+
+
+def _entetes(token: str = None) -> dict:
+    if token is None:
+        token = os.getenv("HF_SPACE_TOKEN")
+    return {"Authorization": f"Bearer {token}"} if token else {}
+
+
+def _sonder(url: str, entetes: dict):
+    """
+    Retourne (taille, accepte_les_plages) de la ressource, en suivant les redirections.
+    La taille vaut None si le serveur ne l'annonce pas.
+    """
+    reponse = requests.head(url, headers=entetes, allow_redirects=True, timeout=TIMEOUT)
+    reponse.raise_for_status()
+    taille = reponse.headers.get("content-length")
+    plages = reponse.headers.get("accept-ranges", "").lower() == "bytes"
+    return (int(taille) if taille is not None else None), plages
+
+
+def _telecharger_plage(url: str, chemin: str, debut: int, fin: int, entetes: dict, barre):
+    """
+    Télécharge les octets [debut, fin] dans `chemin`, en reprenant après ce que le fichier contient déjà.
+    """
+    deja = os.path.getsize(chemin) if os.path.exists(chemin) else 0
+    attendu = fin - debut + 1
+    if deja > attendu:
+        os.remove(chemin)
+        deja = 0
+    barre.update(deja)
+    if deja == attendu:
+        return
+
+    entetes = dict(entetes, Range=f"bytes={debut + deja}-{fin}")
+    with requests.get(url, headers=entetes, stream=True, timeout=TIMEOUT) as reponse:
+        reponse.raise_for_status()
+        if reponse.status_code != 206:
+            raise ErreurTelechargement(f"{url}: le serveur ignore la requête partielle (statut {reponse.status_code}).")
+        with open(chemin, "ab") as f:
+            for bloc in reponse.iter_content(chunk_size=TAILLE_BLOC):
+                barre.update(f.write(bloc))
+
+    if os.path.getsize(chemin) != attendu:
+        raise ErreurTelechargement(f"{url}: partie {debut}-{fin} incomplète.")
+
+
+def _telecharger_flux(url: str, chemin: str, entetes: dict, barre):
+    """
+    Téléchargement d'un seul flux, sans reprise (serveur sans requêtes partielles).
+    """
+    with requests.get(url, headers=entetes, stream=True, timeout=TIMEOUT) as reponse:
+        reponse.raise_for_status()
+        with open(chemin, "wb") as f:
+            for bloc in reponse.iter_content(chunk_size=TAILLE_BLOC):
+                barre.update(f.write(bloc))
+
+
+def sha256_fichier(chemin: str) -> str:
+    empreinte = hashlib.sha256()
+    with open(chemin, "rb") as f:
+        for bloc in iter(lambda: f.read(TAILLE_BLOC), b""):
+            empreinte.update(bloc)
+    return empreinte.hexdigest()
+
+
+def telecharger(url: str, destination: str, token: str = None, taille: int = None, sha256: str = None,
+                parties: int = 4, taille_partie_min: int = TAILLE_PARTIE_MIN):
+    """
+    Télécharge un fichier de façon reprenable et vérifiée.
+
+    Le contenu est écrit dans `destination.part` (ou dans des parties `destination.part0`, ...
+    téléchargées en parallèle pour les gros fichiers), qui sont reprises là où elles s'étaient
+    arrêtées. La taille et l'empreinte sha256 sont vérifiées avant de renommer atomiquement le
+    fichier à sa place; en cas d'échec, `destination` n'est jamais créé.
+
+    Args:
+        url (str): l'URL à télécharger.
+        destination (str): le chemin final du fichier.
+        token (str): le jeton Hugging Face (par défaut la variable d'environnement HF_SPACE_TOKEN).
+        taille (int): la taille attendue en octets (sinon celle annoncée par le serveur).
+        sha256 (str): l'empreinte attendue (non vérifiée si None).
+        parties (int): nombre maximal de requêtes partielles parallèles.
+        taille_partie_min (int): taille minimale d'une partie.
+
+    Raises:
+        ErreurTelechargement: téléchargement incomplet ou empreinte incorrecte.
+    """
+    if os.path.exists(destination) and (sha256 is None or sha256_fichier(destination) == sha256):
+        return destination
+
+    entetes = _entetes(token)
+    taille_annoncee, plages = _sonder(url, entetes)
+    if taille is None:
+        taille = taille_annoncee
+
+    os.makedirs(os.path.dirname(os.path.abspath(destination)), exist_ok=True)
+    partiel = destination + ".part"
+    nom = os.path.basename(destination)
+
+    with tqdm(desc=nom, total=taille, unit="B", unit_scale=True, unit_divisor=1024) as barre:
+        verrou = threading.Lock()
+
+        class _Barre:
+            def update(self, n):
+                with verrou:
+                    barre.update(n)
+
+        if not plages or not taille:
+            _telecharger_flux(url, partiel, entetes, _Barre())
+        else:
+            nb_parties = max(1, min(parties, taille // taille_partie_min))
+            if nb_parties == 1:
+                _telecharger_plage(url, partiel, 0, taille - 1, entetes, _Barre())
+            else:
+                pas = -(-taille // nb_parties)
+                bornes = [(i, debut, min(debut + pas, taille) - 1) for i, debut in enumerate(range(0, taille, pas))]
+                with ThreadPoolExecutor(max_workers=nb_parties) as pool:
+                    futures = [
+                        pool.submit(_telecharger_plage, url, f"{partiel}{i}", debut, fin, entetes, _Barre())
+                        for i, debut, fin in bornes
+                    ]
+                    for future in futures:
+                        future.result()
+                # assembler les parties (la plus grosse part du coût reste le réseau)
+                with open(partiel, "wb") as sortie:
+                    for i, _, _ in bornes:
+                        with open(f"{partiel}{i}", "rb") as f:
+                            for bloc in iter(lambda: f.read(TAILLE_BLOC), b""):
+                                sortie.write(bloc)
+                for i, _, _ in bornes:
+                    os.remove(f"{partiel}{i}")
+
+    obtenue = os.path.getsize(partiel)
+    if taille is not None and obtenue != taille:
+        os.remove(partiel)
+        raise ErreurTelechargement(f"{nom}: {obtenue} octets au lieu de {taille}.")
+    if sha256 is not None:
+        obtenu = sha256_fichier(partiel)
+        if obtenu != sha256:
+            os.remove(partiel)
+            raise ErreurTelechargement(f"{nom}: empreinte sha256 {obtenu} au lieu de {sha256}.")
+
+    os.replace(partiel, destination)
+    return destination
+
+
+def metadonnees_hub(repo_id: str, fichiers: list, token: str = None) -> dict:
+    """
+    Retourne {fichier: (taille, sha256)} d'après les métadonnées du hub Hugging Face.
+    Le sha256 n'est connu que pour les fichiers stockés en LFS (None sinon).
+    """
+    from huggingface_hub import HfApi
+
+    info = HfApi().model_info(repo_id, files_metadata=True, token=token or os.getenv("HF_SPACE_TOKEN"))
+    metadonnees = {}
+    for fichier in info.siblings:
+        if fichier.rfilename in fichiers:
+            sha256 = fichier.lfs.sha256 if fichier.lfs is not None else None
+            metadonnees[fichier.rfilename] = (fichier.size, sha256)
+    return metadonnees
+
+
+def telecharger_tous(taches: list, max_workers: int = 4, token: str = None):
+    """
+    Télécharge plusieurs fichiers en parallèle.
+
+    Args:
+        taches (list[dict]): les arguments de `telecharger` pour chaque fichier
+            (url, destination et éventuellement taille, sha256).
+        max_workers (int): nombre de fichiers téléchargés simultanément.
+
+    Raises:
+        ErreurTelechargement: si au moins un fichier n'a pas pu être téléchargé
+            (après que les autres téléchargements se sont terminés).
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [(tache["destination"], pool.submit(telecharger, token=token, **tache)) for tache in taches]
+        erreurs = []
+        for destination, future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                erreurs.append(f"{os.path.basename(destination)}: {e}")
+    if erreurs:
+        raise ErreurTelechargement("Échec du téléchargement de " + "; ".join(erreurs))
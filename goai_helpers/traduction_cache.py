@@ -0,0 +1,224 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+
+
+CACHE_DIR = os.getenv("GOAI_CACHE_DIR", os.path.join(os.path.expanduser('~'), "goai_cache"))
+
+
+def normaliser_texte(texte: str) -> str:
+    """
+    Normalise un texte source avant de l'utiliser comme clé de cache:
+    forme Unicode NFC, espaces superflus supprimés.
+    """
+    texte = unicodedata.normalize("NFC", texte)
+    return re.sub(r"\s+", " ", texte).strip()
+
+
+class TraductionCache:
+    """
+    Cache persistant des traductions, adressé par le contenu.
+
+    Une clé est le sha256 du texte source normalisé, de la direction (src_lang, tgt_lang),
+    de l'identifiant du modèle et de sa révision sur le hub. Les entrées sont stockées dans
+    une base SQLite, précédée d'un LRU en mémoire. Lorsqu'une nouvelle révision d'un modèle
+    est rencontrée, les entrées des révisions précédentes de ce modèle sont supprimées.
+    La dernière révision résolue de chaque modèle est conservée dans la base: une révision
+    non résolue ('local', hub injoignable) est remplacée par celle-ci et n'invalide rien.
+
+    Attributs :
+        chemin (str) : chemin de la base SQLite.
+        max_entrees (int) : nombre maximal d'entrées conservées sur disque.
+        max_memoire (int) : nombre maximal d'entrées conservées en mémoire.
+    """
+
+    def __init__(self, chemin: str = None, max_entrees: int = 200_000, max_memoire: int = 10_000):
+        self.chemin = chemin or os.path.join(CACHE_DIR, "traductions.sqlite")
+        self.max_entrees = max_entrees
+        self.max_memoire = max_memoire
+
+        self._memoire = OrderedDict()
+        self._revisions = {}
+        self._verrou = threading.Lock()
+
+        self.hits_memoire = 0
+        self.hits_disque = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(self.chemin), exist_ok=True)
+        self._db = sqlite3.connect(self.chemin, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS traductions (
+                   cle TEXT PRIMARY KEY,
+                   model_id TEXT NOT NULL,
+                   revision TEXT NOT NULL,
+                   traduction TEXT NOT NULL,
+                   acces REAL NOT NULL
+               )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_acces ON traductions (acces)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_modele ON traductions (model_id, revision)")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS revisions (
+                   model_id TEXT PRIMARY KEY,
+                   revision TEXT NOT NULL
+               )"""
+        )
+        self._db.commit()
+
+    @staticmethod
+    def cle(texte: str, src_lang: str, tgt_lang: str, model_id: str, revision: str) -> str:
+        contenu = "\x1f".join([normaliser_texte(texte), src_lang, tgt_lang, model_id, revision])
+        return hashlib.sha256(contenu.encode("utf-8")).hexdigest()
+
+    def _resoudre_revision(self, model_id: str, revision: str) -> str:
+        """
+        Retourne la révision sous laquelle lire et écrire les entrées d'un modèle.
+        Une révision non résolue ('local': hub injoignable ou modèle local) est remplacée par
+        la dernière révision résolue enregistrée, sans rien invalider; une révision résolue
+        invalide les entrées des autres révisions du modèle. Appelée sous verrou.
+        """
+        if revision == "local":
+            if model_id not in self._revisions:
+                ligne = self._db.execute("SELECT revision FROM revisions WHERE model_id = ?", (model_id,)).fetchone()
+                if ligne is None:
+                    return revision
+                self._revisions[model_id] = ligne[0]
+            return self._revisions[model_id]
+
+        self._invalider_anciennes_revisions(model_id, revision)
+        return revision
+
+    def _invalider_anciennes_revisions(self, model_id: str, revision: str):
+        """
+        Supprime les entrées d'un modèle dont la révision diffère de `revision`, et enregistre
+        celle-ci comme dernière révision résolue. Appelée sous verrou, une fois par changement de révision.
+        """
+        if self._revisions.get(model_id) == revision:
+            return
+
+        supprimees = self._db.execute(
+            "DELETE FROM traductions WHERE model_id = ? AND revision != ?", (model_id, revision)
+        ).rowcount
+        self._db.execute("INSERT OR REPLACE INTO revisions VALUES (?, ?)", (model_id, revision))
+        self._db.commit()
+        if supprimees:
+            print(f"Cache de traduction: {supprimees} entrées invalidées pour {model_id}.")
+            self._memoire.clear()
+        self._revisions[model_id] = revision
+
+    def get_many(self, textes, src_lang, tgt_lang, model_id, revision) -> list:
+        """
+        Retourne la traduction en cache de chaque texte, ou None si absente.
+        """
+        with self._verrou:
+            revision = self._resoudre_revision(model_id, revision)
+            cles = [self.cle(t, src_lang, tgt_lang, model_id, revision) for t in textes]
+            resultats = [None] * len(cles)
+
+            a_lire = []
+            for i, cle in enumerate(cles):
+                if cle in self._memoire:
+                    self._memoire.move_to_end(cle)
+                    resultats[i] = self._memoire[cle]
+                    self.hits_memoire += 1
+                else:
+                    a_lire.append(i)
+
+            if a_lire:
+                # lecture par tranches pour rester sous la limite de paramètres de SQLite
+                lignes = {}
+                for debut in range(0, len(a_lire), 500):
+                    tranche = [cles[i] for i in a_lire[debut:debut + 500]]
+                    marqueurs = ",".join("?" * len(tranche))
+                    lignes.update(self._db.execute(
+                        f"SELECT cle, traduction FROM traductions WHERE cle IN ({marqueurs})", tranche
+                    ).fetchall())
+                maintenant = time.time()
+                for i in a_lire:
+                    traduction = lignes.get(cles[i])
+                    if traduction is None:
+                        self.misses += 1
+                        continue
+                    resultats[i] = traduction
+                    self.hits_disque += 1
+                    self._memoriser(cles[i], traduction)
+                if lignes:
+                    self._db.executemany(
+                        "UPDATE traductions SET acces = ? WHERE cle = ?",
+                        [(maintenant, cle) for cle in lignes]
+                    )
+                    self._db.commit()
+
+        return resultats
+
+    def put_many(self, textes, traductions, src_lang, tgt_lang, model_id, revision):
+        """
+        Enregistre les traductions de `textes` et applique la limite de taille du cache.
+        """
+        maintenant = time.time()
+        with self._verrou:
+            revision = self._resoudre_revision(model_id, revision)
+            lignes = []
+            for texte, traduction in zip(textes, traductions):
+                cle = self.cle(texte, src_lang, tgt_lang, model_id, revision)
+                lignes.append((cle, model_id, revision, traduction, maintenant))
+
+            for cle, _, _, traduction, _ in lignes:
+                self._memoriser(cle, traduction)
+            self._db.executemany("INSERT OR REPLACE INTO traductions VALUES (?, ?, ?, ?, ?)", lignes)
+
+            # éviction des entrées les moins récemment utilisées
+            total = self._db.execute("SELECT COUNT(*) FROM traductions").fetchone()[0]
+            if total > self.max_entrees:
+                self._db.execute(
+                    "DELETE FROM traductions WHERE cle IN "
+                    "(SELECT cle FROM traductions ORDER BY acces ASC LIMIT ?)",
+                    (total - self.max_entrees,)
+                )
+            self._db.commit()
+
+    def _memoriser(self, cle: str, traduction: str):
+        self._memoire[cle] = traduction
+        self._memoire.move_to_end(cle)
+        while len(self._memoire) > self.max_memoire:
+            self._memoire.popitem(last=False)
+
+    def stats(self) -> dict:
+        """
+        Retourne les compteurs de hits/misses et le nombre d'entrées du cache.
+        """
+        with self._verrou:
+            total = self.hits_memoire + self.hits_disque + self.misses
+            entrees = self._db.execute("SELECT COUNT(*) FROM traductions").fetchone()[0]
+            return {
+                "hits_memoire": self.hits_memoire,
+                "hits_disque": self.hits_disque,
+                "misses": self.misses,
+                "hit_rate": (self.hits_memoire + self.hits_disque) / total if total else 0.0,
+                "entrees_memoire": len(self._memoire),
+                "entrees_disque": entrees,
+            }
+
+
+_cache = None
+_verrou_cache = threading.Lock()
+
+
+def get_cache() -> TraductionCache:
+    """
+    Retourne le cache de traduction du processus, créé au premier appel.
+    """
+    global _cache
+    with _verrou_cache:
+        if _cache is None:
+            _cache = TraductionCache(
+                max_entrees=int(os.getenv("GOAI_TRADUCTION_CACHE_MAX", 200_000)),
+            )
+    return _cache
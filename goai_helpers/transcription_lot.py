@@ -0,0 +1,197 @@
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import torch
+
+from goai_helpers.audio import charger_audio
+from goai_helpers.goai_stt import charger_modele_ctc, transcrire_ctc
+from goai_helpers.goai_stt2 import charger_pipeline
+
+
+EXTENSIONS_AUDIO = (".wav", ".mp3", ".flac", ".ogg", ".m4a", ".opus")
+SAMPLING_RATE = 16000
+
+
+def lister_audios(dossier: str) -> list:
+    """
+    Liste récursivement les fichiers audio d'un dossier, en chemins relatifs triés.
+    """
+    fichiers = []
+    for racine, _, noms in os.walk(dossier):
+        for nom in noms:
+            if nom.lower().endswith(EXTENSIONS_AUDIO):
+                fichiers.append(os.path.relpath(os.path.join(racine, nom), dossier))
+    return sorted(fichiers)
+
+
+def deja_transcrits(sortie: str) -> set:
+    """
+    Retourne les fichiers déjà transcrits avec succès dans le JSONL de sortie (pour la reprise).
+    Les fichiers en erreur ne sont pas comptés, et sont donc retentés; les lignes illisibles
+    sont ignorées et signalées.
+    """
+    faits = set()
+    if not os.path.exists(sortie):
+        return faits
+    with open(sortie, encoding="utf-8") as f:
+        for numero, ligne in enumerate(f, 1):
+            try:
+                resultat = json.loads(ligne)
+                if "erreur" not in resultat:
+                    faits.add(resultat["fichier"])
+            except (json.JSONDecodeError, KeyError, TypeError):
+                print(f"{sortie}:{numero}: ligne illisible ignorée: {ligne.strip()[:80]!r}")
+    return faits
+
+
+def tronquer_derniere_ligne(sortie: str):
+    """
+    Retire la dernière ligne du JSONL si elle est incomplète (écriture interrompue), afin que
+    le premier résultat ajouté à la reprise ne soit pas collé à cette ligne tronquée.
+    """
+    if not os.path.exists(sortie):
+        return
+    with open(sortie, "rb+") as f:
+        taille = f.seek(0, os.SEEK_END)
+        position = taille
+        while position > 0:
+            debut = max(position - 65536, 0)
+            f.seek(debut)
+            bloc = f.read(position - debut)
+            fin_ligne = bloc.rfind(b"\n")
+            if fin_ligne >= 0:
+                position = debut + fin_ligne + 1
+                break
+            position = debut
+        if position < taille:
+            print(f"{sortie}: dernière ligne incomplète retirée ({taille - position} octets).")
+            f.truncate(position)
+
+
+def _decoder_fichier(chemin: str):
+    """
+    Décode et rééchantillonne un fichier (exécuté dans un processus du pool).
+    """
+    try:
+        return chemin, charger_audio(chemin, SAMPLING_RATE), None
+    except Exception as e:
+        return chemin, None, str(e)
+
+
+def _transcrire_paquet(moteur, model, signaux, batch_size, device):
+    if moteur == "mms":
+        processor, modele_ctc = charger_modele_ctc(device)
+        return transcrire_ctc(processor, modele_ctc, signaux, device, batch_size=batch_size)
+
+    pipe = charger_pipeline(model)
+    entrees = [{"raw": signal, "sampling_rate": SAMPLING_RATE} for signal in signaux]
+    sorties = pipe(entrees, batch_size=batch_size, chunk_length_s=30)
+    return [sortie["text"].strip() for sortie in sorties]
+
+
+def transcrire_dossier(
+        dossier,
+        sortie,
+        moteur="whisper",
+        model="ArissBandoss/whisper-small-mos",
+        batch_size=8,
+        bloc=64,
+        workers=None
+    ):
+    """
+    Transcrit tous les fichiers audio d'un dossier et écrit un résultat JSONL par fichier.
+
+    Les fichiers sont traités par blocs: le décodage et le rééchantillonnage d'un bloc sont
+    répartis sur un pool de processus, pendant que le bloc précédent passe dans le modèle.
+    Dans un bloc, les fichiers sont triés par durée pour former des paquets homogènes.
+    Chaque paquet est écrit dès qu'il est transcrit; les fichiers déjà transcrits dans
+    `sortie` sont ignorés, ce qui permet de reprendre après une interruption (les fichiers
+    en erreur sont retentés).
+
+    Args:
+        dossier (str): le dossier à parcourir.
+        sortie (str): le fichier JSONL de résultats.
+        moteur (str): "whisper" (goai_stt2) ou "mms" (wav2vec2, goai_stt).
+        model (str): le modèle Whisper utilisé avec le moteur "whisper".
+        batch_size (int): taille des paquets envoyés au modèle.
+        bloc (int): nombre de fichiers décodés à l'avance.
+        workers (int): nombre de processus de décodage.
+
+    Returns:
+        dict: nombre de fichiers, durée audio, temps écoulé, fichiers/s et facteur temps réel.
+    """
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    tronquer_derniere_ligne(sortie)
+    faits = deja_transcrits(sortie)
+    fichiers = [f for f in lister_audios(dossier) if f not in faits]
+    print(f"{len(fichiers)} fichiers à transcrire ({len(faits)} déjà faits).")
+
+    start_time = time.time()
+    nb_fichiers, duree_audio = 0, 0.0
+    blocs = [fichiers[i:i + bloc] for i in range(0, len(fichiers), bloc)]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool, open(sortie, "a", encoding="utf-8") as f:
+        def decoder(noms):
+            return pool.map(_decoder_fichier, [os.path.join(dossier, nom) for nom in noms], chunksize=4)
+
+        a_venir = decoder(blocs[0]) if blocs else None
+        for i, noms in enumerate(blocs):
+            decodes = list(a_venir)
+            # lancer le décodage du bloc suivant pendant l'inférence
+            a_venir = decoder(blocs[i + 1]) if i + 1 < len(blocs) else None
+
+            valides = []
+            for nom, (_, signal, erreur) in zip(noms, decodes):
+                if erreur is not None:
+                    f.write(json.dumps({"fichier": nom, "erreur": erreur}, ensure_ascii=False) + "\n")
+                else:
+                    valides.append((nom, signal))
+            valides.sort(key=lambda x: len(x[1]))
+
+            for debut in range(0, len(valides), batch_size):
+                paquet = valides[debut:debut + batch_size]
+                textes = _transcrire_paquet(moteur, model, [signal for _, signal in paquet], batch_size, device)
+                for (nom, signal), texte in zip(paquet, textes):
+                    duree = len(signal) / SAMPLING_RATE
+                    f.write(json.dumps({"fichier": nom, "duree": round(duree, 2), "texte": texte}, ensure_ascii=False) + "\n")
+                    nb_fichiers += 1
+                    duree_audio += duree
+                f.flush()
+
+            ecoule = time.time() - start_time
+            print(
+                f"{nb_fichiers}/{len(fichiers)} fichiers, {nb_fichiers / ecoule:.2f} fichiers/s, "
+                f"facteur temps réel {ecoule / max(duree_audio, 1e-9):.3f}"
+            )
+
+    ecoule = time.time() - start_time
+    return {
+        "fichiers": nb_fichiers,
+        "duree_audio": duree_audio,
+        "temps": ecoule,
+        "fichiers_par_seconde": nb_fichiers / ecoule if ecoule else 0.0,
+        "facteur_temps_reel": ecoule / duree_audio if duree_audio else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Transcription en masse d'un dossier de fichiers audio Mooré.")
+    parser.add_argument("dossier")
+    parser.add_argument("--sortie", default="transcriptions.jsonl")
+    parser.add_argument("--moteur", choices=["whisper", "mms"], default="whisper")
+    parser.add_argument("--model", default="ArissBandoss/whisper-small-mos")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--bloc", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    resultat = transcrire_dossier(
+        args.dossier, args.sortie, args.moteur, args.model, args.batch_size, args.bloc, args.workers
+    )
+    print(
+        f"Terminé: {resultat['fichiers']} fichiers, {resultat['duree_audio']:.0f} s d'audio en {resultat['temps']:.0f} s "
+        f"({resultat['fichiers_par_seconde']:.2f} fichiers/s, facteur temps réel {resultat['facteur_temps_reel']:.3f})"
+    )
@@ -3,50 +3,28 @@ import re
 import time
 import torch
 import spaces
-import requests
 import tempfile
-import concurrent
 import numpy as np
-from tqdm import tqdm
 from huggingface_hub import hf_hub_download, hf_hub_url, login
 
 from TTS.tts.layers.xtts.tokenizer import VoiceBpeTokenizer
 from TTS.tts.configs.xtts_config import XttsConfig
 from TTS.tts.models.xtts import Xtts
 
-from resemble_enhance.enhancer.inference import denoise, enhance
+from goai_helpers.telechargement import telecharger
+from goai_helpers.amelioration import get_service, ErreurFilePleine, FENETRE_S
+from goai_helpers.calibration_nfe import choisir_nfe
 
 
 def download_file(url: str, destination: str, token: str = None):
     """
     Télécharge un fichier à partir d'une URL avec une barre de progression. Prend en charge les tokens API Hugging Face pour les modèles protégés.
+    Le téléchargement est reprenable et le fichier n'est mis en place qu'une fois complet (voir goai_helpers.telechargement).
     :param url: L'URL à partir de laquelle télécharger.
     :param destination: Le chemin de destination pour enregistrer le fichier téléchargé.
-    :param token: Le jeton API Hugging Face (optionnel). Si non fourni, la variable d'environnement HF_API_TOKEN sera utilisée.
+    :param token: Le jeton API Hugging Face (optionnel). Si non fourni, la variable d'environnement HF_SPACE_TOKEN sera utilisée.
     """
-
-
-    # utiliser le jeton passé ou récupérer depuis la variable d'environnement
-    if token is None:
-        token = os.getenv("HF_SPACE_TOKEN")
-
-    # en-têtes pour la requête
-    headers = {}
-    if token:
-        headers['Authorization'] = f'Bearer {token}'
-
-    # requête GET en streaming avec en-têtes
-    response = requests.get(url, stream=True, headers=headers)
-
-    # taille totale en octets, définie à zéro si manquante
-    total_size = int(response.headers.get('content-length', 0))
-
-    # afficher la progression
-    with open(destination, 'wb') as file, tqdm(desc=destination, total=total_size, unit='B', unit_scale=True,
-                                               unit_divisor=1024) as bar:
-        for data in response.iter_content(chunk_size=1024):
-            size = file.write(data)
-            bar.update(size)
+    return telecharger(url, destination, token=token)
 
 
 def diviser_phrases_moore(texte: str) -> list:
@@ -54,7 +32,7 @@ def diviser_phrases_moore(texte: str) -> list:
     Divise un texte en phrases en fonction des signes de ponctuation de fin de phrase.
 
     Cette fonction prend un texte en entrée et le divise en phrases en se basant sur les
-    signes de ponctuation (tels que le point (.) ...). 
+    signes de ponctuation (tels que le point (.) ...) et sur les retours à la ligne.
     Elle nettoie également les espaces superflus et filtre les chaînes vides.
 
     Args:
@@ -64,7 +42,7 @@ def diviser_phrases_moore(texte: str) -> list:
         list: Une liste de phrases nettoyées et divisées à partir du texte.
     """
     # définir les motifs de ponctuation de fin de phrase
-    fin_de_phrase = re.compile(r'(?<=[.!?])\s+')
+    fin_de_phrase = re.compile(r'(?<=[.!?])\s+|\n+')
 
     # diviser le texte en phrases
     phrases = fin_de_phrase.split(texte)
@@ -77,34 +55,79 @@ def diviser_phrases_moore(texte: str) -> list:
 
 # function to enhance speech
 @spaces.GPU
-def enhance_speech(audio_array, sampling_rate, solver, nfe, tau, denoise_before_enhancement):
-    solver = solver.lower()
-    nfe = int(nfe)
-    lambd = 0.9 if denoise_before_enhancement else 0.1
-
-    # device
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-
-    def denoise_audio():
-        try:
-            return denoise(audio_array, sampling_rate, device)
-        except Exception as e:
-            print("> Error while denoising : ", str(e))
-            return audio_array, sampling_rate
+def enhance_speech(audio_array, sampling_rate, solver, nfe, tau, denoise_before_enhancement, latence_cible_s=None,
+                   enchainer=False):
+    """
+    Débruite et améliore un audio via le service d'amélioration partagé (modèles chargés une fois).
+    Au-delà de FENETRE_S secondes, l'audio est traité par morceaux qui se chevauchent
+    (voir ServiceAmelioration.ameliorer_par_morceaux), recollés à la fin; enhance_speech_flux
+    rend ces morceaux au fil de l'eau.
+    `denoise_before_enhancement` dose le débruitage interne de l'améliorateur (lambd 0.9 au lieu de 0.1).
+    Avec `enchainer`, l'améliorateur reçoit la sortie du débruiteur (mode "enchaine");
+    sinon les deux partent de l'audio d'origine.
+    Avec `latence_cible_s`, `nfe` n'est qu'un maximum: le plus grand nfe dont la durée prédite
+    par la table de calibration de la machine tient dans la latence cible est retenu.
+    Retourne ((sr, débruité), (sr, amélioré)).
+    """
+    debruites, ameliores = [], []
+    for (sr, debruite), (sr, ameliore) in _enhance_speech_flux(
+        audio_array, sampling_rate, solver, nfe, tau, denoise_before_enhancement, latence_cible_s, enchainer
+    ):
+        debruites.append(debruite)
+        ameliores.append(ameliore)
+    if len(debruites) == 1:
+        return (sr, debruites[0]), (sr, ameliores[0])
+    return (sr, np.concatenate(debruites)), (sr, np.concatenate(ameliores))
 
-    def enhance_audio():
-        try:
-            return enhance(audio_array, sampling_rate, device, nfe=nfe, solver=solver, lambd=lambd, tau=tau)
-        except Exception as e:
-            print("> Error while enhancement : ", str(e))
-            return audio_array, sampling_rate
 
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        future_denoise = executor.submit(denoise_audio)
-        future_enhance = executor.submit(enhance_audio)
+@spaces.GPU
+def enhance_speech_flux(audio_array, sampling_rate, solver, nfe, tau, denoise_before_enhancement, latence_cible_s=None,
+                        enchainer=False):
+    """
+    Version en flux de enhance_speech, à envoyer à des gr.Audio(streaming=True): les morceaux
+    ((sr, débruité), (sr, amélioré)) sont rendus dès leur amélioration (un seul pour un audio court),
+    sans garder tout l'audio amélioré en mémoire.
+    """
+    yield from _enhance_speech_flux(
+        audio_array, sampling_rate, solver, nfe, tau, denoise_before_enhancement, latence_cible_s, enchainer
+    )
 
-        denoised_audio, new_sr1 = future_denoise.result()
-        enhanced_audio, new_sr2 = future_enhance.result()
 
-        # convert to numpy and return
-        return (new_sr1, denoised_audio.cpu().numpy()), (new_sr2, enhanced_audio.cpu().numpy())
+def _enhance_speech_flux(audio_array, sampling_rate, solver, nfe, tau, denoise_before_enhancement, latence_cible_s,
+                         enchainer):
+    mode = "enchaine" if enchainer else "parallele"
+    lambd = 0.9 if denoise_before_enhancement else 0.1
+    solver = solver.lower()
+    service = get_service()
+    duree_audio = len(audio_array) / sampling_rate
+    prediction = None
+    if latence_cible_s is not None:
+        nfe, prediction = choisir_nfe(duree_audio, latence_cible_s, solver, nfe_max=int(nfe), mode=mode)
+        print(
+            f"Amélioration adaptative: {duree_audio:.1f} s d'audio, cible {latence_cible_s:.1f} s, "
+            f"nfe={nfe}, solver={solver}, durée prédite "
+            + (f"{prediction:.1f} s" if prediction is not None else "inconnue (machine non calibrée)")
+        )
+
+    start_time = time.time()
+    rendus = 0
+    try:
+        if len(audio_array) <= FENETRE_S * sampling_rate:
+            yield service.ameliorer(audio_array, sampling_rate, mode=mode, nfe=int(nfe), solver=solver, lambd=lambd, tau=tau)
+            return
+        # audio long: par morceaux recollés au fil de l'eau, pour borner la mémoire
+        for morceau in service.ameliorer_par_morceaux(
+            audio_array, sampling_rate, mode=mode, nfe=int(nfe), solver=solver, lambd=lambd, tau=tau
+        ):
+            yield morceau
+            rendus += 1
+    except ErreurFilePleine as e:
+        if rendus:
+            raise
+        # file pleine: on rend l'audio d'origine plutôt que de bloquer l'interface
+        print("> Error while enhancement : ", str(e))
+        audio = np.asarray(audio_array, dtype=np.float32)
+        yield (sampling_rate, audio), (sampling_rate, audio)
+    finally:
+        if prediction is not None:
+            print(f"Amélioration: durée prédite {prediction:.1f} s, réelle {time.time() - start_time:.1f} s")
@@ -0,0 +1,138 @@
+import numpy as np
+
+
+def _trames(signal: np.ndarray, taille: int, saut: int) -> np.ndarray:
+    """
+    Découpe le signal en trames (vue sans copie) de `taille` échantillons espacées de `saut`.
+    """
+    if len(signal) < taille:
+        signal = np.pad(signal, (0, taille - len(signal)))
+    return np.lib.stride_tricks.sliding_window_view(signal, taille)[::saut]
+
+
+def _energie_db(trames: np.ndarray) -> np.ndarray:
+    return 10 * np.log10(np.mean(trames ** 2, axis=1) + 1e-10)
+
+
+def probabilites_energie(signal: np.ndarray, sampling_rate: int, trame_ms: float = 30, saut_ms: float = 10,
+                         marge_db: float = 12.0, seuil_absolu_db: float = -35.0,
+                         seuil_platitude: float = 0.5) -> np.ndarray:
+    """
+    Détecteur de parole par énergie et platitude spectrale, entièrement vectorisé.
+
+    Une trame est considérée comme de la parole si son énergie dépasse le plancher de bruit
+    (10e percentile des énergies) de `marge_db` décibels, ou dépasse `seuil_absolu_db` dBFS
+    (audio à faible dynamique: radio compressée, parole continue, dont le plancher est déjà
+    de la parole), et si son spectre n'est pas plat (les bruits stationnaires ont une
+    platitude spectrale proche de 1).
+
+    Returns:
+        np.ndarray: un booléen par trame (espacées de `saut_ms`).
+    """
+    taille = int(sampling_rate * trame_ms / 1000)
+    saut = int(sampling_rate * saut_ms / 1000)
+    trames = _trames(signal.astype(np.float32, copy=False), taille, saut)
+
+    energie_db = _energie_db(trames)
+    plancher = np.percentile(energie_db, 10)
+
+    spectre = np.abs(np.fft.rfft(trames * np.hanning(taille).astype(np.float32), axis=1)) ** 2 + 1e-10
+    platitude = np.exp(np.mean(np.log(spectre), axis=1)) / np.mean(spectre, axis=1)
+
+    energique = (energie_db > plancher + marge_db) | (energie_db > seuil_absolu_db)
+    return energique & (platitude < seuil_platitude)
+
+
+def _couper_au_plus_calme(debut: int, fin: int, energie_db: np.ndarray, saut: int, max_segment: int) -> list:
+    """
+    Redécoupe [debut, fin) en morceaux d'au plus `max_segment` échantillons, chaque coupure
+    tombant au début de la trame la moins énergique de la seconde moitié du morceau, entre
+    deux mots plutôt qu'au milieu d'un mot.
+    """
+    morceaux = []
+    while fin - debut > max_segment:
+        premiere = -(-(debut + max_segment // 2) // saut)
+        derniere = min((debut + max_segment) // saut, len(energie_db) - 1)
+        coupure = debut + max_segment
+        if premiere <= derniere:
+            coupure = (premiere + int(np.argmin(energie_db[premiere:derniere + 1]))) * saut
+        morceaux.append((debut, coupure))
+        debut = coupure
+    morceaux.append((debut, fin))
+    return morceaux
+
+
+def detecter_parole(signal: np.ndarray, sampling_rate: int, modele=None, saut_ms: float = 10,
+                    min_parole_ms: float = 250, min_silence_ms: float = 300, marge_ms: float = 150,
+                    max_segment_s: float = 30, repli: bool = False) -> list:
+    """
+    Détecte les segments de parole d'un signal mono.
+
+    Args:
+        signal (np.ndarray): l'audio mono.
+        sampling_rate (int): le taux d'échantillonnage.
+        modele (callable): détecteur optionnel `modele(signal, sampling_rate, saut_ms)` qui retourne
+            une probabilité (ou un booléen) de parole par trame; par défaut `probabilites_energie`.
+        saut_ms (float): espacement des trames.
+        min_parole_ms (float): durée minimale d'un segment de parole conservé.
+        min_silence_ms (float): les silences plus courts sont fusionnés dans la parole.
+        marge_ms (float): marge ajoutée de part et d'autre de chaque segment.
+        max_segment_s (float): les segments plus longs sont redécoupés (limite de 30 s de Whisper),
+            à la trame la moins énergique de leur seconde moitié.
+        repli (bool): si aucune parole n'est détectée, retourner tout le signal (redécoupé de même)
+            plutôt qu'aucun segment, afin de ne jamais perdre une transcription.
+
+    Returns:
+        list[tuple[int, int]]: les segments (début, fin) en échantillons dans le signal d'origine.
+    """
+    max_segment = int(sampling_rate * max_segment_s)
+    saut = int(sampling_rate * saut_ms / 1000)
+    marge = int(sampling_rate * marge_ms / 1000)
+
+    energie_db = None
+
+    def redecouper(debut, fin):
+        nonlocal energie_db
+        if fin - debut <= max_segment:
+            return [(debut, fin)]
+        if energie_db is None:
+            # énergie par trame de 30 ms, calculée seulement s'il y a un segment à redécouper
+            energie_db = _energie_db(_trames(signal.astype(np.float32, copy=False), int(sampling_rate * 0.03), saut))
+        return _couper_au_plus_calme(debut, fin, energie_db, saut, max_segment)
+
+    if modele is None:
+        parole = probabilites_energie(signal, sampling_rate, saut_ms=saut_ms)
+    else:
+        parole = np.asarray(modele(signal, sampling_rate, saut_ms)) > 0.5
+
+    # bords des zones de parole
+    bords = np.diff(np.concatenate([[0], parole.astype(np.int8), [0]]))
+    debuts = np.flatnonzero(bords == 1)
+    fins = np.flatnonzero(bords == -1)
+    if len(debuts) == 0:
+        return redecouper(0, len(signal)) if repli and len(signal) else []
+
+    # fusionner les zones séparées par un silence trop court
+    min_silence = int(min_silence_ms / saut_ms)
+    garder = np.concatenate([[True], debuts[1:] - fins[:-1] >= min_silence])
+    debuts = debuts[garder]
+    fins = np.concatenate([fins[np.flatnonzero(garder)[1:] - 1], [fins[-1]]])
+
+    # supprimer les zones trop courtes
+    longues = fins - debuts >= int(min_parole_ms / saut_ms)
+    debuts, fins = debuts[longues], fins[longues]
+
+    segments = []
+    for debut, fin in zip(debuts * saut - marge, fins * saut + marge):
+        segments.extend(redecouper(max(int(debut), 0), min(int(fin), len(signal))))
+    if not segments and repli and len(signal):
+        return redecouper(0, len(signal))
+    return segments
+
+
+def extraire_segments(signal: np.ndarray, segments: list) -> list:
+    """
+    Retourne les morceaux de signal correspondant aux segments (vues sans copie).
+    """
+    return [signal[debut:fin] for debut, fin in segments]
+
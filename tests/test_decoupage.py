@@ -0,0 +1,41 @@
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("spaces")
+pytest.importorskip("TTS")
+
+from goai_helpers.decoupage import decouper_par_budget
+
+
+def compter_mots(texte):
+    return len(texte.split())
+
+
+def test_phrases_courtes_regroupees_jusqu_a_la_cible():
+    texte = "Yaa sõma. M be be. Fo yʋʋr la bõe? Mam yaa Rasmane."
+    morceaux = decouper_par_budget(texte, compter_mots, max_tokens=20, cible_tokens=6)
+
+    assert morceaux == ["Yaa sõma. M be be.", "Fo yʋʋr la bõe?", "Mam yaa Rasmane."]
+
+
+def test_phrases_assez_longues_restent_seules():
+    texte = "Un. Deux mots. Trois mots ici. Quatre."
+    morceaux = decouper_par_budget(texte, compter_mots, max_tokens=10, min_tokens=3)
+
+    assert morceaux == ["Un. Deux mots.", "Trois mots ici.", "Quatre."]
+
+
+def test_phrase_trop_longue_coupee_aux_propositions_puis_aux_mots():
+    texte = "a b c, d e f; g h i j k l m."
+    morceaux = decouper_par_budget(texte, compter_mots, max_tokens=5)
+
+    assert morceaux == ["a b c,", "d e f;", "g h i j k", "l m."]
+
+
+@pytest.mark.parametrize("max_tokens", [1, 3, 8, 50])
+def test_budget_respecte_et_texte_conserve(max_tokens):
+    texte = "Premier mot, puis une incise - assez longue - et la suite; enfin le point. Court. " * 3
+    morceaux = decouper_par_budget(texte, compter_mots, max_tokens=max_tokens)
+
+    assert all(compter_mots(morceau) <= max_tokens for morceau in morceaux)
+    assert " ".join(morceaux).split() == texte.split()
@@ -0,0 +1,75 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("transformers")
+pytest.importorskip("spaces")
+
+from goai_helpers import goai_stt
+
+NOYAUX = (10, 3, 3, 3, 3, 2, 2)
+PAS = (5, 2, 2, 2, 2, 2, 2)
+CLASSES = 50
+
+
+class _ModeleCTC:
+    """
+    Modèle CTC factice: chaque trame prédit (indice de trame dans le signal d'origine) mod CLASSES,
+    lu dans les échantillons de la fenêtre; un recollage correct rend donc 0, 1, 2, ... sans trou
+    ni doublon.
+    """
+
+    class config:
+        conv_stride = PAS
+
+    @staticmethod
+    def _get_feat_extract_output_lengths(longueurs):
+        for noyau, pas in zip(NOYAUX, PAS):
+            longueurs = torch.div(longueurs - noyau, pas, rounding_mode="floor") + 1
+        return longueurs
+
+    def __call__(self, input_values):
+        trames = int(self._get_feat_extract_output_lengths(torch.tensor(input_values.shape[1])))
+        classes = input_values[:, 0:trames * 320:320].round().long() % CLASSES
+        return type("Sortie", (), {"logits": torch.nn.functional.one_hot(classes, CLASSES).float()})
+
+
+class _Processor:
+    def __call__(self, signaux, sampling_rate, return_tensors, padding):
+        longueur = max(len(s) for s in signaux)
+        valeurs = torch.zeros(len(signaux), longueur)
+        for i, s in enumerate(signaux):
+            valeurs[i, :len(s)] = torch.as_tensor(s)
+        return type("Entrees", (dict,), {"to": lambda self, device: self})(input_values=valeurs)
+
+    def decode(self, ids):
+        return ids.tolist()
+
+
+def _signal(longueur):
+    # chaque échantillon porte l'indice de sa trame de 320 échantillons
+    return (torch.arange(longueur) // 320).float().numpy()
+
+
+@pytest.mark.parametrize("longueur", [16000 * 3, 16000 * 20, 16000 * 47 + 123, 16000 * 95 + 5000])
+def test_zones_utiles_contigues(longueur):
+    fenetres = goai_stt.decouper_fenetres(longueur, 20 * 16000, 2 * 16000, 320)
+
+    assert fenetres[0][0] == 0 and fenetres[-1][1] == longueur
+    zones = [(debut + gauche, fin - droite) for debut, fin, gauche, droite in fenetres]
+    assert all(a[1] == b[0] for a, b in zip(zones, zones[1:]))
+    assert all(debut % 320 == 0 for debut, _, _, _ in fenetres)
+
+
+def test_decouper_fenetres_marge_trop_grande():
+    with pytest.raises(ValueError):
+        goai_stt.decouper_fenetres(16000 * 60, 4 * 16000, 2 * 16000, 320)
+
+
+@pytest.mark.parametrize("longueur", [16000 * 7, 16000 * 47 + 123, 16000 * 95 + 5000])
+def test_recollage_des_logits_sans_trou_ni_doublon(longueur):
+    morceaux = [_signal(longueur), _signal(16000 * 3)]
+    ids = goai_stt.transcrire_ctc(_Processor(), _ModeleCTC(), morceaux, "cpu", batch_size=3, fenetre_s=20, marge_s=2)
+
+    for morceau, trames in zip(morceaux, ids):
+        attendu = int(_ModeleCTC._get_feat_extract_output_lengths(torch.tensor(len(morceau))))
+        assert trames == [t % CLASSES for t in range(attendu)]
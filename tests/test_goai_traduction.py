@@ -0,0 +1,41 @@
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+pytest.importorskip("spaces")
+
+
+@pytest.fixture(scope="module")
+def goai_traduction():
+    import huggingface_hub
+
+    # pas d'authentification au hub pendant les tests
+    login = huggingface_hub.login
+    huggingface_hub.login = lambda *args, **kwargs: None
+    try:
+        from goai_helpers import goai_traduction
+    finally:
+        huggingface_hub.login = login
+    return goai_traduction
+
+
+def test_grouper_par_longueur_respecte_le_budget(goai_traduction):
+    longueurs = [5, 40, 12, 3, 40, 7, 25, 12, 90]
+    paquets = goai_traduction.grouper_par_longueur(longueurs, max_tokens=100)
+
+    # chaque entrée apparaît une et une seule fois
+    assert sorted(i for paquet in paquets for i in paquet) == list(range(len(longueurs)))
+    for paquet in paquets:
+        # coût avec padding: taille du paquet x plus longue entrée
+        assert len(paquet) * max(longueurs[i] for i in paquet) <= 100
+    # les paquets sont formés par longueurs croissantes
+    assert [longueurs[i] for paquet in paquets for i in paquet] == sorted(longueurs)
+
+
+def test_grouper_par_longueur_entree_plus_longue_que_le_budget(goai_traduction):
+    # une entrée seule au-delà du budget forme son propre paquet
+    assert goai_traduction.grouper_par_longueur([500, 10, 10], max_tokens=100) == [[1, 2], [0]]
+
+
+def test_grouper_par_longueur_vide(goai_traduction):
+    assert goai_traduction.grouper_par_longueur([]) == []
@@ -0,0 +1,71 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+pytest.importorskip("spaces")
+pytest.importorskip("TTS")
+
+
+class _Tokenizer:
+    """
+    Tokenizer caractère par caractère, avec l'interface utilisée par synthetiser_vits.
+    """
+
+    def __init__(self, vocab_size):
+        self.vocab_size = vocab_size
+
+    def _ids(self, texte):
+        return [1 + ord(c) % (self.vocab_size - 1) for c in texte]
+
+    def __call__(self, textes, padding=False, return_tensors=None):
+        if isinstance(textes, str):
+            return transformers.BatchEncoding({"input_ids": self._ids(textes)})
+        ids = [self._ids(texte) for texte in textes]
+        longueur = max(len(i) for i in ids)
+        return transformers.BatchEncoding(
+            {
+                "input_ids": [i + [0] * (longueur - len(i)) for i in ids],
+                "attention_mask": [[1] * len(i) + [0] * (longueur - len(i)) for i in ids],
+            },
+            tensor_type=return_tensors,
+        )
+
+
+@pytest.fixture(scope="module")
+def goai_tts():
+    import huggingface_hub
+
+    # pas d'authentification au hub pendant les tests
+    login = huggingface_hub.login
+    huggingface_hub.login = lambda *args, **kwargs: None
+    try:
+        from goai_helpers import goai_tts
+    finally:
+        huggingface_hub.login = login
+    return goai_tts
+
+
+@pytest.fixture(scope="module")
+def vits():
+    config = transformers.VitsConfig(
+        vocab_size=40, hidden_size=16, num_hidden_layers=1, num_attention_heads=2, ffn_dim=32,
+        flow_size=8, spectrogram_bins=17, upsample_initial_channel=16, upsample_rates=[4, 4],
+        upsample_kernel_sizes=[8, 8], resblock_kernel_sizes=[3], resblock_dilation_sizes=[[1, 3]],
+        prior_encoder_num_flows=1, prior_encoder_num_wavenet_layers=1, duration_predictor_filter_channels=16,
+        depth_separable_num_layers=1, use_stochastic_duration_prediction=False,
+    )
+    torch.manual_seed(0)
+    model = transformers.VitsModel(config).eval()
+    return _Tokenizer(config.vocab_size), model
+
+
+def test_synthetiser_vits_lot_memes_longueurs_que_seul(goai_tts, vits):
+    tokenizer, model = vits
+    phrases = ["Zak-soab la kasma.", "Yʋʋm a wãn la b kẽesd biig lekolle? La pagã sɩd talla raadã."]
+
+    seules = [goai_tts.synthetiser_vits(tokenizer, model, [phrase], "cpu")[0] for phrase in phrases]
+    lot = goai_tts.synthetiser_vits(tokenizer, model, phrases, "cpu")
+
+    assert [len(wav) for wav in lot] == [len(wav) for wav in seules]
+    # la phrase courte ne garde pas le remplissage de la plus longue
+    assert len(lot[0]) < len(lot[1])
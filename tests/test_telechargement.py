@@ -0,0 +1,111 @@
+import os
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("tqdm")
+
+from goai_helpers import telechargement
+from goai_helpers.telechargement import ErreurTelechargement, telecharger
+
+CONTENU = bytes(range(256)) * 4096 + b"fin"
+
+
+class _Gestionnaire(BaseHTTPRequestHandler):
+    """
+    Sert CONTENU avec prise en charge des requêtes partielles (Range), en notant les plages demandées.
+    """
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(CONTENU)))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+
+    def do_GET(self):
+        plage = self.headers.get("Range")
+        self.server.plages.append(plage)
+        if plage is None:
+            self.send_response(200)
+            corps = CONTENU
+        else:
+            debut, fin = plage.removeprefix("bytes=").split("-")
+            corps = CONTENU[int(debut):int(fin) + 1]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {debut}-{fin}/{len(CONTENU)}")
+        self.send_header("Content-Length", str(len(corps)))
+        self.end_headers()
+        self.wfile.write(corps)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def serveur():
+    serveur = ThreadingHTTPServer(("127.0.0.1", 0), _Gestionnaire)
+    serveur.plages = []
+    fil = threading.Thread(target=serveur.serve_forever, daemon=True)
+    fil.start()
+    yield serveur
+    serveur.shutdown()
+    serveur.server_close()
+
+
+def _url(serveur):
+    return f"http://127.0.0.1:{serveur.server_address[1]}/modele.bin"
+
+
+def test_reprise_d_un_fichier_partiel(serveur, tmp_path):
+    destination = str(tmp_path / "modele.bin")
+    with open(destination + ".part", "wb") as f:
+        f.write(CONTENU[:1000])
+
+    telecharger(_url(serveur), destination, token="", sha256=hashlib.sha256(CONTENU).hexdigest())
+
+    assert serveur.plages == [f"bytes=1000-{len(CONTENU) - 1}"]
+    with open(destination, "rb") as f:
+        assert f.read() == CONTENU
+    assert not os.path.exists(destination + ".part")
+
+
+def test_parties_paralleles(serveur, tmp_path):
+    destination = str(tmp_path / "modele.bin")
+    telecharger(_url(serveur), destination, token="", parties=4, taille_partie_min=1024)
+
+    assert len(serveur.plages) == 4
+    with open(destination, "rb") as f:
+        assert f.read() == CONTENU
+    assert os.listdir(tmp_path) == ["modele.bin"]
+
+
+@pytest.mark.parametrize("attendu", [{"sha256": "0" * 64}, {"taille": len(CONTENU) + 1}])
+def test_verification_echouee_sans_fichier_final(serveur, tmp_path, attendu):
+    destination = str(tmp_path / "modele.bin")
+    with pytest.raises(ErreurTelechargement):
+        telecharger(_url(serveur), destination, token="", **attendu)
+
+    assert not os.path.exists(destination)
+    if "sha256" in attendu:
+        # un contenu complet mais corrompu n'est pas conservé pour une reprise
+        assert not os.path.exists(destination + ".part")
+
+
+def test_renommage_atomique(serveur, tmp_path, monkeypatch):
+    destination = str(tmp_path / "modele.bin")
+    renommages = []
+    remplacer = os.replace
+
+    def _replace(source, cible):
+        # le fichier final n'existe qu'une fois le contenu complet vérifié
+        assert not os.path.exists(cible)
+        renommages.append((source, cible))
+        remplacer(source, cible)
+
+    monkeypatch.setattr(telechargement.os, "replace", _replace)
+    telecharger(_url(serveur), destination, token="", sha256=hashlib.sha256(CONTENU).hexdigest())
+
+    assert renommages == [(destination + ".part", destination)]
@@ -0,0 +1,26 @@
+from goai_helpers.traduction_cache import TraductionCache
+
+MODELE = "ArissBandoss/nllb-200-distilled-600M-finetuned-fr-to-mos-V4"
+
+
+def test_revision_non_resolue_ne_vide_pas_le_cache(tmp_path):
+    chemin = str(tmp_path / "traductions.sqlite")
+    cache = TraductionCache(chemin)
+    cache.put_many(["Bonjour."], ["Ne y windga."], "fra_Latn", "mos_Latn", MODELE, "sha1")
+
+    # hub injoignable, même après un redémarrage: la dernière révision résolue est réutilisée
+    cache = TraductionCache(chemin)
+    assert cache.get_many(["Bonjour."], "fra_Latn", "mos_Latn", MODELE, "local") == ["Ne y windga."]
+    cache.put_many(["Merci."], ["Barka."], "fra_Latn", "mos_Latn", MODELE, "local")
+
+    # retour du hub sur la même révision: rien n'est invalidé
+    assert cache.get_many(["Bonjour.", "Merci."], "fra_Latn", "mos_Latn", MODELE, "sha1") == ["Ne y windga.", "Barka."]
+
+
+def test_nouvelle_revision_invalide_les_anciennes(tmp_path):
+    cache = TraductionCache(str(tmp_path / "traductions.sqlite"))
+    cache.put_many(["Bonjour."], ["Ne y windga."], "fra_Latn", "mos_Latn", MODELE, "sha1")
+
+    assert cache.get_many(["Bonjour."], "fra_Latn", "mos_Latn", MODELE, "sha2") == [None]
+    assert cache.get_many(["Bonjour."], "fra_Latn", "mos_Latn", MODELE, "local") == [None]
+    assert cache.stats()["entrees_disque"] == 0
@@ -0,0 +1,51 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from goai_helpers.vad import detecter_parole
+
+SR = 16000
+
+
+def _voix(duree_s, amplitude=0.3):
+    """
+    Signal harmonique modulé (spectre non plat, comme la parole voisée).
+    """
+    t = np.arange(int(duree_s * SR)) / SR
+    harmoniques = sum(np.sin(2 * np.pi * 150 * k * t) / k for k in range(1, 8))
+    return (amplitude * harmoniques * (1 + 0.5 * np.sin(2 * np.pi * 4 * t)) / 3).astype(np.float32)
+
+
+def _silence(duree_s):
+    return np.zeros(int(duree_s * SR), dtype=np.float32)
+
+
+def test_segment_de_parole_entre_deux_silences():
+    signal = np.concatenate([_silence(1), _voix(2), _silence(1)])
+    segments = detecter_parole(signal, SR)
+
+    assert len(segments) == 1
+    debut, fin = segments[0]
+    assert 0.8 * SR <= debut <= 1.0 * SR
+    assert 3.0 * SR <= fin <= 3.2 * SR
+
+
+def test_silence_seul_et_repli():
+    signal = _silence(3)
+    assert detecter_parole(signal, SR) == []
+    assert detecter_parole(signal, SR, repli=True) == [(0, len(signal))]
+
+
+def test_segment_trop_long_coupe_au_plus_calme():
+    # 70 s de parole continue, avec deux creux de 100 ms (trop courts pour être des silences)
+    creux = lambda: _voix(0.1, amplitude=0.003)
+    signal = np.concatenate([_voix(20), creux(), _voix(25), creux(), _voix(24.8)])
+    segments = detecter_parole(signal, SR)
+
+    assert all(fin - debut <= 30 * SR for debut, fin in segments)
+    # les morceaux se suivent sans trou ni chevauchement
+    assert all(a[1] == b[0] for a, b in zip(segments, segments[1:]))
+    coupures = [fin / SR for _, fin in segments[:-1]]
+    assert len(coupures) == 2
+    assert 20.0 <= coupures[0] <= 20.1
+    assert 45.1 <= coupures[1] <= 45.2